@@ -1,13 +1,18 @@
+# time the startup, starting before all other imports
+from startup import StartupTimer
+startup_timer = StartupTimer()
+
+import gc
 import os
 import traceback
 from os.path import abspath
-from typing import Any
+from typing import Any, Dict
 from apiflask import APIFlask
 from flask import send_from_directory
 from flask_compress import Compress
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-from background.background_tasks import start_background_tasks
+from background.background_tasks import start_background_tasks, start_task_queue
 from db.db_singleton import get_db, close_connection
 from routes.auth import add_auth_bp
 from routes.category import add_category_bp
@@ -17,8 +22,16 @@ from routes.task import add_task_bp
 from routes.token import add_token_bp
 from routes.url import add_url_bp
 from routes.others import add_others_bp
+from routes.metrics import add_metrics_bp
+from routes.profiling import add_profiling_bp, get_profiler
+from routes.util.profiler import ProfilerMiddleware
+from routes.util.category_index import get_category_index
+from routes.util.url_view import get_url_view
+from auth.auth_singleton import get_auth_if
 from log import setup_logging, log_info, log_error, log_debug
 
+startup_timer.phase('imports')
+
 # Initialize APIFlask instead of Flask
 app = APIFlask(
     __name__,
@@ -28,13 +41,6 @@ app = APIFlask(
     static_folder='./dist',
 )
 
-# add profiler to analyze requests
-# to visualize a profile you can run:
-# pip install snakeviz
-# snakeviz ./profile/request.prof
-#from werkzeug.middleware.profiler import ProfilerMiddleware
-#app.wsgi_app = ProfilerMiddleware(app.wsgi_app, restrictions=['^((?!venv).)*$', 0.1], profile_dir='./profile')
-
 # add module to allow compression of replies
 Compress(app)
 
@@ -46,12 +52,22 @@ app.config.from_prefixed_env(prefix='APP', loads=lambda x: x)
 
 # setup logging
 setup_logging(app)
+startup_timer.phase('config')
 
 # Fix for src_ip if used behind a reverse Proxy
 if app.config.get('PROXY_FIX', 'false').lower() == 'true':
     log_info('APP', 'applying reverse proxy fix')
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 
+# add profiler to analyze requests, it is inactive until started through /api/profiling
+# to visualize a downloaded profile you can run:
+# pip install snakeviz
+# snakeviz ./request.prof
+app.wsgi_app = ProfilerMiddleware(app.wsgi_app, get_profiler(app))
+
+# build the auth realms once, all blueprints share them
+get_auth_if(app)
+startup_timer.phase('auth')
 
 # Register blueprints
 add_category_bp(app)
@@ -62,6 +78,9 @@ add_url_bp(app)
 add_compile_bp(app)
 add_task_bp(app)
 add_others_bp(app)
+add_metrics_bp(app)
+add_profiling_bp(app)
+startup_timer.phase('blueprints')
 
 
 # Serve index.html for the root route
@@ -111,6 +130,12 @@ def init_background(a: APIFlask):
     start_background_tasks(a)
 
 
+def init_task_queue(a: APIFlask):
+    log_debug("APP", "App init_task_queue called")
+    # tasks are claimed atomically from the DB, so every worker runs its own task queue
+    start_task_queue(a)
+
+
 def migrate_db(a: APIFlask):
     log_debug("APP", "App migrate_db called")
     with a.app_context():
@@ -123,12 +148,80 @@ def migrate_db(a: APIFlask):
         close_connection()
 
 
+def preload_enabled(a: APIFlask) -> bool:
+    return a.config.get('PRELOAD', {}).get('ENABLED', 'false').lower() == 'true'
+
+
+# gevent is not supported: sqlite3 and the asyncio loops of the BC & Radius clients would block all greenlets of a worker
+SERVER_WORKER_CLASSES = ('sync', 'gthread')
+
+
+def server_options(a: APIFlask) -> Dict[str, Any]:
+    """
+    The gunicorn worker settings (APP_SERVER).
+    With 'gthread' every worker serves a connection per thread, so a slow client (e.g. a ProxySG downloading a big
+    compile file) or a slow remote auth call only blocks a thread instead of the whole worker.
+    """
+    server_cfg: dict = a.config.get('SERVER', {})
+    worker_class = server_cfg.get('WORKER_CLASS', 'sync').lower()
+    if worker_class not in SERVER_WORKER_CLASSES:
+        log_error('APP', 'Unsupported APP_SERVER__WORKER_CLASS, falling back to sync', {'worker_class': worker_class})
+        worker_class = 'sync'
+    return {
+        'worker_class': worker_class,
+        'workers': int(server_cfg.get('WORKERS', '4')),
+        # gunicorn switches to gthread on its own for more than one thread, so sync always uses one
+        'threads': int(server_cfg.get('THREADS', '8')) if worker_class == 'gthread' else 1,
+        'timeout': int(server_cfg.get('TIMEOUT', '30')),
+    }
+
+
+def warm_caches(a: APIFlask):
+    """
+    Build the caches in the gunicorn master (preload mode), so all workers share them copy-on-write after the fork.
+    This covers the committed objects, the URL view, the indexes of test-uri & compile and the compiled categories of all tokens.
+    """
+    log_debug("APP", "App warm_caches called")
+    with a.app_context():
+        db = get_db()
+        get_url_view(db)
+        get_category_index(db)
+        get_category_index(db, committed=True).warm(
+            cat_id for token in db.tokens.get_all_tokens() for cat_id in token.categories
+        )
+        # the workers take over the cached objects, but create their own connection
+        # MongoDB is not fork-safe, so we need to close the connection before gunicorn spawns more workers
+        a.config['SINGLETONS']['WARM_DB'] = db
+        close_connection()
+    # move everything built so far out of the reach of the garbage collector,
+    # otherwise the first collection in each worker touches (and so copies) all the shared pages
+    gc.freeze()
+
+
+def init_worker_db(a: APIFlask):
+    """Create the DB connection of a worker, reusing the objects the master cached before the fork (preload mode)"""
+    log_debug("APP", "App init_worker_db called")
+    with a.app_context():
+        warm_db = a.config.get('SINGLETONS', {}).pop('WARM_DB', None)
+        db = get_db()
+        if warm_db is not None:
+            db.take_over_caches(warm_db)
+
+
+log_info('APP', 'App loaded', startup_timer.summary())
+
+
 if __name__ == '__main__':
     # migrate db schema and init background tasks,
     # we keep this in the __main__ and manually trigger it for gunicorn with the on_starting / post_fork
     # to prevent the background tasks being run on multiple workers
     migrate_db(app)
+    startup_timer.phase('migrate_db')
     init_background(app)
+    startup_timer.phase('background')
+    init_task_queue(app)
+    startup_timer.phase('task_queue')
+    log_info('APP', 'Startup finished', startup_timer.summary())
 
     # start app
     app_port = int(app.config.get('PORT', 8080))
@@ -1,8 +1,9 @@
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict
 from apiflask import HTTPTokenAuth
 
 from auth.auth_realm import AuthRealmInterface
 from auth.auth_user import AuthUser, AUTH_ROLES_RO, AUTH_ROLES_RW
+from auth.util.jwt_handler import JWTHandler
 
 # HTTP Header name for the Auth token
 AUTH_TOKEN_KEY = 'jwt-token'
@@ -20,9 +21,37 @@ class AuthHandler:
 
     # vars
     realms: List[AuthRealmInterface]
+    realms_by_name: Dict[str, AuthRealmInterface]
+    jwt: JWTHandler
 
-    def __init__(self, realms: List[AuthRealmInterface]):
+    def __init__(self, realms: List[AuthRealmInterface], jwt: JWTHandler):
+        """
+        :param realms: The realms to verify tokens & logins with, in order of their priority
+        :param jwt: The JWT handler shared by the realms, used to route tokens to the realm that issued them
+        """
         self.realms = realms
+        self.jwt = jwt
+        # the first realm wins, same as for the sequential checks
+        self.realms_by_name = {}
+        for realm in realms:
+            if realm.realm_name is not None:
+                self.realms_by_name.setdefault(realm.realm_name, realm)
+
+    def _route_token(self, token: str) -> List[AuthRealmInterface]:
+        """
+        Get the realms that should verify a token.
+
+        A JWT issued by one of our realms names that realm, so only this realm verifies it.
+        All other tokens (e.g. of a remote API) are checked by all realms in order.
+
+        :param token: Token to route
+        :return: The realms to try, in order
+        """
+        if self.realms_by_name:
+            realm = self.realms_by_name.get(self.jwt.realm_hint(token))
+            if realm is not None:
+                return [realm]
+        return self.realms
 
     def verify_token(self, token: str) -> Optional[AuthUser]:
         """
@@ -31,7 +60,7 @@ class AuthHandler:
         :param token: Token to validate
         :return: AuthUser object if valid, else None
         """
-        for realm in self.realms:
+        for realm in self._route_token(token):
             user = realm.verify_token(token)
             if user is not None:
                 return user
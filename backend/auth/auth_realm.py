@@ -10,6 +10,9 @@ class AuthRealmInterface(ABC):
     * API Auth calls like login
     * API restrictions based on the apiflask HTTPTokenAuth
     """
+    # realm stored in the JWT tokens issued by this realm, used to route a token directly to its realm
+    # None for realms whose tokens are no local JWTs
+    realm_name: Optional[str] = None
 
     @abstractmethod
     def verify_token(self, token: str) -> Optional[AuthUser]:
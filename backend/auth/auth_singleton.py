@@ -1,5 +1,6 @@
 from apiflask import APIFlask
-from typing import List, Callable, Any
+from functools import lru_cache
+from typing import List, Callable, Any, Dict, Optional
 import importlib
 import pkgutil
 
@@ -8,25 +9,47 @@ from auth.auth_realm import AuthRealmInterface
 from auth.util.jwt_singleton import get_jwt_handler
 from log import log_error
 
+# registry of the auth providers shipped with the server, by the auth_type they handle
+# only the providers of the configured auth types are imported, so e.g. pyrad is only loaded if RADIUS is used
+AUTH_PROVIDERS: Dict[str, str] = {
+    'local': 'auth.static.static_auth',
+    'radius': 'auth.radius.radius_auth',
+    'rest': 'auth.rest.rest_auth',
+}
 
+
+def _import_provider(name: str) -> Optional[Any]:
+    """
+    Import an auth provider module.
+    Returns None if the import fails, or the module does not expose the plugin API.
+    """
+    try:
+        mod = importlib.import_module(name)
+    except Exception as e:
+        # If a module fails to import, log an error and skip
+        log_error("AUTH", "Failed to import auth provider: " + name, e)
+        return None
+    # Only keep modules exposing the required plugin API
+    if hasattr(mod, 'auth_fits') and hasattr(mod, 'build_auth_realm'):
+        return mod
+    return None
+
+
+@lru_cache(maxsize=None)
 def _discover_auth_modules() -> List[Any]:
     """
     Discover all modules under the `auth` package whose name ends with `_auth`.
     Returns the imported module objects.
+    This imports every provider, so it is only used for auth types missing in AUTH_PROVIDERS.
     """
     modules: List[Any] = []
     import auth as auth_pkg  # root package for auth providers
     for finder, name, ispkg in pkgutil.walk_packages(auth_pkg.__path__, auth_pkg.__name__ + "."):
         # Only consider leaf modules that end with `_auth`
         if not ispkg and name.endswith("_auth"):
-            try:
-                mod = importlib.import_module(name)
-                # Only keep modules exposing the required plugin API
-                if hasattr(mod, 'auth_fits') and hasattr(mod, 'build_auth_realm'):
-                    modules.append(mod)
-            except Exception as e:
-                # If a module fails to import, log an error and skip
-                log_error("AUTH", "Failed to import auth provider: " + name, e)
+            mod = _import_provider(name)
+            if mod is not None:
+                modules.append(mod)
     return modules
 
 
@@ -44,6 +67,18 @@ def _select_provider(modules: List[Any], app: APIFlask, auth_type: str) -> Any:
     return None
 
 
+def _find_provider(app: APIFlask, auth_type: str) -> Any:
+    """
+    Find the provider of an auth type, from the registry or else by discovering all providers.
+    """
+    module_name = AUTH_PROVIDERS.get(auth_type)
+    if module_name is not None:
+        mod = _import_provider(module_name)
+        return _select_provider([mod], app, auth_type) if mod is not None else None
+    # e.g. a provider added to the auth package, without adding it to the registry
+    return _select_provider(_discover_auth_modules(), app, auth_type)
+
+
 def get_auth_if(app: APIFlask) -> AuthHandler:
     """
     Get the Auth Interface as a singleton
@@ -57,16 +92,13 @@ def get_auth_if(app: APIFlask) -> AuthHandler:
             jwt = get_jwt_handler(app)
             realms: List[AuthRealmInterface] = []
 
-            # read all auth providers from sub directories
-            providers = _discover_auth_modules()
-
             # auth order is a list of all auth realms configured
             # the order determines the priority
             auth_order = app.config.get('AUTH', {}).get('ORDER', 'local')
 
             for auth_type in auth_order.split(','):
                 auth_type = auth_type.strip().lower()
-                provider = _select_provider(providers, app, auth_type)
+                provider = _find_provider(app, auth_type)
                 if provider is None:
                     log_error("AUTH", "Unsupported APP_AUTH_ORDER TYPE: " + auth_type)
                     # ignore unknown types
@@ -82,7 +114,7 @@ def get_auth_if(app: APIFlask) -> AuthHandler:
                 realms.append(realm)
 
             # cast the realms to the auth handler and safe in the global context for the singleton
-            auth_if = AuthHandler(realms)
+            auth_if = AuthHandler(realms, jwt)
             app.config.setdefault('SINGLETONS', {})
             app.config['SINGLETONS']['AUTH'] = auth_if
 
@@ -1,28 +1,28 @@
 import time
 from typing import Optional, Tuple, List, Union, ByteString
-from pyrad.client import Client
-from pyrad.dictionary import Dictionary
 from pyrad.packet import AccessRequest, AccessAccept
 
 from auth.auth_user import AuthUser
 from auth.auth_realm import AuthRealmInterface
+from auth.radius.radius_client import RadiusClient, load_dictionary, parse_servers
 from auth.util.jwt_data import TokenData
 from auth.util.jwt_handler import JWTHandler
 from auth.util.role_map import parse_role_map, apply_role_map, RoleMap
 from auth.util.server_ip import get_server_ip
 from apiflask import APIFlask
-from log import log_info
+from log import log_info, log_error
 
 
 class RadiusAuthRealm(AuthRealmInterface):
+    realm_name = 'radius'
     jwt: JWTHandler
     role_map: RoleMap
-    client: Client
+    client: RadiusClient
 
-    def __init__(self, jwt: JWTHandler, server: str, secret: str, role_map: str):
+    def __init__(self, jwt: JWTHandler, client: RadiusClient, role_map: str):
         self.jwt = jwt
         self.role_map = parse_role_map(role_map)
-        self.client = Client(server=server, secret=secret, dict=Dictionary('dictionary'))
+        self.client = client
 
     def verify_token(self, token: str) -> Optional[AuthUser]:
         token_data = self.jwt.verify_token(token)
@@ -33,7 +33,7 @@ class RadiusAuthRealm(AuthRealmInterface):
 
     def check_login(self, username: str, password: str) -> Optional[Tuple[str, AuthUser]]:
         # Create a RADIUS Access Request packet
-        request = self.client.CreateAuthPacket(
+        request = self.client.create_auth_packet(
             code=AccessRequest,
             User_Name=username,
             NAS_IP_Address=get_server_ip(),
@@ -41,7 +41,11 @@ class RadiusAuthRealm(AuthRealmInterface):
         request['User-Password'] = request.PwCrypt(password) # Encrypt the password
 
         # Send the request to RADIUS server and await a response
-        response = self.client.SendPacket(request)
+        # other logins are handled concurrently in the meantime
+        response = self.client.send(request)
+        if response is None:
+            log_error('AUTH', 'No RADIUS server responded', {'username': username, 'client': self.client.stats()})
+            return None
         if response.code != AccessAccept:
             return None  # Login failed
 
@@ -78,7 +82,7 @@ class RadiusAuthRealm(AuthRealmInterface):
         token_data = TokenData(
             username=username,
             roles=user_roles,
-            realm='radius',
+            realm=self.realm_name,
             date_of_creation=int(time.time())
         )
         token = self.jwt.generate_token(token_data)
@@ -98,8 +102,22 @@ def build_auth_realm(app: APIFlask, jwt: JWTHandler) -> AuthRealmInterface:
     Build and return the StaticAuthRealm using values from app.config.
     """
     radius_cfg = app.config.get('AUTH', {}).get('RADIUS', {})
-    radius_server = radius_cfg.get('SERVER')
-    radius_secret = radius_cfg.get('SECRET')
+    radius_servers = parse_servers(radius_cfg.get('SERVER', ''))
+    radius_secret = radius_cfg.get('SECRET', '')
     radius_role_map = radius_cfg.get('ROLE_MAP', "")
-    log_info('AUTH', 'Adding Radius Realm', {'server': radius_server})
-    return RadiusAuthRealm(jwt, radius_server, radius_secret, radius_role_map)
+    client = RadiusClient(
+        servers=radius_servers,
+        # pyrad expects the secret as bytes
+        secret=radius_secret.encode('utf-8') if isinstance(radius_secret, str) else radius_secret,
+        dictionary=load_dictionary(radius_cfg.get('DICTIONARY', 'dictionary')),
+        timeout=float(radius_cfg.get('TIMEOUT', 5)),
+        retries=int(radius_cfg.get('RETRIES', 3)),
+        max_pending=int(radius_cfg.get('MAX_PENDING', 64)),
+    )
+    log_info('AUTH', 'Adding Radius Realm', {
+        'servers': [f'{host}:{port}' for host, port in radius_servers],
+        'timeout': client.timeout,
+        'retries': client.retries,
+        'max_pending': client.max_pending,
+    })
+    return RadiusAuthRealm(jwt, client, radius_role_map)
@@ -0,0 +1,285 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Dict, Tuple, Any, Coroutine
+
+from pyrad.client import Client
+from pyrad.dictionary import Dictionary
+from pyrad.packet import AuthPacket, PacketError
+
+from log import log_error, log_info
+
+DEFAULT_AUTH_PORT = 1812
+# RADIUS identifies requests by a single byte
+MAX_PACKET_IDS = 256
+# min size of a RADIUS packet: code, id, length & authenticator
+MIN_PACKET_SIZE = 20
+# extra seconds a blocking caller waits for the event loop, on top of the timeouts of the request
+RUN_TIMEOUT_SLACK = 5
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(path: str) -> Dictionary:
+    """
+    Load a RADIUS dictionary, only once per process and path.
+
+    :param path: Path of the dictionary file
+    :return: The parsed dictionary
+    """
+    return Dictionary(path)
+
+
+def parse_servers(servers: str) -> List[Tuple[str, int]]:
+    """
+    Parse a comma separated list of RADIUS servers.
+
+    :param servers: The servers, e.g. 'radius1, radius2:1645'
+    :return: Host & port of each server
+    """
+    result = []
+    for server in servers.split(','):
+        server = server.strip()
+        if not server:
+            continue
+        host, sep, port = server.rpartition(':')
+        if sep and port.isdigit() and not host.endswith(':'):
+            result.append((host.strip('[]'), int(port)))
+        else:
+            # no port given (or an IPv6 address without brackets)
+            result.append((server.strip('[]'), DEFAULT_AUTH_PORT))
+    return result
+
+
+class _RadiusProtocol(asyncio.DatagramProtocol):
+    """UDP endpoint of a single server, dispatches the replies to the waiting requests by their packet id"""
+
+    def __init__(self):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        # packet id -> request & the future waiting for its reply
+        self.pending: Dict[int, Tuple[AuthPacket, asyncio.Future]] = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        if len(data) < MIN_PACKET_SIZE:
+            return
+        entry = self.pending.get(data[1])
+        if entry is None:
+            # e.g. the late reply to a request that already timed out
+            return
+        request, future = entry
+        try:
+            reply = request.CreateReply(packet=data)
+        except PacketError:
+            return
+        if request.VerifyReply(reply, data) and not future.done():
+            future.set_result(reply)
+
+    def error_received(self, exc):
+        # e.g. ICMP port unreachable, the request simply times out
+        pass
+
+    def free_id(self) -> Optional[int]:
+        for packet_id in range(MAX_PACKET_IDS):
+            if packet_id not in self.pending:
+                return packet_id
+        return None
+
+
+@dataclass
+class _Server:
+    host: str
+    port: int
+    # failed servers are only tried again after this timestamp, if another server is available
+    dead_until: float = 0
+    protocol: Optional[_RadiusProtocol] = field(default=None, repr=False)
+
+
+class RadiusClient:
+    """
+    RADIUS client that sends the requests of multiple concurrent logins over a single UDP socket per server.
+
+    The requests run on a private event loop, so a waiting login does not hold a socket,
+    and many logins can be in flight at once (limited by max_pending).
+    Every request is retried on timeout, and fails over to the next server once all retries of a server failed.
+    A failed server is skipped for a while, as long as other servers are available.
+    """
+
+    def __init__(
+        self,
+        servers: List[Tuple[str, int]],
+        secret: bytes,
+        dictionary: Dictionary,
+        timeout: float = 5.0,
+        retries: int = 3,
+        max_pending: int = 64,
+        dead_seconds: float = 30.0,
+    ):
+        """
+        :param servers: Host & port of the servers, in order of priority
+        :param secret: The pre-shared secret of the servers
+        :param dictionary: The RADIUS dictionary
+        :param timeout: Seconds to wait for a reply, before the request is sent again
+        :param retries: Number of attempts per server
+        :param max_pending: Max number of requests in flight, further logins wait for a free slot
+        :param dead_seconds: Seconds a failed server is skipped
+        """
+        if not servers:
+            raise ValueError('No RADIUS server configured')
+        self.servers = [_Server(host, port) for host, port in servers]
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self.max_pending = max(1, min(max_pending, MAX_PACKET_IDS - 1))
+        self.dead_seconds = dead_seconds
+        # only used to build the packets, the requests are sent by this client
+        self._packets = Client(server=servers[0][0], authport=servers[0][1], secret=secret, dict=dictionary)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'failovers': 0, 'timeouts': 0}
+
+        # the loop is created on first use, so forked processes get their own loop & sockets
+        self._loop_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots = asyncio.Semaphore(self.max_pending)
+
+    def _count(self, key: str, value: int = 1):
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the counters and the servers currently skipped"""
+        with self._stats_lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        now = time.monotonic()
+        stats['dead_servers'] = [f'{s.host}:{s.port}' for s in self.servers if s.dead_until > now]
+        return stats
+
+    def create_auth_packet(self, **attributes) -> AuthPacket:
+        """
+        Create an Access-Request packet.
+
+        :param attributes: The attributes of the packet, see pyrad.client.Client.CreateAuthPacket
+        :return: The packet
+        """
+        return self._packets.CreateAuthPacket(**attributes)
+
+    async def _endpoint(self, server: _Server) -> _RadiusProtocol:
+        if server.protocol is None or server.protocol.transport is None or server.protocol.transport.is_closing():
+            _, protocol = await asyncio.get_running_loop().create_datagram_endpoint(
+                _RadiusProtocol,
+                remote_addr=(server.host, server.port),
+            )
+            server.protocol = protocol
+        return server.protocol
+
+    async def _send_to(self, server: _Server, packet: AuthPacket) -> Optional[AuthPacket]:
+        protocol = await self._endpoint(server)
+        packet_id = protocol.free_id()
+        if packet_id is None:
+            return None
+        packet.id = packet_id
+        raw = packet.RequestPacket()
+
+        future = asyncio.get_running_loop().create_future()
+        protocol.pending[packet_id] = (packet, future)
+        try:
+            for attempt in range(self.retries):
+                if attempt > 0:
+                    self._count('retries')
+                protocol.transport.sendto(raw)
+                try:
+                    # shielded, so a timeout does not cancel the future a late reply is delivered to
+                    return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                except asyncio.TimeoutError:
+                    self._count('timeouts')
+            return None
+        finally:
+            del protocol.pending[packet_id]
+
+    def _server_order(self) -> List[_Server]:
+        now = time.monotonic()
+        alive = [s for s in self.servers if s.dead_until <= now]
+        dead = [s for s in self.servers if s.dead_until > now]
+        return alive + dead
+
+    async def asend(self, packet: AuthPacket) -> Optional[AuthPacket]:
+        """
+        Send a packet, failing over to the next server if a server does not respond.
+
+        :param packet: The packet to send
+        :return: The reply, None if no server replied
+        """
+        async with self._slots:
+            self._count('requests')
+            for i, server in enumerate(self._server_order()):
+                if i > 0:
+                    self._count('failovers')
+                try:
+                    reply = await self._send_to(server, packet)
+                except OSError as e:
+                    log_error('AUTH', 'Failed to send RADIUS request', {'server': server.host, 'error': str(e)})
+                    reply = None
+                if reply is not None:
+                    server.dead_until = 0
+                    return reply
+                if server.dead_until <= time.monotonic():
+                    log_error('AUTH', 'RADIUS server does not respond, skipping it', {
+                        'server': server.host,
+                        'port': server.port,
+                        'seconds': self.dead_seconds,
+                    })
+                server.dead_until = time.monotonic() + self.dead_seconds
+            return None
+
+    def _run(self, coro: Coroutine) -> Any:
+        """
+        Run a coroutine on the event loop of the client, and wait for its result.
+
+        :param coro: The coroutine to run
+        :return: The result of the coroutine
+        :raise TimeoutError: If the coroutine did not finish in time, it is cancelled
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='radius-client', daemon=True).start()
+                self._loop = loop
+        future: Future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+        # a request makes all attempts on every server before it gives up
+        timeout = len(self.servers) * self.retries * self.timeout + RUN_TIMEOUT_SLACK
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            log_error('AUTH', 'RADIUS request did not finish in time', {
+                'servers': len(self.servers),
+                'timeout': timeout,
+            })
+            raise
+
+    def send(self, packet: AuthPacket) -> Optional[AuthPacket]:
+        """Blocking variant of asend, only blocks the calling thread, other logins continue"""
+        try:
+            return self._run(self.asend(packet))
+        except TimeoutError:
+            return None
+
+    def close(self):
+        """Close all sockets and stop the event loop"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        for server in self.servers:
+            if server.protocol is not None and server.protocol.transport is not None:
+                loop.call_soon_threadsafe(server.protocol.transport.close)
+            server.protocol = None
+        # the semaphore is bound to the stopped loop
+        self._slots = asyncio.Semaphore(self.max_pending)
+        loop.call_soon_threadsafe(loop.stop)
+        log_info('AUTH', 'Closed RADIUS client', self.stats())
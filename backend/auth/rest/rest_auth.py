@@ -1,14 +1,20 @@
 import copy
 from typing import Optional, Tuple, Dict, Any
+import jwt
 import requests
+from requests.adapters import HTTPAdapter
 from flask import request
 
 from auth.auth_user import AuthUser
 from auth.auth_realm import AuthRealmInterface
 from auth.util.role_map import parse_role_map, apply_role_map, RoleMap
+from auth.util.token_cache import TokenCache
 from log import log_info, log_error
 from apiflask import APIFlask
 
+# statuses of the verify endpoint that reject a token, all others might be temporary (e.g. 408, 429 or 5xx)
+REJECTED_STATUS_CODES = (401, 403)
+
 
 class RESTAuthRealm(AuthRealmInterface):
     verify_url: str
@@ -16,6 +22,8 @@ class RESTAuthRealm(AuthRealmInterface):
     ssl_verify: bool
     paths: Dict[str, str]
     role_map: RoleMap
+    token_cache: TokenCache
+    session: requests.Session
 
     def __init__(
         self,
@@ -24,6 +32,8 @@ class RESTAuthRealm(AuthRealmInterface):
         ssl_verify: bool,
         paths: Dict[str, str],
         role_map: str,
+        token_cache: Optional[TokenCache] = None,
+        pool_size: int = 10,
     ):
         """
         :param auth_url: URL to authenticate with username / pw
@@ -33,15 +43,26 @@ class RESTAuthRealm(AuthRealmInterface):
             Example: {
                 'username': 'user.name',
                 'groups': 'user.groups',
-                'token': 'token'
+                'token': 'token',
+                'expires': 'expires_at',
             }
         :param role_map: A string of role mappings in the format:
+        :param token_cache: Cache for verified tokens, no caching if not given
+        :param pool_size: Max number of (kept alive) connections to the API Endpoints
         """
         self.verify_url = verify_url
         self.auth_url = auth_url
         self.ssl_verify = ssl_verify
         self.paths = paths
         self.role_map = parse_role_map(role_map)
+        self.token_cache = token_cache or TokenCache(0, 0, 0)
+
+        # reuse the connections to the API Endpoints, instead of a new (TLS) handshake for every request
+        self.session = requests.Session()
+        self.session.verify = ssl_verify
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     @staticmethod
     def _get_json_key(json_obj: Dict[str, Any], key: str) -> Any:
@@ -116,24 +137,58 @@ class RESTAuthRealm(AuthRealmInterface):
 
         return rest_token, user
 
+    def _token_expiry(self, token: str, resp_obj: Any) -> Optional[float]:
+        """
+        Get the timestamp a token expires at, so it is not cached any longer.
+
+        Uses the expiry in the response of the verify endpoint, or the 'exp' claim if the token is a JWT.
+        The signature of the JWT is not checked, since the endpoint already verified the token.
+
+        :param token: The verified token
+        :param resp_obj: The JSON response of the verify endpoint
+        :return: The expiry as unix timestamp, None if unknown
+        """
+        expiry_path = self.paths.get('expires')
+        if expiry_path and isinstance(resp_obj, dict):
+            expires_at = self._get_json_key(resp_obj, expiry_path)
+            if isinstance(expires_at, (int, float)):
+                return float(expires_at)
+        try:
+            claims = jwt.decode(token, options={'verify_signature': False})
+        except jwt.PyJWTError:
+            # an opaque token
+            return None
+        exp = claims.get('exp')
+        return float(exp) if isinstance(exp, (int, float)) else None
+
     def verify_token(self, token: str) -> Optional[AuthUser]:
+        hit, user = self.token_cache.get(token)
+        if hit:
+            return user
+
         payload = {
             'token': token,
         }
 
         try:
-            r = requests.post(
+            r = self.session.post(
                 self.verify_url,
-                verify=self.ssl_verify,
                 json=payload,
             )
 
             _, user = self._process_auth_response(r)
-            return user
         except requests.RequestException as e:
+            # do not cache, the endpoint might be available again for the next request
             log_error('Auth', f'Authentication error: SRC_IP:{request.remote_addr}', e)
             return None
 
+        if user is not None:
+            self.token_cache.put(token, user, self._token_expiry(token, r.json()))
+        elif r.status_code in REJECTED_STATUS_CODES:
+            # only cache a rejection, not an error or rate limit of the endpoint
+            self.token_cache.put(token, None)
+        return user
+
     def check_login(self, username: str, password: str) -> Optional[Tuple[str, AuthUser]]:
         payload = {
             'username': username,
@@ -141,10 +196,9 @@ class RESTAuthRealm(AuthRealmInterface):
         }
 
         try:
-            r = requests.post(
+            r = self.session.post(
                 self.auth_url,
                 json=payload,
-                verify=self.ssl_verify,
             )
 
             return self._process_auth_response(r)
@@ -175,11 +229,22 @@ def build_auth_realm(app: APIFlask, _jwt_unused) -> AuthRealmInterface:
         'username': rest_cfg.get('PATH_USERNAME', 'username'),
         'groups': rest_cfg.get('PATH_GROUPS', 'groups'),
         'token': rest_cfg.get('PATH_TOKEN', 'token'),
+        'expires': rest_cfg.get('PATH_EXPIRES', ''),
     }
+    token_cache = TokenCache(
+        ttl=float(rest_cfg.get('CACHE_TTL', 60)),
+        negative_ttl=float(rest_cfg.get('CACHE_NEG_TTL', 5)),
+        max_size=int(rest_cfg.get('CACHE_SIZE', 1024)),
+    )
+    pool_size = int(rest_cfg.get('POOL_SIZE', 10))
     log_info('AUTH', 'Adding REST Realm', {
         'auth_url': auth_url,
         'verify_url': verify_url,
         'ssl_verify': ssl_verify,
         'paths': paths,
+        'cache_ttl': token_cache.ttl,
+        'cache_negative_ttl': token_cache.negative_ttl,
+        'cache_size': token_cache.max_size,
+        'pool_size': pool_size,
     })
-    return RESTAuthRealm(auth_url, verify_url, ssl_verify, paths, rest_role_map)
+    return RESTAuthRealm(auth_url, verify_url, ssl_verify, paths, rest_role_map, token_cache, pool_size)
@@ -11,6 +11,7 @@ from apiflask import APIFlask
 
 
 class StaticAuthRealm(AuthRealmInterface):
+    realm_name = 'static'
     jwt: JWTHandler
     auth_user: str
     auth_password: str
@@ -38,7 +39,7 @@ class StaticAuthRealm(AuthRealmInterface):
         token_data = TokenData(
             username=username,
             roles=[AUTH_ROLES_RO, AUTH_ROLES_RW],
-            realm='static',
+            realm=self.realm_name,
             date_of_creation=int(time.time())
         )
         token = self.jwt.generate_token(token_data)
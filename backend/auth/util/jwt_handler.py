@@ -3,15 +3,23 @@ import datetime
 from typing import Optional
 
 from auth.util.jwt_data import TokenData
+from auth.util.token_cache import TokenCache
 
 
 class JWTHandler:
     lifetime: int
     secret_key: str
+    cache: TokenCache
 
-    def __init__(self, lifetime: int, secret_key: str):
+    def __init__(self, lifetime: int, secret_key: str, cache: Optional[TokenCache] = None):
+        """
+        :param lifetime: Lifetime of generated tokens in seconds
+        :param secret_key: Secret to sign the tokens with
+        :param cache: Cache for decoded tokens, no caching if not given
+        """
         self.lifetime = lifetime
         self.secret_key = secret_key
+        self.cache = cache or TokenCache(0, 0, 0)
 
     def generate_token(self, data: TokenData) -> str:
         """
@@ -36,9 +44,16 @@ class JWTHandler:
         """
         Verify a JWT token and return the decoded payload if valid.
 
+        Valid tokens are cached until they expire (at most for the TTL of the cache),
+        so the signature of a token is only checked once, and not on every request.
+
         :param token: JWT token as a string.
         :return: Decoded payload as a dictionary if the token is valid, otherwise None.
         """
+        hit, data = self.cache.get(token)
+        if hit:
+            return data
+
         try:
             # decode the token using the secret key
             decoded_data = jwt.decode(token, self.secret_key, algorithms=['HS256'])
@@ -46,10 +61,35 @@ class JWTHandler:
             if not data:
                 # the token Content is invalid
                 return None
-            return TokenData.from_dict(data)
+            token_data = TokenData.from_dict(data)
         except jwt.ExpiredSignatureError:
             # the token has expired
             return None
         except jwt.InvalidTokenError:
             # the token is invalid
             return None
+
+        self.cache.put(token, token_data, decoded_data.get('exp'))
+        return token_data
+
+    def realm_hint(self, token: str) -> Optional[str]:
+        """
+        Read the realm that issued a token, without verifying it.
+
+        Only used to decide which realm verifies the token, never to trust its content.
+        Cached tokens were already verified, so they are only decoded on a cache miss.
+
+        :param token: JWT token as a string.
+        :return: The realm stored in the token, None if it is no JWT (e.g. the token of a remote API)
+        """
+        hit, data = self.cache.get(token)
+        if hit:
+            return data.realm if data is not None else None
+
+        try:
+            payload = jwt.decode(token, options={'verify_signature': False})
+        except jwt.InvalidTokenError:
+            return None
+        data = payload.get('data')
+        realm = data.get('realm') if isinstance(data, dict) else None
+        return realm if isinstance(realm, str) else None
@@ -1,6 +1,7 @@
 from apiflask import APIFlask
 
 from auth.util.jwt_handler import JWTHandler
+from auth.util.token_cache import TokenCache
 
 
 def get_jwt_handler(app: APIFlask) -> JWTHandler:
@@ -10,8 +11,14 @@ def get_jwt_handler(app: APIFlask) -> JWTHandler:
         if jwt_handler is None:
             lifetime = int(app.config.get('JWT', {}).get('LIFETIME', '21600'))
             secret_key = app.config.get('JWT', {}).get('SECRET')
+            # invalid tokens are not cached, checking them is cheap compared to the memory they could fill
+            cache = TokenCache(
+                ttl=float(app.config.get('JWT', {}).get('CACHE_TTL', '300')),
+                negative_ttl=0,
+                max_size=int(app.config.get('JWT', {}).get('CACHE_SIZE', '1024')),
+            )
 
-            jwt_handler = JWTHandler(lifetime, secret_key)
+            jwt_handler = JWTHandler(lifetime, secret_key, cache)
             app.config.setdefault('SINGLETONS', {})
             app.config['SINGLETONS']['JWT'] = jwt_handler
 
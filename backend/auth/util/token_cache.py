@@ -0,0 +1,93 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+def hash_token(token: str) -> str:
+    """
+    Hash a token, so the cache does not keep the raw tokens in memory.
+
+    :param token: The token to hash
+    :return: Hex digest of the token
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class TokenCache:
+    """
+    Bounded cache of token verification results, keyed by the hash of the token.
+
+    Every entry has its own expiry, which is never later than the TTL of the cache.
+    Negative results (None) are cached as well, but with a separate (usually shorter) TTL.
+    Once the cache is full, the least recently used entries are evicted.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_size: int):
+        """
+        :param ttl: Max seconds a positive result is cached, 0 disables the cache
+        :param negative_ttl: Max seconds a negative result is cached, 0 disables negative caching
+        :param max_size: Max number of cached tokens
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # token hash -> (expires at, result)
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and (self.ttl > 0 or self.negative_ttl > 0)
+
+    def get(self, token: str) -> Tuple[bool, Optional[Any]]:
+        """
+        Look up a token.
+
+        :param token: The token to look up
+        :return: True & the cached result on a hit, False & None otherwise
+        """
+        if not self.enabled:
+            return False, None
+        key = hash_token(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, result = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, result
+
+    def put(self, token: str, result: Optional[Any], expires_at: Optional[float] = None):
+        """
+        Cache the result of a verification.
+
+        :param token: The verified token
+        :param result: The result, None for an invalid token
+        :param expires_at: Optional timestamp the token itself expires at, caps the TTL
+        """
+        ttl = self.ttl if result is not None else self.negative_ttl
+        if not self.enabled or ttl <= 0:
+            return
+        now = time.time()
+        cache_until = now + ttl
+        if expires_at is not None:
+            cache_until = min(cache_until, expires_at)
+        if cache_until <= now:
+            # already expired
+            return
+
+        key = hash_token(token)
+        with self._lock:
+            self._entries[key] = (cache_until, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,18 +1,24 @@
+import threading
 import traceback
-import urllib3
 from datetime import timedelta, datetime, timezone
+from typing import TYPE_CHECKING
 from apiflask import APIFlask
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 
-from background.query_bc import ServerCredentials, query_all
+from background.bc_client import BCClient, ServerCredentials
+from background.query_bc import refresh_due
+from background.task_queue import TaskQueue
 from background.load_existing_db import load_existing_file
 from background.task import execute_load_existing_task, execute_commit, execute_cleanup_existing, execute_revert, \
-    execute_refresh_bc_cats
+    execute_refresh_bc_cats, execute_load_existing_file_task, execute_load_existing_files_task
 from db.db_singleton import get_db
+from db.dbmodel.task import Task
 from db.middleware.stagingdb.db import StagingDB
 from log import log_debug, log_error
 
+if TYPE_CHECKING:
+    # apscheduler is only imported by the worker that runs the scheduler
+    from apscheduler.schedulers.background import BackgroundScheduler
+
 TIME_MINUTES = 60
 
 # Allows up to 15 minutes as a grace period if the Scheduler is busy / blocked by other stuff
@@ -28,18 +34,18 @@ def start_background_tasks(app: APIFlask):
     log_debug('BACKGROUND', 'Starting Background Tasks...', { 'tz': tz })
 
     # Prepare the Scheduler
+    from apscheduler.schedulers.background import BackgroundScheduler
     scheduler = BackgroundScheduler({'apscheduler.timezone': tz})
 
     # add all tasks
     start_query_bc(scheduler, app, tz)
     start_load_existing(scheduler, app)
-    start_task_scheduler(scheduler, app)
 
     # Start the Scheduler
     scheduler.start()
 
 
-def start_load_existing(scheduler: BackgroundScheduler, app: APIFlask):
+def start_load_existing(scheduler: 'BackgroundScheduler', app: APIFlask):
     """
     Initialize the background task to load an existing LocalDB File.
     Currently only done once after startup.
@@ -83,65 +89,96 @@ def start_load_existing(scheduler: BackgroundScheduler, app: APIFlask):
     )
 
 
-def start_task_scheduler(scheduler: BackgroundScheduler, app: APIFlask):
+def start_task_queue(app: APIFlask):
     """
-    Initialize the background task to check for pending tasks and start them.
+    Initialize the task queue, which runs pending tasks as soon as they are added.
+    Tasks are claimed atomically, so this can (and should) be started in every worker.
 
-    :param scheduler: The scheduler to use
     :param app: The flask app to use
     """
-    log_debug('BACKGROUND', 'Preparing Background Tasks "start_task_scheduler"')
+    tasks_conf: dict = app.config.get('TASKS', {})
+    workers = int(tasks_conf.get('WORKERS', '2'))
+    poll_interval = float(tasks_conf.get('POLL_INTERVAL', '30'))
+    lease_seconds = int(tasks_conf.get('LEASE', '120'))
 
-    # wrapper to use the app_context
-    # this allows us to use the existing db_singleton stored as a flask global object
-    def task_executor(a: APIFlask):
-        with a.app_context():
-            try:
-                log_debug('BACKGROUND', 'executing task_scheduler background task')
-                db_if = get_db()
-
-                # try to fetch the next pending task from the DB
-                task = db_if.tasks.get_next_pending_task()
-                log_debug("BACKGROUND", "next pending task", task, exclude_keys=("parameters",))
-
-                # if a task is defined go based on the task.name
-                # if no task is defined, we do nothing
-                if task and task.name == "load_existing":
-                    execute_load_existing_task(db_if, task)
-                elif task and task.name == 'cleanup_unused':
-                    execute_cleanup_existing(db_if, task)
-                elif task and task.name == 'refresh_bc':
-                    credentials = get_bc_credentials(app)
-                    execute_refresh_bc_cats(db_if, task, credentials)
-                elif task and task.name == "commit":
-                    if isinstance(db_if, StagingDB):
-                        execute_commit(db_if, task)
-                    else:
-                        log_error('BACKGROUND', 'Cannot commit to non-staging DB')
-                        db_if.tasks.update_task_status(task.id, 'failed')
-                elif task and task.name == 'revert_uncommitted':
-                    if isinstance(db_if, StagingDB):
-                        execute_revert(db_if, task)
-                    else:
-                        log_error('BACKGROUND', 'Cannot revert uncommitted changes to non-staging DB')
-                        db_if.tasks.update_task_status(task.id, 'failed')
-                elif task:
-                    log_debug('BACKGROUND', f'Unknown task type: {task.name} in task {task.id}')
-                    db_if.tasks.update_task_status(task.id, 'unknown')
-            except Exception as e:
-                log_error('BACKGROUND', 'Error executing task_scheduler background task', {
-                    'error': str(e),
-                    'traceback': traceback.format_exc(),
-                })
+    log_debug('BACKGROUND', 'Preparing Background Tasks "start_task_queue"')
+
+    TaskQueue(app, lambda task: execute_task(app, task), workers, poll_interval, lease_seconds).start()
 
-    # run every 30 seconds
-    scheduler.add_job(
-        lambda: task_executor(app),
-        'interval',
-        seconds=30,
-        misfire_grace_time=MISFIRE_GRACE_TIME,
-        id='check_task_queue',
-    )
+
+def execute_task(app: APIFlask, task: Task):
+    """
+    Execute a single task, based on its name.
+    Has to run inside an app_context, to use the existing db_singleton stored as a flask global object.
+
+    :param app: The flask app to use
+    :param task: The task to execute
+    """
+    db_if = get_db()
+
+    # go based on the task.name
+    if task.name == "load_existing":
+        execute_load_existing_task(db_if, task)
+    elif task.name == "load_existing_file":
+        execute_load_existing_file_task(db_if, task, get_upload_dir(app))
+    elif task.name == "load_existing_files":
+        execute_load_existing_files_task(db_if, task, get_upload_dir(app), get_import_workers(app))
+    elif task.name == 'cleanup_unused':
+        execute_cleanup_existing(db_if, task)
+    elif task.name == 'refresh_bc':
+        execute_refresh_bc_cats(db_if, task, get_bc_client(app), get_bc_ttl(app))
+    elif task.name == "commit":
+        if isinstance(db_if, StagingDB):
+            execute_commit(db_if, task)
+        else:
+            log_error('BACKGROUND', 'Cannot commit to non-staging DB')
+            db_if.tasks.update_task_status(task.id, 'failed', task.lease_owner)
+    elif task.name == 'revert_uncommitted':
+        if isinstance(db_if, StagingDB):
+            execute_revert(db_if, task)
+        else:
+            log_error('BACKGROUND', 'Cannot revert uncommitted changes to non-staging DB')
+            db_if.tasks.update_task_status(task.id, 'failed', task.lease_owner)
+    else:
+        log_debug('BACKGROUND', f'Unknown task type: {task.name} in task {task.id}')
+        db_if.tasks.update_task_status(task.id, 'unknown', task.lease_owner)
+
+
+def get_upload_dir(app: APIFlask) -> str:
+    return app.config.get('UPLOAD', {}).get('PATH', './data/uploads')
+
+
+def get_import_workers(app: APIFlask) -> int:
+    return int(app.config.get('IMPORT', {}).get('WORKERS', '4'))
+
+
+def get_bc_ttl(app: APIFlask) -> int:
+    """Get the TTL of a BC rating, in seconds"""
+    return int(app.config.get('BC', {}).get('TTL', 7 * 24 * 60)) * TIME_MINUTES
+
+
+_bc_client_lock = threading.Lock()
+
+
+def get_bc_client(app: APIFlask) -> BCClient:
+    """Get the client for the BC proxy, shared by all threads of the process"""
+    client = app.config.get('SINGLETONS', {}).get('BC_CLIENT', None)
+
+    if client is None:
+        with _bc_client_lock:
+            # another thread might have created the client while we waited for the lock
+            client = app.config.get('SINGLETONS', {}).get('BC_CLIENT', None)
+            if client is None:
+                query_bc_conf: dict = app.config.get('BC', {})
+                client = BCClient(
+                    get_bc_credentials(app),
+                    max_connections=int(query_bc_conf.get('CONNECTIONS', '4')),
+                    timeout=float(query_bc_conf.get('TIMEOUT', '10')),
+                )
+                app.config.setdefault('SINGLETONS', {})
+                app.config['SINGLETONS']['BC_CLIENT'] = client
+
+    return client
 
 
 def get_bc_credentials(app: APIFlask) -> ServerCredentials:
@@ -151,11 +188,7 @@ def get_bc_credentials(app: APIFlask) -> ServerCredentials:
     bc_password = query_bc_conf.get('PASSWORD')
     # check for false or not false, so that we default to 'true' for all other values
     bc_verify_ssl = query_bc_conf.get('VERIFY_SSL', 'true').lower() != 'false'
-
-
-    if not bc_verify_ssl:
-        # hide warnings telling us to enable ssl verification
-        urllib3.disable_warnings()
+    bc_port = int(query_bc_conf.get('PORT', '8082'))
 
     # build a credential object to make it easier to pass them around
     return ServerCredentials(
@@ -163,57 +196,56 @@ def get_bc_credentials(app: APIFlask) -> ServerCredentials:
         user=bc_user,
         password=bc_password,
         verifySSL=bc_verify_ssl,
+        port=bc_port,
     )
 
-def start_query_bc(scheduler: BackgroundScheduler, app: APIFlask, tz: str):
+def start_query_bc(scheduler: 'BackgroundScheduler', app: APIFlask, tz: str):
     """
     Initialize the background task to query URL Categories from Bluecoat DB
     This is only possible with the Mgmt API of a Proxy Device
 
+    Every tick only the due URLs are queried, new URLs are due immediately,
+    and the refreshes of known URLs are spread over the day.
+
     :param scheduler: The scheduler to use
     :param app: The flask app to use
-    :param tz: The timezone to use for cron triggers
+    :param tz: The timezone to use for the triggers
     """
 
+    from apscheduler.triggers.interval import IntervalTrigger
+
     # load required config variables
     query_bc_conf: dict = app.config.get('BC', {})
-    bc_interval = query_bc_conf.get('INTERVAL', '0 3 * * *')
-    bc_ttl = int(query_bc_conf.get('TTL', 7 * 24 * 60)) * TIME_MINUTES
-    credentials = get_bc_credentials(app)
+    bc_tick = int(query_bc_conf.get('TICK', '60'))
+    bc_ttl = get_bc_ttl(app)
+    client = get_bc_client(app)
     log_debug('BACKGROUND', 'Preparing Background Tasks "start_query_bc"', {
-        'interval': bc_interval,
+        'tick': bc_tick,
         'ttl': bc_ttl,
-        'base-url': credentials.sanitized_query(""),
+        'base-url': client.credentials.sanitized_query(""),
     })
 
-    def startup_and_enable_schedule():
-        query_executor(app, credentials, bc_ttl)
-        # add the long-terms chedule
-        scheduler.add_job(
-            lambda: query_executor(app, credentials, bc_ttl),
-            CronTrigger.from_crontab(bc_interval, timezone=tz),
-            misfire_grace_time=MISFIRE_GRACE_TIME,
-            id='query_bc_cron',
-        )
-
     # wrapper to use the app_context
     # this allows us to use the existing db_singleton stored as a flask global object
-    def query_executor(a: APIFlask, c: ServerCredentials, ttl: int):
+    def query_executor(a: APIFlask, c: BCClient, ttl: int):
         with a.app_context():
             try:
                 log_debug('BACKGROUND', 'executing query_bc background task')
-                query_all(get_db(), c, ttl)
+                refresh_due(get_db(), c, ttl)
             except Exception as e:
                 log_error('BACKGROUND', 'Error executing query_bc background task', {
                     'error': str(e),
                     'traceback': traceback.format_exc(),
                 })
 
-    # run once a few minutes after the system start
+    # start a few minutes after the system start
+    # a tick that is still running when the next one is due skips the next one (max_instances=1)
     scheduler.add_job(
-        lambda: startup_and_enable_schedule(),
-        'date',
-        run_date=datetime.now(timezone.utc) + timedelta(seconds=3*TIME_MINUTES),
-        misfire_grace_time=None, # type: ignore[arg-type]
-        id='query_bc_startup',
+        lambda: query_executor(app, client, bc_ttl),
+        IntervalTrigger(seconds=bc_tick, timezone=tz),
+        next_run_time=datetime.now(timezone.utc) + timedelta(seconds=3*TIME_MINUTES),
+        misfire_grace_time=MISFIRE_GRACE_TIME,
+        coalesce=True,
+        max_instances=1,
+        id='query_bc_tick',
     )
@@ -0,0 +1,469 @@
+import asyncio
+import base64
+import math
+import ssl
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Dict, Any, Iterable, Coroutine
+from urllib.parse import quote
+
+from db.dbmodel.url import FAILED_LOOKUP
+from log import log_error, log_info
+from metrics import BC_QUERY_SECONDS, BC_QUERIES
+
+# upper bounds (in ms) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+# consecutive failures after which the circuit opens, and seconds until a single request may try again
+BREAKER_FAILURES = 5
+BREAKER_RESET_SECONDS = 30
+# max size of the status line & headers of a response
+MAX_HEADER_LINE = 8 * 1024
+# extra seconds a blocking caller waits for the event loop, on top of the timeouts of the requests
+RUN_TIMEOUT_SLACK = 5
+
+
+@dataclass
+class ServerCredentials:
+    """Utility Class to store all credentials for querying the Proxy server"""
+    server: str
+    user: str
+    password: str
+    verifySSL: bool
+    port: int = 8082
+    use_tls: bool = True
+
+    def path(self, url: str) -> str:
+        """Build the path of the TestUrl API for a URL"""
+        return f'/ContentFilter/TestUrl/{quote(url, safe="")}'
+
+    def sanitized_query(self, url: str):
+        """Build a base URL which does not include the password"""
+        scheme = 'https' if self.use_tls else 'http'
+        return f'{scheme}://{self.user}@{self.server}:{self.port}{self.path(url)}'
+
+    def authorization(self) -> str:
+        """Build the value of the basic auth header"""
+        token = base64.b64encode(f'{self.user}:{self.password}'.encode('utf-8')).decode('ascii')
+        return f'Basic {token}'
+
+
+def parse_bc_categories(raw_content: str) -> Optional[List[str]]:
+    """
+    Parse the BlueCoat Categories from the response of the TestUrl API.
+
+    :param raw_content: The body of the response
+    :return: The categories, None if the response does not include them
+    """
+    # the Category is a ';' separated list beginning with 'Blue Coat:'
+    # There is a second one starting with the same name, which would include groups
+    for line in raw_content.splitlines():
+        if 'Blue Coat:' in line:
+            return line.split('Blue Coat:')[1].strip().split('; ')
+    return None
+
+
+class LatencyHistogram:
+    """Thread-safe histogram of request latencies, with fixed buckets"""
+
+    def __init__(self, buckets_ms: List[int] = LATENCY_BUCKETS_MS):
+        self._lock = threading.Lock()
+        self.buckets_ms = list(buckets_ms)
+        # one additional bucket for everything above the last bound
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.sum_seconds = 0.0
+
+    def observe(self, seconds: float):
+        idx = bisect_left(self.buckets_ms, seconds * 1000)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.sum_seconds += seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f'le_{b}ms' for b in self.buckets_ms] + ['inf']
+            return {
+                'count': self.count,
+                'avg_ms': round(self.sum_seconds * 1000 / self.count, 2) if self.count else 0,
+                'buckets': dict(zip(labels, self.counts)),
+            }
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to an appliance that keeps failing.
+
+    After `failures` consecutive failures the circuit opens, and all requests fail fast.
+    Once `reset_seconds` passed, a single request is let through (half-open),
+    its result decides whether the circuit closes again or stays open.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self._lock = threading.Lock()
+        self._max_failures = failures
+        self._reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def reset_seconds(self) -> float:
+        return self._reset_seconds
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._trial_running or time.monotonic() - self._opened_at >= self._reset_seconds:
+                return 'half-open'
+            return 'open'
+
+    def allow(self) -> bool:
+        """Check if a request may be sent"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self._reset_seconds:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> bool:
+        """
+        Count a failed request.
+
+        :return: True if this failure opened the circuit
+        """
+        with self._lock:
+            self._failures += 1
+            was_open = self._opened_at is not None
+            if self._trial_running or self._failures >= self._max_failures:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+            return not was_open and self._opened_at is not None
+
+    def release_trial(self):
+        """Let another request try again, if the trial request was cancelled before it had a result"""
+        with self._lock:
+            self._trial_running = False
+
+
+class BCRequestError(Exception):
+    """A request against the appliance failed (transport error, timeout or error status)"""
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.requests = 0
+
+    def close(self):
+        self.writer.close()
+
+
+class BCClient:
+    """
+    Async client for the ContentFilter/TestUrl API of a ProxySG appliance.
+
+    Keeps up to `max_connections` HTTP/1.1 keep-alive connections open and reuses them for all requests.
+    Every request has a timeout, repeated failures open a circuit breaker so a broken appliance
+    does not stall the callers, and the latency of all requests is tracked in a histogram.
+
+    The coroutines (aquery, aquery_many) must run on the event loop of the client.
+    The blocking variants (query, query_many) may be called from any thread, they run the coroutines
+    on a private event loop thread, so the connections are shared by all threads of the process.
+    """
+
+    def __init__(
+        self,
+        credentials: ServerCredentials,
+        max_connections: int = 4,
+        timeout: float = 10.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        :param credentials: The appliance to query
+        :param max_connections: Max number of parallel connections
+        :param timeout: Max seconds for connecting, and for receiving a response
+        :param breaker: Optional circuit breaker, a new one is created if not given
+        """
+        self.credentials = credentials
+        self.max_connections = max(1, max_connections)
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self._ssl_context = self._build_ssl_context() if credentials.use_tls else None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'errors': 0, 'rejected': 0, 'connections_opened': 0, 'connections_reused': 0}
+
+        # the loop is created on first use, so forked processes get their own loop & connections
+        self._loop_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots = asyncio.Semaphore(self.max_connections)
+        self._idle: List[_Connection] = []
+
+    def _build_ssl_context(self) -> ssl.SSLContext:
+        context = ssl.create_default_context()
+        if not self.credentials.verifySSL:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+    def _count(self, key: str, value: int = 1):
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the counters, the state of the circuit breaker and the latency histogram"""
+        with self._stats_lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        stats['idle_connections'] = len(self._idle)
+        stats['breaker'] = self.breaker.state
+        stats['latency'] = self.latency.to_dict()
+        return stats
+
+    ## connection handling
+
+    async def _open(self) -> _Connection:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.credentials.server,
+                self.credentials.port,
+                ssl=self._ssl_context,
+                limit=MAX_HEADER_LINE * 8,
+            ),
+            self.timeout,
+        )
+        self._count('connections_opened')
+        return _Connection(reader, writer)
+
+    async def _acquire(self) -> _Connection:
+        while self._idle:
+            conn = self._idle.pop()
+            # the appliance might have closed an idle connection in the meantime
+            if not conn.reader.at_eof() and not conn.writer.is_closing():
+                self._count('connections_reused')
+                return conn
+            conn.close()
+        return await self._open()
+
+    def _release(self, conn: _Connection, reusable: bool):
+        if reusable and len(self._idle) < self.max_connections:
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+    ## HTTP/1.1
+
+    async def _read_response(self, conn: _Connection) -> Tuple[int, Dict[str, str], bytes]:
+        reader = conn.reader
+        status_line = (await reader.readuntil(b'\r\n')).decode('latin-1').strip()
+        parts = status_line.split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise BCRequestError(f'Invalid status line: {status_line[:100]}')
+        status = int(parts[1])
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await reader.readuntil(b'\r\n')).decode('latin-1')
+            if line == '\r\n':
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0].strip(), 16)
+                if size == 0:
+                    # skip the trailers
+                    while await reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            # the body ends with the connection
+            body = await reader.read()
+            headers['connection'] = 'close'
+        return status, headers, body
+
+    async def _get(self, path: str) -> Tuple[int, bytes]:
+        request = (
+            f'GET {path} HTTP/1.1\r\n'
+            f'Host: {self.credentials.server}:{self.credentials.port}\r\n'
+            f'Authorization: {self.credentials.authorization()}\r\n'
+            'Connection: keep-alive\r\n'
+            'Accept: */*\r\n'
+            '\r\n'
+        ).encode('latin-1')
+
+        # a reused connection might have been closed by the appliance, so retry once on a new one
+        for attempt in range(2):
+            conn = await self._acquire()
+            reused = conn.requests > 0
+            try:
+                conn.writer.write(request)
+                await conn.writer.drain()
+                status, headers, body = await asyncio.wait_for(self._read_response(conn), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise BCRequestError(f'Connection failed: {e!r}') from e
+            except BaseException:
+                conn.close()
+                raise
+            conn.requests += 1
+            self._release(conn, headers.get('connection', '').lower() != 'close')
+            return status, body
+        raise BCRequestError('Connection failed')
+
+    ## public API
+
+    async def aquery(self, hostname: str) -> List[str]:
+        """
+        Query the BlueCoat Categories of a hostname.
+
+        :param hostname: The hostname to query
+        :return: The categories, [FAILED_LOOKUP] if the request failed or the circuit is open
+        """
+        async with self._slots:
+            # checked once a connection is free, so queued requests are rejected as soon as the circuit opens
+            if not self.breaker.allow():
+                self._count('rejected')
+                BC_QUERIES.labels('rejected').inc()
+                return [FAILED_LOOKUP]
+            # a request let through while the circuit is not closed is its trial
+            # (allow & state are only used on the event loop, so nothing runs in between)
+            trial = self.breaker.state != 'closed'
+
+            self._count('requests')
+            # only measure the request itself, not the wait for a free connection
+            start = time.perf_counter()
+            try:
+                status, body = await self._get(self.credentials.path(hostname))
+                if status >= 400:
+                    raise BCRequestError(f'HTTP status {status}')
+            except (BCRequestError, OSError, asyncio.TimeoutError, asyncio.LimitOverrunError, ValueError) as e:
+                duration = time.perf_counter() - start
+                self.latency.observe(duration)
+                BC_QUERY_SECONDS.observe(duration)
+                BC_QUERIES.labels('error').inc()
+                self._count('errors')
+                if self.breaker.record_failure():
+                    log_error('background', 'Too many failed requests, pausing requests to the BlueCoat appliance', {
+                        'server': self.credentials.server,
+                        'pause': self.breaker.reset_seconds,
+                    })
+                log_error(
+                    'background',
+                    'Error fetching BlueCoat Categories',
+                    {'url': hostname, 'query': self.credentials.sanitized_query(hostname), 'error': str(e) or repr(e)}
+                )
+                return [FAILED_LOOKUP]
+            except BaseException:
+                # e.g. cancelled, the circuit must not stay half-open forever
+                if trial:
+                    self.breaker.release_trial()
+                raise
+        duration = time.perf_counter() - start
+        self.latency.observe(duration)
+        BC_QUERY_SECONDS.observe(duration)
+        BC_QUERIES.labels('success').inc()
+        self.breaker.record_success()
+
+        raw_content = body.decode('utf-8', errors='replace')
+        categories = parse_bc_categories(raw_content)
+        if categories is None:
+            log_error(
+                'background',
+                'BlueCoat Category not found in Response',
+                {'url': hostname, 'query': self.credentials.sanitized_query(hostname), 'response': raw_content}
+            )
+            return [FAILED_LOOKUP]
+        return categories
+
+    async def aquery_many(self, hostnames: Iterable[str]) -> List[List[str]]:
+        """
+        Query the BlueCoat Categories of multiple hostnames, using up to max_connections requests in parallel.
+
+        :param hostnames: The hostnames to query
+        :return: The categories of each hostname, in the same order
+        """
+        return list(await asyncio.gather(*[self.aquery(h) for h in hostnames]))
+
+    def _run(self, coro: Coroutine, requests: int = 1) -> Any:
+        """
+        Run a coroutine on the event loop of the client, and wait for its result.
+
+        :param coro: The coroutine to run
+        :param requests: The number of requests sent by the coroutine, used to limit the wait
+        :return: The result of the coroutine
+        :raise TimeoutError: If the coroutine did not finish in time, it is cancelled
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='bc-client', daemon=True).start()
+                self._loop = loop
+        future: Future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+        # every request makes up to two attempts, each of connecting and reading the response,
+        # and at most max_connections requests run at once
+        rounds = math.ceil(max(1, requests) / self.max_connections)
+        timeout = rounds * 4 * self.timeout + RUN_TIMEOUT_SLACK
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            log_error('background', 'BlueCoat queries did not finish in time', {
+                'server': self.credentials.server,
+                'requests': requests,
+                'timeout': timeout,
+            })
+            raise
+
+    def query(self, hostname: str) -> List[str]:
+        """Blocking variant of aquery"""
+        try:
+            return self._run(self.aquery(hostname))
+        except TimeoutError:
+            return [FAILED_LOOKUP]
+
+    def query_many(self, hostnames: List[str]) -> List[List[str]]:
+        """Blocking variant of aquery_many"""
+        try:
+            return self._run(self.aquery_many(hostnames), len(hostnames))
+        except TimeoutError:
+            return [[FAILED_LOOKUP] for _ in hostnames]
+
+    def close(self):
+        """Close all connections and stop the event loop"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        for conn in self._idle:
+            loop.call_soon_threadsafe(conn.close)
+        self._idle = []
+        # the semaphore is bound to the stopped loop
+        self._slots = asyncio.Semaphore(self.max_connections)
+        loop.call_soon_threadsafe(loop.stop)
+        log_info('background', 'Closed BlueCoat client', self.stats())
@@ -2,7 +2,7 @@ from pathlib import Path
 
 from auth.auth_user import AUTH_USER_SYSTEM
 from db.db_singleton import get_db
-from db.util.parse_existing_db import parse_db, create_in_db
+from db.util.bulk_import import BulkImporter
 from log import log_info
 
 
@@ -24,14 +24,15 @@ def load_existing_file(filepath='./data/local_db.txt', prefix_cats=''):
         )
         return
 
-    # load the content, parse it
+    # parse the content line by line
     # and push the parsed URLs and Cats to the DB
-    file_str = existing_local_db.read_text(encoding='utf-8')
-    new_cats, _ = parse_db(file_str)
-    create_in_db(get_db(), AUTH_USER_SYSTEM, new_cats, prefix_cats)
+    importer = BulkImporter(get_db(), AUTH_USER_SYSTEM, prefix_cats)
+    with existing_local_db.open('r', encoding='utf-8') as f:
+        importer.feed(f)
+    stats = importer.apply()
 
     log_info(
         'background',
-        f'Loaded {len(new_cats)} Cats from existing LocalDB',
-        {'filepath': filepath}
+        f'Loaded {stats.categories} Cats from existing LocalDB',
+        {'filepath': filepath, **stats.to_dict()}
     )
@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Dict, Tuple
+
+from auth.auth_user import AuthUser
+from background.progress import TaskProgress
+from background.uploads import list_upload_members, open_upload
+from db.middleware.abc.db import MiddlewareDB
+from db.util.bulk_import import BulkImporter, ImportStats, APPLY_PHASES
+from db.util.parse_existing_db import ExistingCat, iter_db
+from log import log_debug
+
+# the result of parsing a single file: number of lines, URLs by category name, uncategorized URLs
+ParsedFile = Tuple[int, Dict[str, List[str]], List[str]]
+
+
+def _parse_file(upload_dir: str, upload_id: str, member: Optional[str]) -> ParsedFile:
+    """
+    Parse a single file of an upload.
+    Runs in a worker process, so it only receives and returns simple (picklable) types.
+    """
+    lines = 0
+    categories: Dict[str, List[str]] = {}
+    uncategorized = set()
+
+    def count_lines(f):
+        nonlocal lines
+        for line in f:
+            lines += 1
+            yield line
+
+    with open_upload(upload_dir, upload_id, member) as file:
+        for item in iter_db(count_lines(file), True):
+            if isinstance(item, ExistingCat):
+                # a file might define the same category multiple times
+                categories.setdefault(item.name, []).extend(item.urls)
+            else:
+                uncategorized.add(item)
+
+    return lines, categories, list(uncategorized)
+
+
+def import_uploads(
+    db_if: MiddlewareDB,
+    auth: AuthUser,
+    category_prefix: str,
+    upload_dir: str,
+    upload_ids: List[str],
+    workers: int,
+    progress: Optional[TaskProgress] = None,
+) -> ImportStats:
+    """
+    Import multiple existing DBs at once.
+
+    Every file (or every file within a zip archive) is parsed in a process pool, the results are merged
+    into a single BulkImporter, which deduplicates the categories & URLs of all files
+    and pushes them to the DB with a single batched write per table.
+
+    :param db_if: The DBInterface to use for the DB operations
+    :param auth: The AuthUser to use for the DB operations
+    :param category_prefix: The prefix to use for the new categories
+    :param upload_dir: The directory the uploads are stored in
+    :param upload_ids: The IDs of the uploads to import
+    :param workers: Max number of processes used for parsing
+    :param progress: Optional progress of the task running the import, advanced per parsed file and written phase
+    :return: The stats of the (merged) import
+    """
+    files = [
+        (upload_id, member)
+        for upload_id in upload_ids
+        for member in list_upload_members(upload_dir, upload_id)
+    ]
+    log_debug('existing_db', 'parsing existing dbs', {'uploads': len(upload_ids), 'files': len(files)})
+    if progress is not None:
+        progress.start(len(files) + APPLY_PHASES)
+
+    importer = BulkImporter(db_if, auth, category_prefix)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(files)))) as pool:
+        futures = [pool.submit(_parse_file, upload_dir, upload_id, member) for upload_id, member in files]
+        # merge in submission order, so the result does not depend on which file finished first
+        for future in futures:
+            lines, categories, uncategorized = future.result()
+            importer.stats.lines += lines
+            for name, urls in categories.items():
+                importer.add_category(ExistingCat(name=name, urls=urls))
+            importer.add_urls(uncategorized)
+            if progress is not None:
+                progress.advance(phase='parse')
+    importer.stats.parse_seconds = time.perf_counter() - start
+
+    if progress is None:
+        return importer.apply()
+    stats = importer.apply(lambda phase: progress.advance(phase=phase))
+    progress.flush()
+    return stats
@@ -0,0 +1,115 @@
+import threading
+import time
+from typing import Any, Set
+
+from db.dbmodel.task import Task
+from db.middleware.abc.db import MiddlewareDB
+from log import log_info
+
+# min. seconds between two progress updates written to the DB
+PROGRESS_INTERVAL = 5.0
+
+# tasks running in this process whose lease was lost, reported by the heartbeat of the task queue
+_lost_leases: Set[str] = set()
+_lost_leases_lock = threading.Lock()
+
+
+class TaskLeaseLost(Exception):
+    """Raised in a running task once its lease was lost, e.g. after its worker stalled and another worker took it over"""
+    pass
+
+
+def mark_lease_lost(task_id: str):
+    """Signal a running task to abort, at its next progress update"""
+    with _lost_leases_lock:
+        _lost_leases.add(task_id)
+
+
+def forget_lease(task_id: str):
+    """Clear the signal of a task once it stopped running in this process"""
+    with _lost_leases_lock:
+        _lost_leases.discard(task_id)
+
+
+class TaskProgress:
+    """
+    Progress counters and checkpoint of a running task.
+
+    Updates are only written to the DB every PROGRESS_INTERVAL seconds (or on flush),
+    so reporting the progress for every single item stays cheap.
+    The checkpoint is loaded from the task, so a task that is claimed again after its worker died
+    starts with the state written last. What a task does with it differs:
+    - refresh_bc continues its query where it stopped, with the planned URLs & start time of the checkpoint
+    - imports & cleanups only report their progress, they run again from the start, which is idempotent
+      (everything already written is skipped)
+    - a commit is a single transaction, it runs again from the start and finds nothing left if it was done before
+
+    For a task claimed from the task queue, every update checks that the task still holds its lease,
+    and raises TaskLeaseLost otherwise, so a task taken over by another worker stops instead of running twice.
+    """
+
+    def __init__(self, db_if: MiddlewareDB, task: Task, interval: float = PROGRESS_INTERVAL):
+        """
+        :param db_if: The database interface to use
+        :param task: The task to report the progress for
+        :param interval: Min. seconds between two updates written to the DB
+        """
+        self._db_if = db_if
+        self._task_id = task.id
+        self._owner = task.lease_owner
+        self._interval = interval
+        self._last_write = 0.0
+        self.done = task.progress
+        self.total = task.progress_total
+        self.checkpoint = dict(task.checkpoint)
+        # True if the task was interrupted before, and now runs again with the checkpoint written last
+        self.resumed = len(self.checkpoint) > 0
+        if self.resumed:
+            log_info('BACKGROUND', f'Restarting interrupted task {task.id}', {
+                'progress': self.done,
+                'progress_total': self.total,
+                'checkpoint': self.checkpoint,
+            })
+
+    def start(self, total: int, done: int = 0, **checkpoint: Any):
+        """
+        Set the planned work, and write it to the DB immediately.
+
+        :param total: The units of work planned
+        :param done: The units of work already done, e.g. before the task was interrupted
+        :param checkpoint: Values to add to the checkpoint
+        """
+        self.check()
+        self.total = total
+        self.done = done
+        self.checkpoint.update(checkpoint)
+        self.flush()
+
+    def advance(self, count: int = 1, **checkpoint: Any):
+        """
+        Mark units of work as done.
+
+        :param count: The units of work done since the last call
+        :param checkpoint: Values to add to the checkpoint
+        """
+        self.check()
+        self.done += count
+        self.checkpoint.update(checkpoint)
+        if time.monotonic() - self._last_write >= self._interval:
+            self.flush()
+
+    def flush(self):
+        """Write the current progress and checkpoint to the DB"""
+        self.check()
+        if not self._db_if.tasks.update_task_progress(self._task_id, self.done, self.total, self.checkpoint, self._owner):
+            raise TaskLeaseLost(f'Lost the lease of task {self._task_id}')
+        self._last_write = time.monotonic()
+
+    def check(self):
+        """
+        Check that the task may continue.
+
+        :raises TaskLeaseLost: If the heartbeat of the task queue reported the lease of the task as lost
+        """
+        if self._owner is not None and self._task_id in _lost_leases:
+            raise TaskLeaseLost(f'Lost the lease of task {self._task_id}')
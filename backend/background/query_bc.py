@@ -1,28 +1,19 @@
 import time
-import requests
-from dataclasses import dataclass
-from typing import List
+import zlib
+from typing import List, Optional
 
-from db.dbmodel.url import NO_BC_CATEGORY_YET, FAILED_BC_CATEGORY_LOOKUP, FAILED_LOOKUP
+from background.bc_client import BCClient
+from background.progress import TaskProgress
+from db.dbmodel.url import URL, NO_BC_CATEGORY_YET, FAILED_BC_CATEGORY_LOOKUP, FAILED_LOOKUP
 from db.middleware.abc.db import MiddlewareDB
 from log import log_info, log_error, log_debug
 
+TIME_DAY = 24 * 60 * 60
+# delay until a failed lookup is retried
+FAILED_RETRY_DELAY = 60 * 60
+# number of due URLs read from the DB (and queried concurrently) at once
+DUE_BATCH_SIZE = 500
 
-@dataclass
-class ServerCredentials:
-    """Utility Class to store all credentials for querying the Proxy server"""
-    server: str
-    user: str
-    password: str
-    verifySSL: bool
-
-    def query(self, url: str):
-        """Build a base URL which includes basic auth"""
-        return f'https://{self.user}:{self.password}@{self.server}:8082/ContentFilter/TestUrl/{url}'
-
-    def sanitized_query(self, url: str):
-        """Build a base URL which does not include the password"""
-        return f'https://{self.user}@{self.server}:8082/ContentFilter/TestUrl/{url}'
 
 def is_unknown_category(bc_cats: List[str]) -> bool:
     """
@@ -50,76 +41,177 @@ def is_unknown_category(bc_cats: List[str]) -> bool:
         return True
     return False
 
-def query_all(db_if: MiddlewareDB, credentials: ServerCredentials, ttl: int):
+
+def next_bc_due(url_id: str, refreshed_at: int, ttl: int) -> int:
+    """
+    Calculate when the BlueCoat Categories of a URL are due to be refreshed again.
+
+    Every URL is refreshed up to one day (at most half the TTL) earlier than the TTL, by a fixed offset derived from its ID.
+    URLs that were refreshed at the same time (e.g. by an import or a full refresh) are therefore
+    spread evenly over the day, instead of all being due at once again.
+
+    :param url_id: The ID of the URL
+    :param refreshed_at: Timestamp of the last refresh
+    :param ttl: The TTL of a rating, in seconds
+    :return: The timestamp of the next refresh
+    """
+    window = min(TIME_DAY, ttl // 2)
+    offset = zlib.crc32(url_id.encode('utf-8')) % window if window > 0 else 0
+    return refreshed_at + ttl - offset
+
+
+def _reschedule(db_if: MiddlewareDB, url: URL, next_due: int) -> bool:
+    """
+    Reschedule the refresh of the BlueCoat Categories of a URL, without changing them.
+
+    :param db_if: The DBInterface to use for the DB operations
+    :param url: The URL to reschedule
+    :param next_due: Timestamp of the next refresh
+    :return: True if the URL was rescheduled, False if the DB update failed
+    """
+    try:
+        db_if.urls.set_bc_next_due(url.id, next_due)
+        return True
+    except Exception as e:
+        # e.g. deleted in the meantime, continue with the other URLs
+        log_error('background', 'Error rescheduling BlueCoat categories', {'url': url.hostname, 'error': str(e)})
+        return False
+
+
+def store_bc_cats(db_if: MiddlewareDB, urls: List[URL], results: List[List[str]], ttl: int) -> int:
+    """
+    Store the queried BlueCoat Categories of a batch of URLs, and schedule their next refresh.
+
+    All successful lookups are written at once, so the caches are invalidated only once per batch.
+    URLs that could not be looked up or stored are retried after FAILED_RETRY_DELAY,
+    so they don't block the URLs that are due after them.
+
+    :param db_if: The DBInterface to use for the DB operations
+    :param urls: The queried URLs
+    :param results: The result of the query, for each URL
+    :param ttl: The TTL of a rating, in seconds
+    :return: The number of URLs whose categories were stored
+    """
+    now = int(time.time())
+    stored = []
+    updates = []
+    for url, bc_cats in zip(urls, results):
+        if len(bc_cats) == 1 and bc_cats[0] == FAILED_LOOKUP:
+            # keep the old categories, but retry soon
+            _reschedule(db_if, url, now + FAILED_RETRY_DELAY)
+        else:
+            # since we update the TTL, we need to push even unchanged categories to the DB
+            stored.append(url)
+            updates.append((url.id, bc_cats, next_bc_due(url.id, now, ttl)))
+
+    if not updates:
+        return 0
+
+    try:
+        db_if.urls.set_bc_cats_many(updates)
+    except Exception as e:
+        log_error('background', 'Error storing BlueCoat categories', {'urls': len(updates), 'error': str(e)})
+        for url in stored:
+            _reschedule(db_if, url, now + FAILED_RETRY_DELAY)
+        return 0
+    return len(updates)
+
+
+def refresh_due(db_if: MiddlewareDB, client: BCClient, ttl: int, batch_size: int = DUE_BATCH_SIZE):
+    """
+    Refresh the BlueCoat Categories of all URLs that are due.
+
+    The DB index on the next due time is used as persistent priority queue,
+    so only the due URLs are read, the longest overdue (e.g. new URLs, which are due immediately) first.
+
+    :param db_if: The DBInterface to use for the DB operations
+    :param client: The client to query the appliance with
+    :param ttl: The TTL of a rating, in seconds
+    :param batch_size: Number of due URLs read from the DB (and queried concurrently) at once
     """
-    Method to query all URLs in the DB for their BlueCoat Categories
+    now = int(time.time())
+    seen = set()
+    queried = 0
+    rescheduled = 0
+
+    while True:
+        due_urls = [url for url in db_if.urls.get_bc_due_urls(now, batch_size) if url.id not in seen]
+        to_query = []
+        for url in due_urls:
+            seen.add(url.id)
+            due_at = next_bc_due(url.id, url.bc_last_set, ttl)
+            if not is_unknown_category(url.bc_cats) and due_at > now:
+                # still fresh, e.g. due since it was scheduled before the schedule existed
+                if _reschedule(db_if, url, due_at):
+                    rescheduled += 1
+            else:
+                to_query.append(url)
+
+        results = client.query_many([url.hostname for url in to_query])
+        queried += store_bc_cats(db_if, to_query, results, ttl)
+
+        # stop once all due URLs are processed, or only URLs that failed to update are left
+        if not due_urls:
+            break
+
+    if queried or rescheduled:
+        log_info('background', 'Refreshed due BlueCoat categories', {
+            'queried': queried,
+            'rescheduled': rescheduled,
+            'client': client.stats(),
+        })
+
+
+def query_all(db_if: MiddlewareDB, client: BCClient, ttl: int, progress: Optional[TaskProgress] = None):
+    """
+    Method to force-refresh the BlueCoat Categories of all URLs in the DB
 
     :param db_if: The DBInterface to use for the DB operations
-    :param credentials: The credentials to use for the request
-    :param ttl: The max TTL after which to force-refresh the rating
+    :param client: The client to query the appliance with
+    :param ttl: The TTL of a rating, in seconds, used to schedule the next refresh
+    :param progress: Optional progress of the task running the query, also used to resume an interrupted query
     """
     urls = db_if.urls.get_all_urls(bypass_cache=True)
 
-    # calculate the cutoff time, after which we must refresh the item
-    max_age = int(time.time()) - ttl
+    # an interrupted query keeps its original start time, so all URLs rated since then are skipped
+    started_at = int(time.time())
+    if progress is not None:
+        started_at = progress.checkpoint.get('started_at', started_at)
 
     # filter out all URLs that need an update
     scheduled_urls = [
         url for url in urls
         # check all URLs that have either not been (successfully) looked up,
-        # or where the lookup was done before the TTL
-        if is_unknown_category(url.bc_cats) or url.bc_last_set < max_age
+        # or where the lookup was done before the start
+        if is_unknown_category(url.bc_cats) or url.bc_last_set < started_at
     ]
     log_debug('background','planning update of BlueCoat categories', {
         'total': len(urls),
         'planned': len(scheduled_urls),
     })
+    if progress is not None:
+        planned = progress.checkpoint.get('planned', len(scheduled_urls))
+        progress.start(
+            max(planned, len(scheduled_urls)),
+            max(planned - len(scheduled_urls), 0),
+            started_at=started_at,
+            planned=planned,
+        )
 
-    for url in scheduled_urls:
-        # query the proxy for the categories
-        bc_cats = do_query(credentials, url.hostname)
-
-        if not (len(bc_cats) == 1 and bc_cats[0] == FAILED_LOOKUP):
-            # since we update the TTL, we need to push even unchanged categories to the DB
-            db_if.urls.set_bc_cats(url.id, bc_cats)
-
+    updated = 0
+    # query in batches, so the progress is reported while the requests of a batch run concurrently
+    for start in range(0, len(scheduled_urls), DUE_BATCH_SIZE):
+        batch = scheduled_urls[start:start + DUE_BATCH_SIZE]
+        results = client.query_many([url.hostname for url in batch])
+        updated += store_bc_cats(db_if, batch, results, ttl)
+        if progress is not None:
+            progress.advance(len(batch))
+
+    if progress is not None:
+        progress.flush()
     log_info('background','Updated BlueCoat categories', {
         'total': len(urls),
-        'updated': len(scheduled_urls),
+        'planned': len(scheduled_urls),
+        'updated': updated,
+        'client': client.stats(),
     })
-
-def do_query(credentials: ServerCredentials, url: str) -> List[str]:
-    """
-    Perform a basic request against the Database on a Bluecoat Proxy
-
-    :param credentials: The credentials to use for the request
-    :param url: The URL to query
-    :return: A list of strings representing the categories of the URLs
-    """
-
-    try:
-        response = requests.get(credentials.query(url), verify=credentials.verifySSL)
-        response.raise_for_status()
-
-        raw_content = response.text
-
-        # the Category is a ';' separated list beginning with 'Blue Coat:'
-        # There is a second one starting with the same name, which would include groups
-        for line in raw_content.splitlines():
-            if 'Blue Coat:' in line:
-                categories = line.split('Blue Coat:')[1].strip().split('; ')
-                return categories
-        log_error(
-            'background',
-            'BlueCoat Category not found in Response',
-            {'url': url, 'query': credentials.sanitized_query(url), 'response': raw_content }
-        )
-        return [FAILED_LOOKUP]
-    except requests.RequestException as e:
-        # TODO: this logs user/password as part of the request URL
-        log_error(
-            'background',
-            'Error fetching BlueCoat Categories',
-            {'url': url, 'query': credentials.sanitized_query(url), 'error': str(e)}
-        )
-        return [FAILED_LOOKUP]
@@ -1,16 +1,22 @@
 import traceback
 
-from background.query_bc import query_all, ServerCredentials
+from background.bc_client import BCClient
+from background.query_bc import query_all
+from background.parallel_import import import_uploads
+from background.progress import TaskProgress, TaskLeaseLost
+from background.uploads import open_upload, remove_upload
 from db.dbmodel.task import CleanupFlags, Task
 from db.middleware.abc.db import MiddlewareDB
 from db.middleware.stagingdb.db import StagingDB
-from db.util.parse_existing_db import parse_db, create_in_db, create_urls_db
+from db.util.bulk_import import BulkImporter, APPLY_PHASES
+from db.util.cleanup import plan_cleanup
 from log import log_debug, log_info
 
 
 def execute_load_existing_task(db_if: MiddlewareDB, task: Task):
     """
     Execute a load_existing task.
+    New imports use load_existing_file, this is kept to finish tasks created by older versions.
 
     :param db_if: The database interface to use
     :param task: the task to execute
@@ -18,7 +24,7 @@ def execute_load_existing_task(db_if: MiddlewareDB, task: Task):
     log_debug('BACKGROUND', f'Executing load_existing task {task.id}')
 
     # Update task status to running
-    db_if.tasks.update_task_status(task.id, 'running')
+    db_if.tasks.update_task_status(task.id, 'running', task.lease_owner)
 
     try:
         # validate and extract parameters
@@ -30,20 +36,130 @@ def execute_load_existing_task(db_if: MiddlewareDB, task: Task):
         prefix = task.parameters[2]
 
         # Parse DB into intermediate objects
-        categories, uncategorized = parse_db(category_db, True)
-
-        # Push the intermediate objects to the main DB
-        create_in_db(db_if, task.user, categories, prefix)
-        create_urls_db(db_if, task.user, uncategorized)
+        # and push the intermediate objects to the main DB
+        progress = TaskProgress(db_if, task)
+        progress.start(1 + APPLY_PHASES)
+        importer = BulkImporter(db_if, task.user, prefix)
+        importer.feed(category_db.splitlines(), True)
+        progress.advance(phase='parse')
+        stats = importer.apply(lambda phase: progress.advance(phase=phase))
+        progress.flush()
+        db_if.tasks.update_task_stats(task.id, stats.to_dict(), task.lease_owner)
 
         log_info('BACKGROUND', f'Load existing task {task.id} completed successfully')
-        db_if.tasks.update_task_status(task.id, 'success')
+        db_if.tasks.update_task_status(task.id, 'success', task.lease_owner)
+    except TaskLeaseLost:
+        # another worker continues the task, and writes its result
+        raise
     except Exception as e:
         log_info('BACKGROUND', f'Error executing load_existing task {task.id}', {
             'error': str(e),
             'traceback': traceback.format_exc(),
         })
-        db_if.tasks.update_task_status(task.id, 'failed')
+        db_if.tasks.update_task_status(task.id, 'failed', task.lease_owner)
+
+def execute_load_existing_file_task(db_if: MiddlewareDB, task: Task, upload_dir: str):
+    """
+    Execute a load_existing_file task.
+    Same as load_existing, but the DB is streamed from an upload instead of being stored in the task.
+    An interrupted import has no checkpoint to resume from, it runs again and only writes what is still missing.
+
+    :param db_if: The database interface to use
+    :param task: the task to execute
+    :param upload_dir: The directory the uploads are stored in
+    """
+    log_debug('BACKGROUND', f'Executing load_existing_file task {task.id}')
+
+    # Update task status to running
+    db_if.tasks.update_task_status(task.id, 'running', task.lease_owner)
+
+    upload_id = None
+    try:
+        # validate and extract parameters
+        # the parameters should be [func_name, upload_id, prefix]
+        if len(task.parameters) != 3:
+            # use the existing catch and error handling at the bottom
+            raise Exception('Invalid parameters for load_existing_file task')
+        upload_id = task.parameters[1]
+        prefix = task.parameters[2]
+
+        # Parse DB into intermediate objects, line by line
+        progress = TaskProgress(db_if, task)
+        progress.start(1 + APPLY_PHASES)
+        importer = BulkImporter(db_if, task.user, prefix)
+        with open_upload(upload_dir, upload_id) as f:
+            importer.feed(f, True)
+        progress.advance(phase='parse')
+
+        # Push the intermediate objects to the main DB
+        # an interrupted import reaches this point again, but only writes what is still missing
+        stats = importer.apply(lambda phase: progress.advance(phase=phase))
+        progress.flush()
+        db_if.tasks.update_task_stats(task.id, stats.to_dict(), task.lease_owner)
+
+        log_info('BACKGROUND', f'Load existing file task {task.id} completed successfully')
+        db_if.tasks.update_task_status(task.id, 'success', task.lease_owner)
+    except TaskLeaseLost:
+        # another worker continues the task, and still needs the upload
+        upload_id = None
+        raise
+    except Exception as e:
+        log_info('BACKGROUND', f'Error executing load_existing_file task {task.id}', {
+            'error': str(e),
+            'traceback': traceback.format_exc(),
+        })
+        db_if.tasks.update_task_status(task.id, 'failed', task.lease_owner)
+    finally:
+        # the upload is not needed anymore, independent of the result
+        if upload_id is not None:
+            remove_upload(upload_dir, upload_id)
+
+def execute_load_existing_files_task(db_if: MiddlewareDB, task: Task, upload_dir: str, workers: int):
+    """
+    Execute a load_existing_files task.
+    Imports multiple uploads (or zip archives) at once, parsing them in parallel.
+    An interrupted import has no checkpoint to resume from, it runs again and only writes what is still missing.
+
+    :param db_if: The database interface to use
+    :param task: the task to execute
+    :param upload_dir: The directory the uploads are stored in
+    :param workers: Max number of processes used for parsing
+    """
+    log_debug('BACKGROUND', f'Executing load_existing_files task {task.id}')
+
+    # Update task status to running
+    db_if.tasks.update_task_status(task.id, 'running', task.lease_owner)
+
+    upload_ids = []
+    try:
+        # validate and extract parameters
+        # the parameters should be [func_name, prefix, upload_id, ...]
+        if len(task.parameters) < 3:
+            # use the existing catch and error handling at the bottom
+            raise Exception('Invalid parameters for load_existing_files task')
+        prefix = task.parameters[1]
+        upload_ids = task.parameters[2:]
+
+        progress = TaskProgress(db_if, task)
+        stats = import_uploads(db_if, task.user, prefix, upload_dir, upload_ids, workers, progress)
+        db_if.tasks.update_task_stats(task.id, stats.to_dict(), task.lease_owner)
+
+        log_info('BACKGROUND', f'Load existing files task {task.id} completed successfully')
+        db_if.tasks.update_task_status(task.id, 'success', task.lease_owner)
+    except TaskLeaseLost:
+        # another worker continues the task, and still needs the uploads
+        upload_ids = []
+        raise
+    except Exception as e:
+        log_info('BACKGROUND', f'Error executing load_existing_files task {task.id}', {
+            'error': str(e),
+            'traceback': traceback.format_exc(),
+        })
+        db_if.tasks.update_task_status(task.id, 'failed', task.lease_owner)
+    finally:
+        # the uploads are not needed anymore, independent of the result
+        for upload_id in upload_ids:
+            remove_upload(upload_dir, upload_id)
 
 def execute_cleanup_existing(db_if: MiddlewareDB, task: Task):
     """
@@ -52,7 +168,7 @@ def execute_cleanup_existing(db_if: MiddlewareDB, task: Task):
     log_debug('BACKGROUND', f'Executing cleanup_existing task {task.id}')
 
     # Update task status to running
-    db_if.tasks.update_task_status(task.id, 'running')
+    db_if.tasks.update_task_status(task.id, 'running', task.lease_owner)
 
     try:
         # validate and extract parameters
@@ -62,43 +178,40 @@ def execute_cleanup_existing(db_if: MiddlewareDB, task: Task):
             raise Exception('Invalid parameters for cleanup_existing task')
         flags = CleanupFlags(task.parameters[1])
 
-        if flags & CleanupFlags.URLs:
-            log_debug("BACKGROUND", f"Cleanup URLs for task {task.id}")
-            urls = db_if.urls.get_all_urls()
-
-            for url in urls:
-                if len(url.categories) == 0:
-                    log_debug("BACKGROUND", f"Deleting unused URL {url.id} for task {task.id}")
-                    db_if.urls.delete_url(task.user, url.id)
-
-        if flags & CleanupFlags.Categories:
-            log_debug("BACKGROUND", f"Cleanup Categories for task {task.id}")
-            urls = db_if.urls.get_all_urls()
-            cats = db_if.categories.get_all_categories()
-
-            # Build a set of used category ids from URLs
-            used_cat_ids = set()
-            for url in urls:
-                for cid in (url.categories or []):
-                    used_cat_ids.add(cid)
+        # deleted elements are no longer returned, so an interrupted cleanup only plans the remaining ones
+        progress = TaskProgress(db_if, task)
+        plan = plan_cleanup(
+            db_if.urls.get_all_urls(),
+            db_if.categories.get_all_categories(),
+            db_if.tokens.get_all_tokens(),
+            flags,
+        )
+        log_debug('BACKGROUND', f'Planned cleanup for task {task.id}', plan.to_dict())
+        progress.start(len(plan.url_ids) + len(plan.category_ids))
 
-            for cat in cats:
-                is_used = cat.id in used_cat_ids
-                if not cat.nested_categories and not is_used:
-                    log_debug("BACKGROUND", f"Deleting unused Category {cat.id} for task {task.id}")
-                    db_if.categories.delete_category(task.user, cat.id)
+        # one batched write per table
+        db_if.urls.delete_urls(task.user, plan.url_ids)
+        progress.advance(len(plan.url_ids), phase='urls')
+        db_if.categories.delete_categories(task.user, plan.category_ids)
+        progress.advance(len(plan.category_ids), phase='categories')
+        progress.flush()
+        db_if.tasks.update_task_stats(task.id, plan.to_dict(), task.lease_owner)
 
         log_info('BACKGROUND', f'cleanup_existing task {task.id} completed successfully')
-        db_if.tasks.update_task_status(task.id, 'success')
+        db_if.tasks.update_task_status(task.id, 'success', task.lease_owner)
+    except TaskLeaseLost:
+        # another worker continues the task, and writes its result
+        raise
     except Exception as e:
         log_info('BACKGROUND', f'Error executing cleanup_existing task {task.id}', {
             'error': str(e)
         })
-        db_if.tasks.update_task_status(task.id, 'failed')
+        db_if.tasks.update_task_status(task.id, 'failed', task.lease_owner)
 
 def execute_commit(db_if: StagingDB, task: Task):
     """
     Execute a commit task.
+    An interrupted commit is not resumed, it runs again from the start.
 
     :param db_if: The database interface to use
     :param task: the task to execute
@@ -106,7 +219,7 @@ def execute_commit(db_if: StagingDB, task: Task):
     log_debug('BACKGROUND', f'Executing commit task {task.id}')
 
     # Update task status to running
-    db_if.tasks.update_task_status(task.id, 'running')
+    db_if.tasks.update_task_status(task.id, 'running', task.lease_owner)
 
     try:
         # validate and extract parameters
@@ -117,15 +230,25 @@ def execute_commit(db_if: StagingDB, task: Task):
         commit_message = task.parameters[1]
         not_before = int(task.parameters[2])
 
+        # the commit is a single transaction, so an interrupted commit left the staged changes untouched
+        # and simply starts over, while a commit interrupted after the transaction finds nothing left to commit
+        progress = TaskProgress(db_if, task)
+        staged = db_if.count_staged(not_before)
+        progress.start(staged)
         db_if.commit(task.user, commit_message, not_before)
+        progress.advance(staged)
+        progress.flush()
         log_info('BACKGROUND', f'Commit task {task.id} completed successfully')
-        db_if.tasks.update_task_status(task.id, 'success')
+        db_if.tasks.update_task_status(task.id, 'success', task.lease_owner)
+    except TaskLeaseLost:
+        # another worker continues the task, and writes its result
+        raise
     except Exception as e:
         log_info('BACKGROUND', f'Error executing commit task {task.id}', {
             'error': str(e),
             'traceback': traceback.format_exc(),
         })
-        db_if.tasks.update_task_status(task.id, 'failed')
+        db_if.tasks.update_task_status(task.id, 'failed', task.lease_owner)
 
 def execute_revert(db_if: StagingDB, task: Task):
     """
@@ -138,40 +261,47 @@ def execute_revert(db_if: StagingDB, task: Task):
     log_debug('BACKGROUND', f'Executing revert task {task.id}')
 
     # Update task status to running
-    db_if.tasks.update_task_status(task.id, 'running')
+    db_if.tasks.update_task_status(task.id, 'running', task.lease_owner)
 
     try:
         db_if.revert()
         log_info('BACKGROUND', f'Revert task {task.id} completed successfully')
-        db_if.tasks.update_task_status(task.id, 'success')
+        db_if.tasks.update_task_status(task.id, 'success', task.lease_owner)
+    except TaskLeaseLost:
+        # another worker continues the task, and writes its result
+        raise
     except Exception as e:
         log_info('BACKGROUND', f'Error executing revert task {task.id}', {
             'error': str(e),
             'traceback': traceback.format_exc(),
         })
-        db_if.tasks.update_task_status(task.id, 'failed')
+        db_if.tasks.update_task_status(task.id, 'failed', task.lease_owner)
 
-def execute_refresh_bc_cats(db_if: MiddlewareDB, task: Task, credentials: ServerCredentials):
+def execute_refresh_bc_cats(db_if: MiddlewareDB, task: Task, client: BCClient, ttl: int):
     """
     Execute a Category Refresh Task.
     This forces an update of all cached Bluecoat Categories for all URLs.
 
     :param db_if: The database interface to use
     :param task: the task to execute
-    :param credentials: The credentials to use for the Bluecoat API
+    :param client: The client to use for the Bluecoat API
+    :param ttl: The TTL of a rating in seconds, used to schedule the next refresh
     """
     log_debug('BACKGROUND', f'Executing refresh_bc task {task.id}')
 
     # Update task status to running
-    db_if.tasks.update_task_status(task.id, 'running')
+    db_if.tasks.update_task_status(task.id, 'running', task.lease_owner)
 
     try:
-        query_all(db_if, credentials, 0)
+        query_all(db_if, client, ttl, TaskProgress(db_if, task))
         log_info('BACKGROUND', f'refresh_bc task {task.id} completed successfully')
-        db_if.tasks.update_task_status(task.id, 'success')
+        db_if.tasks.update_task_status(task.id, 'success', task.lease_owner)
+    except TaskLeaseLost:
+        # another worker continues the task, and writes its result
+        raise
     except Exception as e:
         log_info('BACKGROUND', f'Error executing refresh_bc task {task.id}', {
             'error': str(e),
             'traceback': traceback.format_exc(),
         })
-        db_if.tasks.update_task_status(task.id, 'failed')
+        db_if.tasks.update_task_status(task.id, 'failed', task.lease_owner)
@@ -0,0 +1,164 @@
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Set, List, Tuple
+
+from apiflask import APIFlask
+
+from background.progress import TaskLeaseLost, mark_lease_lost, forget_lease
+from db.db_singleton import get_db
+from db.dbmodel.task import Task
+from log import log_debug, log_error, log_info
+
+# tasks that only touch data no other task modifies, grouped by name of the group
+# all other tasks modify the staged changes, form the default group, and have to run one after another
+TASK_GROUPS: Dict[str, List[str]] = {
+    'bc': ['refresh_bc'],
+}
+DEFAULT_TASK_GROUP = 'staging'
+
+
+def _group_filters() -> List[Tuple[str, List[str], bool]]:
+    """Get (group, names, other_names) for claim_task, for every group including the default one"""
+    others = [name for names in TASK_GROUPS.values() for name in names]
+    return [(group, names, False) for group, names in TASK_GROUPS.items()] + [(DEFAULT_TASK_GROUP, others, True)]
+
+
+class TaskQueue:
+    """
+    Event-driven executor for the tasks stored in the DB.
+
+    A listener thread blocks until the DB signals a new task (see wait_for_new_task),
+    and wakes the dispatcher, which claims a task for every idle group.
+    The dispatcher is also woken whenever a task finishes, and at least every poll_interval,
+    in case a signal was lost.
+
+    Tasks are claimed atomically with a lease, that is renewed while the task runs.
+    So every worker (on every node) can run a queue, and tasks of a worker that died are picked up
+    by another worker once their lease expired.
+    """
+
+    def __init__(
+        self,
+        app: APIFlask,
+        execute: Callable[[Task], None],
+        workers: int,
+        poll_interval: float,
+        lease_seconds: int,
+    ):
+        """
+        :param app: The flask app, to get an app_context for the DB
+        :param execute: Function executing a single task, called inside an app_context
+        :param workers: Max number of tasks running in parallel in this queue
+        :param poll_interval: Max time between two checks for pending tasks, in seconds
+        :param lease_seconds: Time a claimed task is reserved for this queue, without a heartbeat
+        """
+        self._app = app
+        self._execute = execute
+        self._workers = max(1, workers)
+        self._poll_interval = poll_interval
+        self._lease_seconds = max(3, lease_seconds)
+        # unique ID of this queue, across all workers and nodes
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        # groups of the tasks currently running
+        self._busy_groups: Set[str] = set()
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='task')
+
+    def start(self):
+        log_debug('BACKGROUND', 'Starting task queue', {
+            'owner': self.owner,
+            'workers': self._workers,
+            'poll_interval': self._poll_interval,
+            'lease_seconds': self._lease_seconds,
+        })
+        threading.Thread(target=self._listen, name='task-listener', daemon=True).start()
+        threading.Thread(target=self._dispatch_loop, name='task-dispatcher', daemon=True).start()
+        # check for tasks created while the server was down
+        self._wakeup.set()
+
+    def _listen(self):
+        with self._app.app_context():
+            while True:
+                try:
+                    # wake the dispatcher on a new task, and on timeout as a fallback
+                    get_db().tasks.wait_for_new_task(self._poll_interval)
+                except Exception as e:
+                    log_error('BACKGROUND', 'Error waiting for new tasks', {
+                        'error': str(e),
+                        'traceback': traceback.format_exc(),
+                    })
+                    time.sleep(self._poll_interval)
+                self._wakeup.set()
+
+    def _dispatch_loop(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self._dispatch()
+            except Exception as e:
+                log_error('BACKGROUND', 'Error dispatching tasks', {
+                    'error': str(e),
+                    'traceback': traceback.format_exc(),
+                })
+
+    def _dispatch(self):
+        with self._app.app_context():
+            db_if = get_db()
+            for group, names, other_names in _group_filters():
+                with self._lock:
+                    if len(self._busy_groups) >= self._workers or group in self._busy_groups:
+                        continue
+
+                task = db_if.tasks.claim_task(self.owner, self._lease_seconds, names, other_names)
+                if task is None:
+                    continue
+
+                with self._lock:
+                    self._busy_groups.add(group)
+                log_debug('BACKGROUND', 'claimed task', task, exclude_keys=('parameters',))
+                self._pool.submit(self._run, task, group)
+
+    def _heartbeat(self, task: Task, done: threading.Event):
+        with self._app.app_context():
+            # renew well before the lease expires, so a single failed renewal is not fatal
+            while not done.wait(self._lease_seconds / 3):
+                try:
+                    if not get_db().tasks.renew_task_lease(task.id, self.owner, self._lease_seconds):
+                        # another worker took over the task, abort it here, so it does not run twice
+                        log_error('BACKGROUND', f'Lost the lease of task {task.id}, aborting it', {'owner': self.owner})
+                        mark_lease_lost(task.id)
+                        return
+                except Exception as e:
+                    log_error('BACKGROUND', f'Error renewing the lease of task {task.id}', {
+                        'error': str(e),
+                        'traceback': traceback.format_exc(),
+                    })
+
+    def _run(self, task: Task, group: str):
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(task, done), name=f'task-heartbeat-{task.id}', daemon=True).start()
+        try:
+            with self._app.app_context():
+                self._execute(task)
+        except TaskLeaseLost:
+            log_info('BACKGROUND', f'Aborted task {task.id}, it is continued by another worker', {'owner': self.owner})
+        except Exception as e:
+            log_error('BACKGROUND', f'Error executing task {task.id}', {
+                'error': str(e),
+                'traceback': traceback.format_exc(),
+            })
+        finally:
+            done.set()
+            forget_lease(task.id)
+            with self._lock:
+                self._busy_groups.discard(group)
+            # the group is idle again, so check for tasks waiting for it
+            self._wakeup.set()
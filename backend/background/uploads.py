@@ -0,0 +1,89 @@
+import io
+import os
+import re
+import shutil
+import uuid
+import zipfile
+from contextlib import contextmanager
+from typing import BinaryIO, TextIO, Iterator, List, Optional
+
+from log import log_debug
+
+# size of the chunks used to copy an upload to disk
+COPY_BUFFER_SIZE = 1024 * 1024
+# upload IDs are generated by us, everything else is rejected to prevent path traversal
+UPLOAD_ID_REGEX = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _upload_path(upload_dir: str, upload_id: str) -> str:
+    if not UPLOAD_ID_REGEX.match(upload_id):
+        raise ValueError(f'Invalid upload ID "{upload_id}"')
+    return os.path.join(upload_dir, f'{upload_id}.upload')
+
+
+def save_upload(upload_dir: str, src: BinaryIO) -> str:
+    """
+    Copy an uploaded file to the upload directory, in chunks, so it never has to be held in memory completely.
+
+    :param upload_dir: The directory to store the upload in
+    :param src: The (binary) stream to read the upload from
+    :return: The ID of the upload, to reference it in e.g. a task
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    path = _upload_path(upload_dir, upload_id)
+
+    with open(path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+
+    log_debug('UPLOAD', 'saved upload', {'id': upload_id, 'size': os.path.getsize(path)})
+    return upload_id
+
+
+def list_upload_members(upload_dir: str, upload_id: str) -> List[Optional[str]]:
+    """
+    List the files contained in an upload.
+
+    :param upload_dir: The directory the upload is stored in
+    :param upload_id: The ID returned by save_upload
+    :return: The names of all files, if the upload is a zip archive, else [None] for the upload itself
+    """
+    path = _upload_path(upload_dir, upload_id)
+    if not zipfile.is_zipfile(path):
+        return [None]
+    with zipfile.ZipFile(path) as zf:
+        return [x.filename for x in zf.infolist() if not x.is_dir()]
+
+
+@contextmanager
+def open_upload(upload_dir: str, upload_id: str, member: Optional[str] = None) -> Iterator[TextIO]:
+    """
+    Open a previously saved upload as text, to e.g. iterate over its lines.
+
+    :param upload_dir: The directory the upload is stored in
+    :param upload_id: The ID returned by save_upload
+    :param member: The name of the file to open, if the upload is a zip archive (see list_upload_members)
+    :return: A context manager providing a text file handle
+    """
+    path = _upload_path(upload_dir, upload_id)
+    if member is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield f
+        return
+
+    with zipfile.ZipFile(path) as zf:
+        with io.TextIOWrapper(zf.open(member), encoding='utf-8') as f:
+            yield f
+
+
+def remove_upload(upload_dir: str, upload_id: str):
+    """
+    Remove a previously saved upload, does nothing if it was already removed.
+
+    :param upload_dir: The directory the upload is stored in
+    :param upload_id: The ID returned by save_upload
+    """
+    try:
+        os.remove(_upload_path(upload_dir, upload_id))
+    except FileNotFoundError:
+        pass
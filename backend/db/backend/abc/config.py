@@ -0,0 +1,43 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from db.backend.abc.util.types import MyTransactionType
+
+
+class ConfigDBInterface(ABC):
+    @abstractmethod
+    def read_int(self, key: str) -> int:
+        """
+        Get the value of a config variable.
+
+        :param key: The key of the config variable.
+        :return: The value, or -1 if it doesn't exist.
+        """
+        pass
+
+    @abstractmethod
+    def set_int(self, key: str, value: int, session: Optional[MyTransactionType] = None):
+        """
+        Set a config variable. If it doesn't exist, create it.
+
+        :param key: The key of the config variable.
+        :param value: The value to set.
+        :param session: Optional database session to use.
+        """
+        pass
+
+    @abstractmethod
+    def increment_int(self, key: str, session: Optional[MyTransactionType] = None):
+        """
+        Atomically increment a config variable by one. If it doesn't exist, create it with the value 1.
+        Used as a generation counter, that is shared between all workers using the same database.
+
+        :param key: The key of the config variable.
+        :param session: Optional database session to use.
+        """
+        pass
+
+    @abstractmethod
+    def get_schema_version(self) -> int:
+        """Get the current schema version of the database."""
+        pass
@@ -3,6 +3,7 @@ from contextlib import contextmanager
 from typing import Generator
 
 from db.backend.abc.category import CategoryDBInterface
+from db.backend.abc.config import ConfigDBInterface
 from db.backend.abc.history import HistoryDBInterface
 from db.backend.abc.staging import StagingDBInterface
 from db.backend.abc.sub_category import SubCategoryDBInterface
@@ -15,6 +16,7 @@ from db.backend.abc.util.types import MyTransactionType
 
 
 class DBInterface(ABC):
+    config: ConfigDBInterface
     categories: CategoryDBInterface
     sub_categories: SubCategoryDBInterface
     history: HistoryDBInterface
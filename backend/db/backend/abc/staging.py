@@ -63,6 +63,16 @@ class StagingDBInterface(ABC):
         """
         pass
 
+    @abstractmethod
+    def count_staged_changes(self, session: Optional[MyTransactionType] = None) -> int:
+        """
+        Count all staged changes.
+
+        :param session: The database session to use.
+        :return: The number of staged changes.
+        """
+        pass
+
     @abstractmethod
     def clear_staged_changes(self, before: int = None, session: Optional[MyTransactionType] = None):
         """
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 
 from auth.auth_user import AuthUser
 from db.dbmodel.task import MutableTask, Task
@@ -29,12 +29,47 @@ class TaskDBInterface(ABC):
         pass
 
     @abstractmethod
-    def update_task_status(self, task_id: str, status: str) -> Task:
+    def update_task_status(self, task_id: str, status: str, owner: Optional[str] = None) -> Optional[Task]:
         """
         Update the status of a specific task.
 
         :param task_id: The ID of the task to update.
         :param status: The new status of the task.
+        :param owner: Only update the task while this queue holds its lease, None to update it unconditionally.
+        :return: The updated task, None if the lease of the owner was lost.
+        """
+        pass
+
+    @abstractmethod
+    def update_task_stats(self, task_id: str, stats: Dict[str, Any], owner: Optional[str] = None) -> bool:
+        """
+        Replace the statistics of a specific task.
+
+        :param task_id: The ID of the task to update.
+        :param stats: The new statistics of the task.
+        :param owner: Only update the task while this queue holds its lease, None to update it unconditionally.
+        :return: False if the lease of the owner was lost, and nothing was written.
+        """
+        pass
+
+    @abstractmethod
+    def update_task_progress(
+        self,
+        task_id: str,
+        progress: int,
+        progress_total: int,
+        checkpoint: Dict[str, Any],
+        owner: Optional[str] = None,
+    ) -> bool:
+        """
+        Replace the progress and the checkpoint of a specific task.
+
+        :param task_id: The ID of the task to update.
+        :param progress: The units of work done so far.
+        :param progress_total: The units of work planned.
+        :param checkpoint: The state to resume the task from, if it is interrupted.
+        :param owner: Only update the task while this queue holds its lease, None to update it unconditionally.
+        :return: False if the lease of the owner was lost, and nothing was written.
         """
         pass
 
@@ -47,6 +82,15 @@ class TaskDBInterface(ABC):
         """
         pass
 
+    @abstractmethod
+    def count_pending_tasks(self) -> int:
+        """
+        Count the tasks that wait to be run.
+
+        :return: The number of pending tasks
+        """
+        pass
+
     @abstractmethod
     def get_next_pending_task(self) -> Optional[Task]:
         """
@@ -54,4 +98,48 @@ class TaskDBInterface(ABC):
 
         :return: A Task object or None if no pending tasks are available.
         """
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def claim_task(
+        self,
+        owner: str,
+        lease_seconds: int,
+        names: List[str],
+        other_names: bool = False,
+    ) -> Optional[Task]:
+        """
+        Atomically claim the oldest runnable task of a group, and mark it as running.
+        Runnable are pending tasks, and running tasks whose owner failed to renew the lease in time.
+        Tasks of a group never run in parallel, so nothing is claimed while a task of the group holds a valid lease.
+
+        :param owner: Unique ID of the claiming worker
+        :param lease_seconds: Time until the lease expires, unless it is renewed
+        :param names: The names of the tasks forming the group
+        :param other_names: If True, the group is formed by all tasks NOT in names instead
+        :return: The claimed task, or None if nothing can be claimed
+        """
+        pass
+
+    @abstractmethod
+    def renew_task_lease(self, task_id: str, owner: str, lease_seconds: int) -> bool:
+        """
+        Extend the lease of a claimed task (heartbeat).
+
+        :param task_id: The ID of the claimed task
+        :param owner: Unique ID of the worker that claimed the task
+        :param lease_seconds: Time until the lease expires, unless it is renewed again
+        :return: True if the lease was renewed, False if it was lost (e.g. expired and claimed by another worker)
+        """
+        pass
+
+    @abstractmethod
+    def wait_for_new_task(self, timeout: float) -> bool:
+        """
+        Block until a new task might have been added, or the timeout expired.
+        Wakeups are only hints, they might be spurious or lost, so always check for pending tasks afterward.
+
+        :param timeout: Max time to wait, in seconds
+        :return: True if woken up by a new task, False on timeout
+        """
+        pass
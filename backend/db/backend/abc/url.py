@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from typing import Optional, List, Tuple, Dict
 
 from db.backend.abc.util.types import MyTransactionType
 from db.dbmodel.url import MutableURL, URL
@@ -63,11 +63,42 @@ class URLDBInterface(ABC):
         pass
 
     @abstractmethod
-    def set_bc_cats(self, url_id: str, bc_cats: List[str]):
+    def get_all_bc_cats(self) -> Dict[str, Tuple[List[str], int]]:
         """
-        Update the BlueCoat Categories associated with a URL.
+        Retrieve only the BlueCoat Categories of all active URLs.
+
+        :return: The BlueCoat Categories & the timestamp they were set at, by ID of the URL
+        """
+        pass
+
+    @abstractmethod
+    def set_bc_cats_many(self, updates: List[Tuple[str, List[str], int]]):
+        """
+        Update the BlueCoat Categories associated with multiple URLs at once.
+        URLs that were deleted in the meantime are skipped.
+
+        :param updates: Tuples of the ID of the url to update, the list of BlueCoat Categories to associate
+            with the URL and the timestamp at which the categories are due to be refreshed.
+        """
+        pass
+
+    @abstractmethod
+    def set_bc_next_due(self, url_id: str, next_due: int):
+        """
+        Reschedule the refresh of the BlueCoat Categories of a URL, without changing them.
 
         :param url_id: The ID of the url to update.
-        :param bc_cats: The list of BlueCoat Categories to associate with the URL.
+        :param next_due: Timestamp at which the categories are due to be refreshed.
+        """
+        pass
+
+    @abstractmethod
+    def get_bc_due_urls(self, now: int, limit: int) -> List[URL]:
+        """
+        Retrieve the URLs whose BlueCoat Categories are due to be refreshed, the longest overdue first.
+
+        :param now: The current timestamp.
+        :param limit: The max number of URLs to return.
+        :return: A list of URLs
         """
         pass
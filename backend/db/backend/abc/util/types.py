@@ -1,7 +1,9 @@
 import sqlite3
-from typing import Union
+from typing import Union, TYPE_CHECKING
 
-from pymongo.synchronous.client_session import ClientSession
+if TYPE_CHECKING:
+    # pymongo is only imported if the MongoDB backend is used
+    from pymongo.synchronous.client_session import ClientSession
 
 # custom union type for transactions
-MyTransactionType = Union[ClientSession, sqlite3.Connection]
+MyTransactionType = Union['ClientSession', sqlite3.Connection]
@@ -2,13 +2,14 @@ from typing import Optional
 
 from pymongo.database import Database
 
+from db.backend.abc.config import ConfigDBInterface
 from db.backend.abc.util.types import MyTransactionType
 from db.backend.mongodb.util.transactions import mongo_transaction_kwargs
 
 CONFIG_VAR_SCHEMA_VERSION = 'schema-version'
 
 
-class MongoDBConfig:
+class MongoDBConfig(ConfigDBInterface):
     def __init__(self, db: Database):
         self._db = db
         self._collection = self._db['config']
@@ -38,6 +39,14 @@ class MongoDBConfig:
             **mongo_transaction_kwargs(session),
         )
 
+    def increment_int(self, key: str, session: Optional[MyTransactionType] = None) -> None:
+        self._collection.update_one(
+            {'key': key},
+            {'$inc': {'value': 1}},
+            upsert=True, # create if missing
+            **mongo_transaction_kwargs(session),
+        )
+
     def get_schema_version(self) -> int:
         """
         Get the current schema version from the config collection.
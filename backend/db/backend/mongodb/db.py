@@ -1,6 +1,6 @@
 import os
 import importlib.util
-from typing import Generator, List, Tuple
+from typing import Generator, List, Tuple, Optional, Any
 from pymongo import MongoClient
 from contextlib import contextmanager
 from pymongo.synchronous.client_session import ClientSession
@@ -28,20 +28,35 @@ class MyMongoDB(DBInterface):
         client: MongoClient,
         database_name: str,
         disable_transaction: bool = False,
+        read_client: Optional[MongoClient] = None,
+        read_preference: Optional[Any] = None,
     ):
+        """
+        :param client: client connected to the primary, used for all writes
+        :param database_name: name of the database to use
+        :param disable_transaction: true if the MongoDB does not support transactions
+        :param read_client: optional dedicated client for read-mostly paths (e.g. a secondary)
+        :param read_preference: optional read preference for read-mostly paths
+        """
         super().__init__()
 
         self.client = client
         self.db = self.client[database_name]
         self.disable_transaction = disable_transaction
 
+        # read-mostly paths (history, token lookups) use their own handle, so they do not compete with writes on the primary.
+        # the lists (get_all_*) fill the committed cache, which stores them under the revision read from the primary,
+        # so they are read from the primary as well
+        self.read_client = read_client
+        self.read_db = (read_client or client).get_database(database_name, read_preference=read_preference)
+
         # Initialize the config collection first to manage a schema version
         self.config = MongoDBConfig(self.db)
 
         self.categories = MongoDBCategory(self.db)
         self.sub_categories = MongoDBSubCategory(self.db)
-        self.history = MongoDBHistory(self.db)
-        self.tokens = MongoDBToken(self.db)
+        self.history = MongoDBHistory(self.db, self.read_db)
+        self.tokens = MongoDBToken(self.db, self.read_db)
         self.token_categories = MongoDBTokenCategory(self.db)
         self.urls = MongoDBURL(self.db)
         self.url_categories = MongoDBURLCategory(self.db)
@@ -51,6 +66,8 @@ class MyMongoDB(DBInterface):
     def close(self):
         log_debug("MONGODB", "Closing Client")
         self.client.close()
+        if self.read_client is not None:
+            self.read_client.close()
 
     def migrate(self):
         """
@@ -64,7 +81,7 @@ class MyMongoDB(DBInterface):
             # create initial commit
             self.history.add_history_event('Initial setup', AUTH_USER_SYSTEM, [], [], [])
             # Create index on token field
-            self.db['tokens'].create_index({'token': 1}, unique=True, name='token_token_idx')
+            self.db['tokens'].create_index([('token', 1)], unique=True, name='token_token_idx')
 
         # Run db migrations
         self._migrate_db_schema()
@@ -130,14 +147,16 @@ class MyMongoDB(DBInterface):
                 raise
 
     @contextmanager
-    def start_transaction(self) -> Generator[ClientSession, None, None]:
+    def start_transaction(self) -> Generator[Optional[ClientSession], None, None]:
+        if self.disable_transaction:
+            # not all MongoDB-Installations support transactions,
+            # so add a feature flag to disable transactions
+            # without a session every operation is applied on its own
+            yield None
+            return
+
         # start a new session, and a transaction in that session
         with self.client.start_session() as session:
-            if self.disable_transaction:
-                # not all MongoDB-Installations support transactions,
-                # so add a feature flag to disable transactions
-                yield session
-
             with session.start_transaction():
                 # yield the session to the caller, so they can use it in their transaction
                 # when the caller is done it will automatically close both the transaction and the session
@@ -12,10 +12,14 @@ from db.dbmodel.history import History, Atomic
 
 
 class MongoDBHistory(HistoryDBInterface):
-    def __init__(self, db: Database[Mapping[str, Any] | Any]):
+    def __init__(self, db: Database[Mapping[str, Any] | Any], read_db: Optional[Database[Mapping[str, Any] | Any]] = None):
         self.db = db
         self.collection: Collection = db['history']
         self.atomics_collection: Collection = db['history_atomics']
+        # the history listing may be served by a secondary
+        read_db = read_db if read_db is not None else db
+        self.read_collection: Collection = read_db['history']
+        self.read_atomics_collection: Collection = read_db['history_atomics']
 
     def add_history_event(
         self,
@@ -93,7 +97,7 @@ class MongoDBHistory(HistoryDBInterface):
 
     def get_history_events(self) -> List[History]:
         # Fetch all history events first
-        event_docs = list(self.collection.find({}))
+        event_docs = list(self.read_collection.find({}))
         result: List[History] = []
 
         if not event_docs:
@@ -101,7 +105,7 @@ class MongoDBHistory(HistoryDBInterface):
             return result
 
         # fetch all atomics, since we also fetched all history events
-        atomics_docs = list(self.atomics_collection.find({}))
+        atomics_docs = list(self.read_atomics_collection.find({}))
 
         # Group atomics by history_id
         atomics_by_history: dict[Any, List[Atomic]] = {}
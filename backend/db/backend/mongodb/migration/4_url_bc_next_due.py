@@ -0,0 +1,46 @@
+import time
+from pymongo.database import Database
+from uuid import uuid7
+
+from auth.auth_user import AuthUser, AUTH_USER_SYSTEM
+from db.backend.abc.util.types import MyTransactionType
+from db.backend.mongodb.util.transactions import mongo_transaction_kwargs
+
+
+def apply(db: Database, session: MyTransactionType) -> None:
+    """
+    Migration 4:
+    - add the "bc_next_due" field to all URLs, scheduling the refresh of their BC Cats (due immediately)
+    - add an index to read only the due URLs
+    """
+    # 1) Schedule all URLs (the planner reschedules fresh ones without querying them)
+    db['urls'].update_many(
+        {'bc_next_due': {'$exists': False}},
+        {'$set': {'bc_next_due': 0}},
+        **mongo_transaction_kwargs(session),
+    )
+
+    # 2) Add the index, outside the transaction since it is not allowed for existing collections
+    db['urls'].create_index([('is_deleted', 1), ('bc_next_due', 1)], name='url_bc_next_due_idx')
+
+    # 3) Update Schema Version
+    db['config'].update_one(
+        {'key': 'schema-version'},
+        {'$set': {'value': 4}},
+        upsert=True,
+        **mongo_transaction_kwargs(session),
+    )
+
+    # 4) Add History Event
+    db['history'].insert_one(
+        {
+            'uid': str(uuid7()),
+            'time': int(time.time()),
+            'description': 'Updated schema version to 4',
+            'user': AuthUser.serialize(AUTH_USER_SYSTEM),
+            'ref_token': [],
+            'ref_url': [],
+            'ref_category': [],
+        },
+        **mongo_transaction_kwargs(session),
+    )
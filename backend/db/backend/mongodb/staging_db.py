@@ -75,6 +75,10 @@ class MongoDBStaging(StagingDBInterface):
         documents = self.collection.find({'action_table': table.value, 'uid': obj_id}, **mongo_transaction_kwargs(session))
         return [_document_to_staged_change(doc) for doc in documents]
 
+    def count_staged_changes(self, session: Optional[MyTransactionType] = None) -> int:
+        """Count all staged changes in the MongoDB database."""
+        return self.collection.count_documents({}, **mongo_transaction_kwargs(session))
+
     def clear_staged_changes(self, before: int = None, session: Optional[MyTransactionType] = None):
         """Clear all staged changes from the MongoDB database."""
         if before is not None:
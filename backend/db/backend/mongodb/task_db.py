@@ -1,11 +1,15 @@
 import time
-from typing import Optional, List, Mapping, Any
+from typing import Optional, List, Mapping, Any, Dict
 from uuid import uuid7
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from pymongo.synchronous.change_stream import CollectionChangeStream
 from pymongo.synchronous.database import Database
 
 from auth.auth_user import AuthUser
 from db.backend.abc.task import TaskDBInterface
 from db.dbmodel.task import MutableTask, Task
+from log import log_debug
 
 
 def _build_task(row: Mapping[str, Any]) -> Task:
@@ -18,13 +22,27 @@ def _build_task(row: Mapping[str, Any]) -> Task:
         status=row['status'],
         created_at=row['created_at'],
         updated_at=row['updated_at'],
+        stats=row.get('stats') or {},
+        progress=row.get('progress', 0),
+        progress_total=row.get('progress_total', 0),
+        checkpoint=row.get('checkpoint') or {},
     )
 
 
+def _owned_by(task_id: str, owner: Optional[str]) -> Dict[str, Any]:
+    """query for a task, restricted to the lease owner if given"""
+    query = {'uid': task_id}
+    if owner is not None:
+        query['lease_owner'] = owner
+    return query
+
+
 class MongoDBTask(TaskDBInterface):
     def __init__(self, db: Database[Mapping[str, Any] | Any]):
         self.db = db
         self.collection = self.db['tasks']
+        # change stream to wait for new tasks, opened on the first wait
+        self._new_tasks: Optional[CollectionChangeStream] = None
 
     def add_task(self, user: AuthUser, task: MutableTask) -> Task:
         current_timestamp = int(time.time())
@@ -57,9 +75,9 @@ class MongoDBTask(TaskDBInterface):
 
         return _build_task(row)
 
-    def update_task_status(self, task_id: str, status: str) -> Task:
+    def update_task_status(self, task_id: str, status: str, owner: Optional[str] = None) -> Optional[Task]:
         current_timestamp = int(time.time())
-        query = {'uid': task_id}
+        query = _owned_by(task_id, owner)
         update_fields = {
             'status': status,
             'updated_at': current_timestamp,
@@ -68,11 +86,52 @@ class MongoDBTask(TaskDBInterface):
         result = self.collection.update_one(query, {'$set': update_fields})
 
         if result.matched_count == 0:
+            if owner is not None:
+                return None
             raise ValueError(f'Task with ID {task_id} not found or is deleted.')
 
         # Return the updated task
         return self.get_task(task_id)
 
+    def update_task_stats(self, task_id: str, stats: Dict[str, Any], owner: Optional[str] = None) -> bool:
+        query = _owned_by(task_id, owner)
+        update_fields = {
+            'stats': stats,
+            'updated_at': int(time.time()),
+        }
+
+        result = self.collection.update_one(query, {'$set': update_fields})
+
+        if result.matched_count == 0:
+            if owner is not None:
+                return False
+            raise ValueError(f'Task with ID {task_id} not found or is deleted.')
+        return True
+
+    def update_task_progress(
+        self,
+        task_id: str,
+        progress: int,
+        progress_total: int,
+        checkpoint: Dict[str, Any],
+        owner: Optional[str] = None,
+    ) -> bool:
+        query = _owned_by(task_id, owner)
+        update_fields = {
+            'progress': progress,
+            'progress_total': progress_total,
+            'checkpoint': checkpoint,
+            'updated_at': int(time.time()),
+        }
+
+        result = self.collection.update_one(query, {'$set': update_fields})
+
+        if result.matched_count == 0:
+            if owner is not None:
+                return False
+            raise ValueError(f'Task with ID {task_id} not found or is deleted.')
+        return True
+
     def get_all_tasks(self) -> List[Task]:
         rows = self.collection.find()
         return [
@@ -80,9 +139,96 @@ class MongoDBTask(TaskDBInterface):
             for row in rows
         ]
 
+    def count_pending_tasks(self) -> int:
+        return self.collection.count_documents({'status': 'pending'})
+
     def get_next_pending_task(self) -> Optional[Task]:
         row = self.collection.find_one({'status': 'pending'})
         if not row:
             return None
 
         return _build_task(row)
+
+    def _has_active_lease(self, group: Dict[str, Any], now: int, except_uid: Optional[str] = None) -> bool:
+        query = {
+            **group,
+            'status': 'running',
+            'lease_owner': {'$ne': None},
+            'lease_expires': {'$gte': now},
+        }
+        if except_uid is not None:
+            query['uid'] = {'$ne': except_uid}
+        return self.collection.find_one(query, projection={'_id': 1}) is not None
+
+    def claim_task(
+        self,
+        owner: str,
+        lease_seconds: int,
+        names: List[str],
+        other_names: bool = False,
+    ) -> Optional[Task]:
+        current_timestamp = int(time.time())
+        group = {'name': {'$nin' if other_names else '$in': names}}
+
+        # cheap check first, to not claim tasks that have to be released again
+        if self._has_active_lease(group, current_timestamp):
+            return None
+
+        row = self.collection.find_one_and_update(
+            {
+                **group,
+                '$or': [
+                    {'status': 'pending'},
+                    {'status': 'running', 'lease_owner': {'$ne': None}, 'lease_expires': {'$lt': current_timestamp}},
+                ],
+            },
+            {'$set': {
+                'status': 'running',
+                'lease_owner': owner,
+                'lease_expires': current_timestamp + lease_seconds,
+                'updated_at': current_timestamp,
+            }},
+            sort=[('created_at', 1), ('uid', 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if row is None:
+            return None
+
+        # MongoDB can not check the group and claim in one atomic operation,
+        # so check again after claiming: if two workers raced, at least one of them sees the other and backs off
+        if self._has_active_lease(group, current_timestamp, except_uid=row['uid']):
+            self.collection.update_one(
+                {'uid': row['uid'], 'lease_owner': owner},
+                {'$set': {'status': 'pending', 'lease_owner': None, 'lease_expires': 0}},
+            )
+            return None
+
+        task = _build_task(row)
+        task.lease_owner = owner
+        return task
+
+    def renew_task_lease(self, task_id: str, owner: str, lease_seconds: int) -> bool:
+        result = self.collection.update_one(
+            {'uid': task_id, 'lease_owner': owner, 'status': 'running'},
+            {'$set': {'lease_expires': int(time.time()) + lease_seconds}},
+        )
+        return result.matched_count > 0
+
+    def wait_for_new_task(self, timeout: float) -> bool:
+        try:
+            if self._new_tasks is None:
+                # the insert itself is the signal, so add_task needs no explicit notification
+                self._new_tasks = self.collection.watch(
+                    [{'$match': {'operationType': 'insert'}}],
+                    max_await_time_ms=int(timeout * 1000),
+                )
+            # blocks for up to max_await_time_ms
+            return self._new_tasks.try_next() is not None
+        except PyMongoError as e:
+            # change streams require a replica set, fall back to a plain timeout
+            log_debug('MONGODB', 'change stream for tasks not available, falling back to polling', {'error': str(e)})
+            if self._new_tasks is not None:
+                self._new_tasks.close()
+                self._new_tasks = None
+            time.sleep(timeout)
+            return False
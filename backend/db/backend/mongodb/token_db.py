@@ -26,9 +26,11 @@ def _build_token(row: Mapping[str, Any]) -> Token:
 
 
 class MongoDBToken(TokenDBInterface):
-    def __init__(self, db: Database[Mapping[str, Any] | Any]):
+    def __init__(self, db: Database[Mapping[str, Any] | Any], read_db: Optional[Database[Mapping[str, Any] | Any]] = None):
         self.db = db
         self.collection = self.db['tokens']
+        # read-mostly paths may be served by a secondary
+        self.read_collection = (read_db if read_db is not None else db)['tokens']
 
     def add_token(self, token_id: str, uuid: str, mut_tok: MutableToken, session: Optional[MyTransactionType] = None) -> Token:
         self.collection.insert_one({
@@ -52,7 +54,7 @@ class MongoDBToken(TokenDBInterface):
 
     def get_token_by_uuid(self, token_uuid: str) -> Optional[Token]:
         query = {'token': token_uuid, 'is_deleted': 0}
-        row = self.collection.find_one(query)
+        row = self.read_collection.find_one(query)
         if not row:
             return None
 
@@ -1,5 +1,6 @@
 import time
-from typing import Optional, List, Mapping, Any
+from typing import Optional, List, Mapping, Any, Tuple, Dict
+from pymongo import UpdateOne
 from pymongo.synchronous.database import Database
 
 from db.backend.abc.url import URLDBInterface
@@ -40,6 +41,7 @@ class MongoDBURL(URLDBInterface):
             'categories': [],
             'bc_cats': [NO_BC_CATEGORY_YET],
             'bc_last_set': 0,
+            'bc_next_due': 0,
         }, **mongo_transaction_kwargs(session))
 
         return URL.from_mutable(url_id, mut_url)
@@ -66,14 +68,42 @@ class MongoDBURL(URLDBInterface):
 
         return self.get_url(url_id)
 
-    def set_bc_cats(self, url_id: str, bc_cats: List[str]):
+    def get_all_bc_cats(self) -> Dict[str, Tuple[List[str], int]]:
+        rows = self.collection.find({'is_deleted': 0}, projection={'uid': 1, 'bc_cats': 1, 'bc_last_set': 1})
+        return {str(row['uid']): (row['bc_cats'], row['bc_last_set']) for row in rows}
+
+    def set_bc_cats_many(self, updates: List[Tuple[str, List[str], int]]):
+        if not updates:
+            return
+
+        now = int(time.time())
+        self.collection.bulk_write([
+            UpdateOne(
+                {'uid': url_id, 'is_deleted': 0},
+                {'$set': {'bc_cats': bc_cats, 'bc_last_set': now, 'bc_next_due': next_due}},
+            )
+            for url_id, bc_cats, next_due in updates
+        ], ordered=False)
+
+    def set_bc_next_due(self, url_id: str, next_due: int):
         query = {'uid': url_id, 'is_deleted': 0}
-        update = {'$set': {'bc_cats': bc_cats, 'bc_last_set': int(time.time())}}
-        result = self.collection.update_one(query, update)
+        result = self.collection.update_one(query, {'$set': {'bc_next_due': next_due}})
 
         if result.matched_count == 0:
             raise ValueError(f'URL with ID {url_id} not found or already deleted.')
 
+    def get_bc_due_urls(self, now: int, limit: int) -> List[URL]:
+        # served by the index on (is_deleted, bc_next_due)
+        rows = self.collection.find(
+            {'is_deleted': 0, 'bc_next_due': {'$lte': now}},
+            sort=[('bc_next_due', 1)],
+            limit=limit,
+        )
+        return [
+            _build_url(row)
+            for row in rows
+        ]
+
     def delete_url(self, url_id: str, del_timestamp: int, session: Optional[MyTransactionType] = None):
         query = {'uid': url_id, 'is_deleted': 0}
         update = {'$set': {'is_deleted': del_timestamp}}
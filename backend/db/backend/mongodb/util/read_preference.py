@@ -0,0 +1,30 @@
+from typing import Optional, Any
+from pymongo.read_preferences import PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+
+
+# map of the (lowercase) read preference modes to their pymongo class
+_READ_PREFERENCES = {
+    'primarypreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondarypreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+
+def build_read_preference(mode: str, max_staleness: int = -1) -> Optional[Any]:
+    """
+    Build a pymongo read preference from its (case-insensitive) mode name.
+
+    :param mode: one of primary, primaryPreferred, secondary, secondaryPreferred or nearest
+    :param max_staleness: max replication lag (in seconds) of a secondary that may serve reads, -1 for no limit
+    :return: the read preference, or None if reads should stay on the primary
+    """
+    mode = mode.strip().lower()
+    if mode in ('', 'primary'):
+        return None
+
+    if mode not in _READ_PREFERENCES:
+        raise ValueError(f'Unsupported APP_DB_MONGO_READ_PREFERENCE: {mode}')
+
+    return _READ_PREFERENCES[mode](max_staleness=max_staleness)
+
@@ -1,13 +1,14 @@
 import sqlite3
 from typing import Optional
 
+from db.backend.abc.config import ConfigDBInterface
 from db.backend.abc.util.types import MyTransactionType
 from db.backend.sqlite.util.cursor_callable import GetCursorProtocol
 
 CONFIG_VAR_SCHEMA_VERSION = 'schema-version'
 
 
-class SQLiteConfig:
+class SQLiteConfig(ConfigDBInterface):
     def __init__(
         self,
         get_cursor: GetCursorProtocol
@@ -41,6 +42,14 @@ class SQLiteConfig:
                 (key, str(value))
             )
 
+    def increment_int(self, key: str, session: Optional[MyTransactionType] = None):
+        with self.get_cursor(session=session) as cursor:
+            cursor.execute(
+                'INSERT INTO config (key, value) VALUES (?, \'1\') '
+                'ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1',
+                (key,)
+            )
+
     def get_schema_version(self) -> int:
         """
         Get the current schema version from the config table.
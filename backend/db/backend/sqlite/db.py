@@ -15,6 +15,7 @@ from db.backend.sqlite.token_category_db import SQLiteTokenCategory
 from db.backend.sqlite.token_db import SQLiteToken
 from db.backend.sqlite.url_category_db import SQLiteURLCategory
 from db.backend.sqlite.url_db import SQLiteURL
+from db.backend.sqlite.util.fifo_notify import FifoNotifier
 from log import log_info, log_debug, log_error
 
 
@@ -35,7 +36,8 @@ class MySQLiteDB(DBInterface):
         self.token_categories = SQLiteTokenCategory(self.get_cursor)
         self.urls = SQLiteURL(self.get_cursor)
         self.url_categories = SQLiteURLCategory(self.get_cursor)
-        self.tasks = SQLiteTask(self.get_cursor)
+        # new tasks are signaled through a FIFO next to the database, so all workers can reach the task queue
+        self.tasks = SQLiteTask(self.get_cursor, FifoNotifier(f'{filename}.tasks.fifo'))
         self.staging = SQLiteStaging(self.get_cursor)
 
     @contextmanager
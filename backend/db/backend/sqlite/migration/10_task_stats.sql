@@ -0,0 +1,8 @@
+-- Migration script: 10_task_stats.sql
+-- Add a column to store statistics reported by a task (e.g. the throughput of an import)
+
+-- Step 1: Add a new column, defaulting to an empty JSON object
+ALTER TABLE tasks ADD COLUMN stats TEXT NOT NULL default '{}';
+
+-- Insert records to mark the migration
+INSERT INTO history (time, description, user) VALUES (strftime('%s', 'now'), 'Migrated DB to version: 10', '{"username": "system", "roles": []}');
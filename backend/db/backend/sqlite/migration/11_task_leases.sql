@@ -0,0 +1,14 @@
+-- Migration script: 11_task_leases.sql
+-- Add columns to track which worker claimed a task, and until when the claim is valid
+
+-- Step 1: Add the owner of the lease, NULL if the task was never claimed
+ALTER TABLE tasks ADD COLUMN lease_owner TEXT;
+
+-- Step 2: Add the expiry of the lease, renewed by the owner while the task is running
+ALTER TABLE tasks ADD COLUMN lease_expires INTEGER NOT NULL default 0;
+
+-- Step 3: Speed up the lookup of runnable tasks
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, id);
+
+-- Insert records to mark the migration
+INSERT INTO history (time, description, user) VALUES (strftime('%s', 'now'), 'Migrated DB to version: 11', '{"username": "system", "roles": []}');
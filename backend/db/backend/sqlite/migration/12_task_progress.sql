@@ -0,0 +1,12 @@
+-- Migration script: 12_task_progress.sql
+-- Add columns to report the progress of a task, and the state to resume it from after an interruption
+
+-- Step 1: Add the units of work done / planned
+ALTER TABLE tasks ADD COLUMN progress INTEGER NOT NULL default 0;
+ALTER TABLE tasks ADD COLUMN progress_total INTEGER NOT NULL default 0;
+
+-- Step 2: Add the checkpoint, defaulting to an empty JSON object
+ALTER TABLE tasks ADD COLUMN checkpoint TEXT NOT NULL default '{}';
+
+-- Insert records to mark the migration
+INSERT INTO history (time, description, user) VALUES (strftime('%s', 'now'), 'Migrated DB to version: 12', '{"username": "system", "roles": []}');
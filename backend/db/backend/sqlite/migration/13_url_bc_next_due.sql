@@ -0,0 +1,11 @@
+-- Migration script: 13_url_bc_next_due.sql
+-- Add a column to schedule the next refresh of the BC Cats of each URL
+
+-- Step 1: Add a new column, defaulting to value "0" (due immediately)
+ALTER TABLE urls ADD COLUMN bc_next_due INTEGER NOT NULL default 0;
+
+-- Step 2: Index the schedule, so only the due URLs are read
+CREATE INDEX IF NOT EXISTS idx_urls_bc_next_due ON urls (bc_next_due) WHERE is_deleted = 0;
+
+-- Insert records to mark the migration
+INSERT INTO history (time, description, user) VALUES (strftime('%s', 'now'), 'Migrated DB to version: 13', '{"username": "system", "roles": []}');
@@ -92,6 +92,11 @@ class SQLiteStaging(StagingDBInterface):
             rows = cursor.fetchall()
         return [_build_change(row) for row in rows]
 
+    def count_staged_changes(self, session: Optional[MyTransactionType] = None) -> int:
+        with self.get_cursor(session=session) as cursor:
+            cursor.execute('SELECT COUNT(*) FROM staged_changes')
+            return cursor.fetchone()[0]
+
     def clear_staged_changes(self, before: int = None, session: Optional[MyTransactionType] = None):
         with self.get_cursor(session=session) as cursor:
             if before is not None:
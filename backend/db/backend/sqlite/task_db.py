@@ -1,10 +1,11 @@
 import orjson
 import time
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 
 from auth.auth_user import AuthUser
 from db.backend.abc.task import TaskDBInterface
 from db.backend.sqlite.util.cursor_callable import GetCursorProtocol
+from db.backend.sqlite.util.fifo_notify import FifoNotifier
 from db.dbmodel.task import MutableTask, Task
 
 
@@ -20,15 +21,21 @@ def _build_task(row: Any) -> Task:
         status=row[4],
         created_at=row[5],
         updated_at=row[6],
+        stats=orjson.loads(row[7]) if row[7] else {},
+        progress=row[8],
+        progress_total=row[9],
+        checkpoint=orjson.loads(row[10]) if row[10] else {},
     )
 
 
 class SQLiteTask(TaskDBInterface):
     def __init__(
         self,
-        get_cursor: GetCursorProtocol
+        get_cursor: GetCursorProtocol,
+        notifier: FifoNotifier,
     ):
         self.get_cursor = get_cursor
+        self.notifier = notifier
 
     def add_task(self, user: AuthUser, task: MutableTask) -> Task:
         current_timestamp = int(time.time())
@@ -51,12 +58,15 @@ class SQLiteTask(TaskDBInterface):
                 created_at=current_timestamp,
                 updated_at=current_timestamp,
             )
-            return new_task
+
+        # wake up the task queue, after the insert is committed
+        self.notifier.notify()
+        return new_task
 
     def get_task(self, task_id: str) -> Optional[Task]:
         with self.get_cursor() as cursor:
             cursor.execute(
-                '''SELECT id, name, user, parameters, status, created_at, updated_at
+                '''SELECT id, name, user, parameters, status, created_at, updated_at, stats, progress, progress_total, checkpoint
                    FROM tasks
                    WHERE id = ?''',
                 (int(task_id),)
@@ -66,34 +76,128 @@ class SQLiteTask(TaskDBInterface):
             return None
         return _build_task(row)
 
-    def update_task_status(self, task_id: str, status: str) -> Task:
+    def update_task_status(self, task_id: str, status: str, owner: Optional[str] = None) -> Optional[Task]:
         current_timestamp = int(time.time())
         with self.get_cursor() as cursor:
             cursor.execute(
                 '''UPDATE tasks 
                    SET status = ?, updated_at = ? 
-                   WHERE id = ?''',
-                (status, current_timestamp, int(task_id))
+                   WHERE id = ? AND (? IS NULL OR lease_owner = ?)''',
+                (status, current_timestamp, int(task_id), owner, owner)
             )
+            if owner is not None and cursor.rowcount == 0:
+                return None
         return self.get_task(task_id)
 
+    def update_task_stats(self, task_id: str, stats: Dict[str, Any], owner: Optional[str] = None) -> bool:
+        current_timestamp = int(time.time())
+        stats_str = orjson.dumps(stats).decode("utf-8")
+        with self.get_cursor() as cursor:
+            cursor.execute(
+                '''UPDATE tasks 
+                   SET stats = ?, updated_at = ? 
+                   WHERE id = ? AND (? IS NULL OR lease_owner = ?)''',
+                (stats_str, current_timestamp, int(task_id), owner, owner)
+            )
+            return owner is None or cursor.rowcount > 0
+
+    def update_task_progress(
+        self,
+        task_id: str,
+        progress: int,
+        progress_total: int,
+        checkpoint: Dict[str, Any],
+        owner: Optional[str] = None,
+    ) -> bool:
+        current_timestamp = int(time.time())
+        checkpoint_str = orjson.dumps(checkpoint).decode("utf-8")
+        with self.get_cursor() as cursor:
+            cursor.execute(
+                '''UPDATE tasks 
+                   SET progress = ?, progress_total = ?, checkpoint = ?, updated_at = ? 
+                   WHERE id = ? AND (? IS NULL OR lease_owner = ?)''',
+                (progress, progress_total, checkpoint_str, current_timestamp, int(task_id), owner, owner)
+            )
+            return owner is None or cursor.rowcount > 0
+
     def get_all_tasks(self) -> List[Task]:
         with self.get_cursor() as cursor:
             cursor.execute(
-                '''SELECT id, name, user, parameters, status, created_at, updated_at
+                '''SELECT id, name, user, parameters, status, created_at, updated_at, stats, progress, progress_total, checkpoint
                    FROM tasks'''
             )
             rows = cursor.fetchall()
         return [_build_task(row) for row in rows]
 
+    def count_pending_tasks(self) -> int:
+        with self.get_cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'")
+            return cursor.fetchone()[0]
+
     def get_next_pending_task(self) -> Optional[Task]:
         with self.get_cursor() as cursor:
             cursor.execute(
-                '''SELECT id, name, user, parameters, status, created_at, updated_at
+                '''SELECT id, name, user, parameters, status, created_at, updated_at, stats, progress, progress_total, checkpoint
                    FROM tasks
-                   WHERE status = 'pending' '''
+                   WHERE status = 'pending'
+                   ORDER BY id'''
             )
             row = cursor.fetchone()
         if not row:
             return None
         return _build_task(row)
+
+    def claim_task(
+        self,
+        owner: str,
+        lease_seconds: int,
+        names: List[str],
+        other_names: bool = False,
+    ) -> Optional[Task]:
+        current_timestamp = int(time.time())
+        placeholders = ', '.join('?' for _ in names)
+        in_group = f'name {"NOT IN" if other_names else "IN"} ({placeholders})'
+
+        with self.get_cursor() as cursor:
+            # a single statement, so the check for a running task of the group and the claim are atomic
+            cursor.execute(
+                f'''UPDATE tasks
+                    SET status = 'running', lease_owner = ?, lease_expires = ?, updated_at = ?
+                    WHERE id = (
+                        SELECT id FROM tasks
+                        WHERE {in_group}
+                          AND (status = 'pending' OR (status = 'running' AND lease_owner IS NOT NULL AND lease_expires < ?))
+                        ORDER BY id
+                        LIMIT 1
+                    ) AND NOT EXISTS (
+                        SELECT 1 FROM tasks
+                        WHERE {in_group}
+                          AND status = 'running' AND lease_owner IS NOT NULL AND lease_expires >= ?
+                    )
+                    RETURNING id, name, user, parameters, status, created_at, updated_at, stats, progress, progress_total, checkpoint''',
+                (
+                    owner, current_timestamp + lease_seconds, current_timestamp,
+                    *names, current_timestamp,
+                    *names, current_timestamp,
+                )
+            )
+            row = cursor.fetchone()
+        if not row:
+            return None
+        task = _build_task(row)
+        task.lease_owner = owner
+        return task
+
+    def renew_task_lease(self, task_id: str, owner: str, lease_seconds: int) -> bool:
+        current_timestamp = int(time.time())
+        with self.get_cursor() as cursor:
+            cursor.execute(
+                '''UPDATE tasks
+                   SET lease_expires = ?
+                   WHERE id = ? AND lease_owner = ? AND status = 'running' ''',
+                (current_timestamp + lease_seconds, int(task_id), owner)
+            )
+            return cursor.rowcount > 0
+
+    def wait_for_new_task(self, timeout: float) -> bool:
+        return self.notifier.wait(timeout)
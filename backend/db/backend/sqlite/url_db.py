@@ -1,5 +1,5 @@
 import time
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Tuple, Dict
 
 from db.backend.abc.url import URLDBInterface
 from db.backend.abc.util.types import MyTransactionType
@@ -83,10 +83,51 @@ class SQLiteURL(URLDBInterface):
 
         return self.get_url(url_id)
 
-    def set_bc_cats(self, url_id: str, bc_cats: List[str]):
-        query = 'UPDATE urls SET bc_cats = ?, bc_last_set = ? WHERE id = ? AND is_deleted = 0'
+    def get_all_bc_cats(self) -> Dict[str, Tuple[List[str], int]]:
         with self.get_cursor() as cursor:
-            cursor.execute(query, (join_str_group(bc_cats), int(time.time()), url_id))
+            cursor.execute('SELECT id, bc_cats, bc_last_set FROM urls WHERE is_deleted = 0')
+            rows = cursor.fetchall()
+        return {str(row[0]): (split_opt_str_group(row[1]), row[2]) for row in rows}
+
+    def set_bc_cats_many(self, updates: List[Tuple[str, List[str], int]]):
+        query = 'UPDATE urls SET bc_cats = ?, bc_last_set = ?, bc_next_due = ? WHERE id = ? AND is_deleted = 0'
+        now = int(time.time())
+        with self.get_cursor() as cursor:
+            cursor.executemany(query, [
+                (join_str_group(bc_cats), now, next_due, url_id)
+                for url_id, bc_cats, next_due in updates
+            ])
+
+    def set_bc_next_due(self, url_id: str, next_due: int):
+        query = 'UPDATE urls SET bc_next_due = ? WHERE id = ? AND is_deleted = 0'
+        with self.get_cursor() as cursor:
+            cursor.execute(query, (next_due, url_id))
+
+    def get_bc_due_urls(self, now: int, limit: int) -> List[URL]:
+        with self.get_cursor() as cursor:
+            # served by the partial index on bc_next_due, the categories are only collected for the returned URLs
+            cursor.execute(
+                '''SELECT
+                    u.id AS id,
+                    u.hostname,
+                    u.description,
+                    u.bc_cats,
+                    u.bc_last_set,
+                    (
+                        SELECT GROUP_CONCAT(uc.category_id)
+                        FROM url_categories uc
+                        INNER JOIN categories c
+                        ON uc.category_id = c.id
+                        WHERE uc.url_id = u.id AND c.is_deleted = 0 AND uc.is_deleted = 0
+                    ) as categories
+                FROM urls u
+                WHERE u.is_deleted = 0 AND u.bc_next_due <= ?
+                ORDER BY u.bc_next_due
+                LIMIT ?''',
+                (now, limit)
+            )
+            rows = cursor.fetchall()
+        return [_build_url(row) for row in rows]
 
     def delete_url(
         self,
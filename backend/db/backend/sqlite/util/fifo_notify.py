@@ -0,0 +1,70 @@
+import errno
+import os
+import select
+import time
+from typing import Optional
+
+from log import log_debug
+
+
+class FifoNotifier:
+    """
+    Wake up a waiting process through a named pipe (FIFO).
+
+    SQLite has no way to notify other processes about changes, so writers signal the FIFO
+    after e.g. adding a task, and the (single) consumer blocks on it until it is signaled.
+    Signals are only hints: they might be lost (e.g. when nobody is waiting) or coalesced,
+    so consumers still need to check the DB after waking up, and from time to time without a signal.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._read_fd: Optional[int] = None
+
+    def notify(self):
+        """Signal the consumer, never blocks and never fails"""
+        try:
+            # non-blocking open fails with ENXIO if no consumer has the FIFO open
+            fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError:
+            # no consumer running (or no FIFO yet), it will check the DB on startup anyway
+            return
+        try:
+            os.write(fd, b'1')
+        except OSError as e:
+            # EAGAIN: the pipe is full, so the consumer has enough pending signals already
+            if e.errno != errno.EAGAIN:
+                log_debug('SQLITE', 'failed to notify FIFO', {'path': self.path, 'error': str(e)})
+        finally:
+            os.close(fd)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Block until the FIFO is signaled, or the timeout expired.
+
+        :param timeout: Max time to wait, in seconds
+        :return: True if signaled, False on timeout
+        """
+        if self._read_fd is None:
+            try:
+                if not os.path.exists(self.path):
+                    os.mkfifo(self.path)
+                # open read-write, so the FIFO never reports EOF when the last writer closes it
+                self._read_fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+            except OSError as e:
+                # e.g. a filesystem without FIFO support, fall back to a plain timeout
+                log_debug('SQLITE', 'FIFO not available, falling back to polling', {'path': self.path, 'error': str(e)})
+                time.sleep(timeout)
+                return False
+
+        readable, _, _ = select.select([self._read_fd], [], [], timeout)
+        if not readable:
+            return False
+
+        # drain all pending signals, they are all handled by the same wakeup
+        try:
+            while os.read(self._read_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
@@ -1,11 +1,15 @@
+import threading
+
 from flask import current_app
 
-from db.backend.sqlite.db import MySQLiteDB
-from db.backend.mongodb.db import MyMongoDB
 from db.middleware.abc.db import MiddlewareDB
 from db.middleware.stagingdb.db import StagingDB
 from log import log_info, log_debug
-from pymongo import MongoClient
+from metrics import instrument_db, metrics_enabled
+
+# with threaded workers (APP_SERVER__WORKER_CLASS=gthread) all threads of a worker share the DB,
+# so it must be created (and closed) by one thread at a time
+_db_lock = threading.Lock()
 
 
 def get_db() -> MiddlewareDB:
@@ -13,41 +17,76 @@ def get_db() -> MiddlewareDB:
     staging_db = current_app.config.get('SINGLETONS', {}).get('DB', None)
 
     if staging_db is None:
-        log_debug("DB", "Initializing DB connection", current_app.config.get('DB', {}))
-        db_type = current_app.config.get('DB', {}).get('TYPE', 'sqlite').lower()
-        if db_type == 'mongodb':
-            mongo_cfg: dict = current_app.config.get('DB', {}).get('MONGO', {})
-            database_name = mongo_cfg.get('DBNAME', 'proxysg_localdb')
-            connection_auth_real = mongo_cfg.get('DBAUTH', database_name)
-            connection_user = mongo_cfg.get('CON_USER', 'admin')
-            connection_password = mongo_cfg.get('CON_PASSWORD', 'adminpassword')
-            connection_host = mongo_cfg.get('CON_HOST', 'localhost')
-            connection_port = int(mongo_cfg.get('CON_PORT', 27017))
-            connection_direct = bool(mongo_cfg.get('CON_DIRECT', False))
-            mongo_disable_transactions = bool(mongo_cfg.get('DISABLE_TRANSACTIONS', False))
-            log_info('DB', 'Connecting to MongoDB', { 'db': database_name, 'auth_db': connection_auth_real, 'user': connection_user, 'host': f'{connection_host}:{connection_port}' })
-            db = MyMongoDB(MongoClient(
-                connection_host,
-                port=connection_port,
+        with _db_lock:
+            # another thread might have created the DB while we waited for the lock
+            staging_db = current_app.config.get('SINGLETONS', {}).get('DB', None)
+            if staging_db is None:
+                staging_db = _create_db()
+                current_app.config.setdefault('SINGLETONS', {})
+                current_app.config['SINGLETONS']['DB'] = staging_db
+
+    return staging_db
+
+
+def _create_db() -> StagingDB:
+    """Connect to the configured database backend"""
+    log_debug("DB", "Initializing DB connection", current_app.config.get('DB', {}))
+    db_type = current_app.config.get('DB', {}).get('TYPE', 'sqlite').lower()
+    # the backends are only imported when used, pymongo alone adds noticeably to the startup of every worker
+    if db_type == 'mongodb':
+        from db.backend.mongodb.db import MyMongoDB
+        from db.backend.mongodb.util.read_preference import build_read_preference
+        from pymongo import MongoClient
+
+        mongo_cfg: dict = current_app.config.get('DB', {}).get('MONGO', {})
+        database_name = mongo_cfg.get('DBNAME', 'proxysg_localdb')
+        connection_auth_real = mongo_cfg.get('DBAUTH', database_name)
+        connection_user = mongo_cfg.get('CON_USER', 'admin')
+        connection_password = mongo_cfg.get('CON_PASSWORD', 'adminpassword')
+        connection_host = mongo_cfg.get('CON_HOST', 'localhost')
+        connection_port = int(mongo_cfg.get('CON_PORT', 27017))
+        connection_direct = bool(mongo_cfg.get('CON_DIRECT', False))
+        mongo_disable_transactions = bool(mongo_cfg.get('DISABLE_TRANSACTIONS', False))
+        read_preference = build_read_preference(
+            mongo_cfg.get('READ_PREFERENCE', 'primary'),
+            int(mongo_cfg.get('MAX_STALENESS', -1)),
+        )
+        read_host = mongo_cfg.get('READ_HOST', '')
+        log_info('DB', 'Connecting to MongoDB', { 'db': database_name, 'auth_db': connection_auth_real, 'user': connection_user, 'host': f'{connection_host}:{connection_port}' })
+        read_client = None
+        if read_host:
+            read_port = int(mongo_cfg.get('READ_PORT', connection_port))
+            log_info('DB', 'Connecting to MongoDB for reads', { 'host': f'{read_host}:{read_port}', 'read_preference': str(read_preference) })
+            read_client = MongoClient(
+                read_host,
+                port=read_port,
                 username=connection_user,
                 password=connection_password,
                 authSource=connection_auth_real,
                 directconnection=connection_direct,
-            ), database_name, disable_transaction=mongo_disable_transactions)
-        elif db_type == 'sqlite':
-            sqlite_cfg: dict = current_app.config.get('DB', {}).get('SQLITE', {})
-            database_name = sqlite_cfg.get('APP_DB_SQLITE_FILENAME', './data/mydatabase.db')
-            log_info('DB', 'Creating Standby SQLite DB', { 'db': database_name })
-            db = MySQLiteDB(database_name)
-        else:
-            raise ValueError(f'Unsupported APP_DB_TYPE: {db_type}')
+            )
+        db = MyMongoDB(MongoClient(
+            connection_host,
+            port=connection_port,
+            username=connection_user,
+            password=connection_password,
+            authSource=connection_auth_real,
+            directconnection=connection_direct,
+        ), database_name, disable_transaction=mongo_disable_transactions, read_client=read_client, read_preference=read_preference)
+    elif db_type == 'sqlite':
+        from db.backend.sqlite.db import MySQLiteDB
 
-        staging_db = StagingDB(db)
+        sqlite_cfg: dict = current_app.config.get('DB', {}).get('SQLITE', {})
+        database_name = sqlite_cfg.get('APP_DB_SQLITE_FILENAME', './data/mydatabase.db')
+        log_info('DB', 'Creating Standby SQLite DB', { 'db': database_name })
+        db = MySQLiteDB(database_name)
+    else:
+        raise ValueError(f'Unsupported APP_DB_TYPE: {db_type}')
 
-        current_app.config.setdefault('SINGLETONS', {})
-        current_app.config['SINGLETONS']['DB'] = staging_db
+    if metrics_enabled(current_app):
+        instrument_db(db, db_type)
 
-    return staging_db
+    return StagingDB(db)
 
 
 def close_connection():
@@ -55,7 +94,8 @@ def close_connection():
     Remove the current database connection.
     Flask calls this every time a Context is being removed (e.g., end of request)
     """
-    db = current_app.config.get('SINGLETONS', {}).get('DB', None)
-    if db is not None:
-        db.close()
-        current_app.config['SINGLETONS']['DB'] = None
+    with _db_lock:
+        db = current_app.config.get('SINGLETONS', {}).get('DB', None)
+        if db is not None:
+            db.close()
+            current_app.config['SINGLETONS']['DB'] = None
@@ -1,7 +1,8 @@
 from dataclasses import field, dataclass
-from typing import Optional, List
+from typing import Optional, List, Tuple, Dict, Any
 from marshmallow.validate import Length
 
+from db.util.compact import intern_ids, intern_str
 from db.util.validators import simpleNameValidator, simpleStringValidator
 
 
@@ -87,3 +88,37 @@ class Category(MutableCategory):
             nested_categories=[],
             pending_changes=False,
         )
+
+
+class CompactCategory:
+    """
+    Compact, immutable representation of a category.
+
+    Used for the categories kept in memory between requests (e.g. the committed object cache).
+    """
+    __slots__ = ('id', 'name', 'color', 'description', 'is_deleted', 'nested_categories', 'pending_changes')
+
+    def __init__(self, category: Category):
+        # the ID is referenced by every URL & token, so share it with their (interned) category lists
+        self.id: str = intern_str(category.id)
+        self.name: str = category.name
+        self.color: int = category.color
+        self.description: Optional[str] = category.description
+        self.is_deleted: int = category.is_deleted
+        self.nested_categories: Tuple[str, ...] = intern_ids(category.nested_categories)
+        self.pending_changes: bool = category.pending_changes
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a new (mutable) dict of the category, with the fields of the Category dataclass"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'color': self.color,
+            'description': self.description,
+            'is_deleted': self.is_deleted,
+            'nested_categories': list(self.nested_categories),
+            'pending_changes': self.pending_changes,
+        }
+
+    def to_rest(self) -> Category:
+        return Category(**self.to_dict())
@@ -1,6 +1,6 @@
 from dataclasses import field, dataclass
 from enum import IntFlag
-from typing import List
+from typing import List, Dict, Any, Optional
 from marshmallow.validate import Length
 
 from auth.auth_user import AuthUser
@@ -36,6 +36,16 @@ class Task:
     status: str
     created_at: int
     updated_at: int
+    # statistics reported by the task while / after running, e.g. throughput of an import
+    stats: Dict[str, Any] = field(default_factory=dict)
+    # units of work done / planned, reported while running
+    progress: int = 0
+    progress_total: int = 0
+    # task specific state, to resume the task after it was interrupted
+    checkpoint: Dict[str, Any] = field(default_factory=dict)
+    # queue holding the lease of the task, only set on the task returned by claim_task
+    # all writes of a claimed task are fenced on it, so a task taken over by another worker can not be finished twice
+    lease_owner: Optional[str] = None
 
     def to_rest(self) -> RESTTask:
         # hide "parameters" due to large size for e.g. import tasks
@@ -46,6 +56,10 @@ class Task:
             status=self.status,
             created_at=self.created_at,
             updated_at=self.updated_at,
+            stats=self.stats,
+            progress=self.progress,
+            progress_total=self.progress_total,
+            checkpoint=self.checkpoint,
         )
 
 
@@ -1,7 +1,8 @@
 from dataclasses import field, dataclass
-from typing import List
+from typing import List, Tuple, Dict, Any
 from marshmallow.validate import Length
 
+from db.util.compact import intern_ids
 from db.util.validators import simpleStringValidator
 
 
@@ -74,3 +75,36 @@ class Token(MutableToken):
             categories=[],
             pending_changes=False,
         )
+
+
+class CompactToken:
+    """
+    Compact, immutable representation of a token.
+
+    Used for the tokens kept in memory between requests (e.g. the committed object cache).
+    """
+    __slots__ = ('id', 'token', 'description', 'last_use', 'is_deleted', 'categories', 'pending_changes')
+
+    def __init__(self, token: Token):
+        self.id: str = token.id
+        self.token: str = token.token
+        self.description: str = token.description
+        self.last_use: int = token.last_use
+        self.is_deleted: int = token.is_deleted
+        self.categories: Tuple[str, ...] = intern_ids(token.categories)
+        self.pending_changes: bool = token.pending_changes
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a new (mutable) dict of the token, with the fields of the Token dataclass"""
+        return {
+            'id': self.id,
+            'token': self.token,
+            'description': self.description,
+            'last_use': self.last_use,
+            'is_deleted': self.is_deleted,
+            'categories': list(self.categories),
+            'pending_changes': self.pending_changes,
+        }
+
+    def to_rest(self) -> Token:
+        return Token(**self.to_dict())
@@ -1,7 +1,8 @@
 from dataclasses import field, dataclass
-from typing import List
+from typing import List, Optional, Tuple, Dict, Any
 from marshmallow.validate import Length
 
+from db.util.compact import intern_ids
 from db.util.validators import simpleURLValidator, simpleStringValidator
 
 
@@ -102,3 +103,49 @@ class URL(MutableURL):
             bc_last_set=0,
             pending_changes=False,
         )
+
+
+class CompactURL:
+    """
+    Compact, immutable representation of a URL.
+
+    Used for the URLs kept in memory between requests (e.g. the committed object cache).
+    Slots instead of a __dict__, interned IDs & tuples instead of lists need far less memory per URL.
+    """
+    __slots__ = ('id', 'hostname', 'description', 'is_deleted', 'categories', 'bc_cats', 'bc_last_set', 'pending_changes')
+
+    def __init__(self, url: URL):
+        self.id: str = url.id
+        self.hostname: str = url.hostname
+        self.description: Optional[str] = url.description
+        self.is_deleted: int = url.is_deleted
+        self.categories: Tuple[str, ...] = intern_ids(url.categories)
+        self.bc_cats: Tuple[str, ...] = intern_ids(url.bc_cats)
+        self.bc_last_set: int = url.bc_last_set
+        self.pending_changes: bool = url.pending_changes
+
+    def set_bc_cats(self, bc: Tuple[List[str], int]):
+        """
+        Refresh the BlueCoat categories in place, the only fields of a cached URL that change without a new revision.
+
+        :param bc: The BlueCoat categories & the timestamp they were set at
+        """
+        bc_cats, bc_last_set = bc
+        self.bc_cats = intern_ids(bc_cats)
+        self.bc_last_set = bc_last_set
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a new (mutable) dict of the URL, with the fields of the URL dataclass"""
+        return {
+            'id': self.id,
+            'hostname': self.hostname,
+            'description': self.description,
+            'is_deleted': self.is_deleted,
+            'categories': list(self.categories),
+            'bc_cats': list(self.bc_cats),
+            'bc_last_set': self.bc_last_set,
+            'pending_changes': self.pending_changes,
+        }
+
+    def to_rest(self) -> URL:
+        return URL(**self.to_dict())
@@ -59,6 +59,15 @@ class MiddlewareDBCategory(ABC):
         """
         pass
 
+    def delete_categories(self, auth: AuthUser, cat_ids: List[str]):
+        """
+        Soft-delete a batch of categories.
+
+        :param auth: The authenticated user.
+        :param cat_ids: The IDs of the categories to delete.
+        """
+        pass
+
     @abstractmethod
     def get_all_categories(self, bypass_cache: bool = False) -> List[Category]:
         """
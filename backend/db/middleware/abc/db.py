@@ -29,3 +29,24 @@ class MiddlewareDB(ABC):
     def migrate(self):
         """Method to migrate the database schema."""
         pass
+
+    @abstractmethod
+    def update_metrics(self):
+        """
+        Set the gauges of the task queue and of the staged changes from the DB.
+        Both are kept up to date by every write, so this is only required once per process.
+        """
+        pass
+
+    @abstractmethod
+    def get_revision(self, scope: str, committed: bool = False) -> str:
+        """
+        Get an opaque revision of the data returned for a scope.
+        The revision changes whenever the data might have changed, and is cheap to compute.
+
+        :param scope: One of 'url', 'category', 'token', 'history', 'task'
+            or 'bc' (the BlueCoat categories of the URLs, which change without changing the revision of 'url')
+        :param committed: True for the revision of the committed data only (as returned with bypass_cache), ignoring staged changes
+        :return: The revision, e.g. to be used as an ETag
+        """
+        pass
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from auth.auth_user import AuthUser
+from db.dbmodel.url import URL
 
 
 class MiddlewareDBURLCategory(ABC):
@@ -26,12 +27,18 @@ class MiddlewareDBURLCategory(ABC):
         pass
 
     @abstractmethod
-    def add_url_categories(self, auth: AuthUser, mappings: Dict[str, List[str]]):
+    def add_url_categories(
+        self,
+        auth: AuthUser,
+        mappings: Dict[str, List[str]],
+        known_urls: Optional[List[URL]] = None,
+    ):
         """
         Add a batch of new URL to Category mappings
 
         :param auth: The authenticated user
         :param mappings: A list of Tuples, where each Tuple contains the URL ID and the Category ID
+        :param known_urls: The current state of all URLs, if the caller already loaded them (saves loading them again)
         """
         pass
 
@@ -3,6 +3,8 @@ from typing import List, Optional
 from db.backend.abc.db import DBInterface
 from db.backend.abc.util.types import MyTransactionType
 from db.dbmodel.staging import StagedChange, ActionTable
+from db.middleware.stagingdb.utils.committed_cache import CONFIG_VAR_STAGED_REVISION
+from metrics import STAGED_CHANGES
 
 
 class StagedCollection:
@@ -18,7 +20,9 @@ class StagedCollection:
         """Add a staged change to the persistent storage."""
         # Store the change in the persistent storage
         self._db.staging.store_staged_change(change)
+        self._db.config.increment_int(CONFIG_VAR_STAGED_REVISION)
         self.simplify_stack()
+        self.update_metrics()
 
     def add_batch(self, changes: List[StagedChange]):
         """Add a list of staged changes to the persistent storage."""
@@ -27,7 +31,13 @@ class StagedCollection:
 
         # Store the change in the persistent storage
         self._db.staging.store_staged_changes(changes)
+        self._db.config.increment_int(CONFIG_VAR_STAGED_REVISION)
         self.simplify_stack()
+        self.update_metrics()
+
+    def revision(self) -> int:
+        """Get a counter, that changes whenever staged changes are added or removed."""
+        return self._db.config.read_int(CONFIG_VAR_STAGED_REVISION)
 
     def get_all(self, session: Optional[MyTransactionType] = None) -> List[StagedChange]:
         """Get all staged changes from the persistent storage."""
@@ -69,6 +79,16 @@ class StagedCollection:
         :param session: The database session to use.
         """
         self._db.staging.clear_staged_changes(before=before, session=session)
+        self._db.config.increment_int(CONFIG_VAR_STAGED_REVISION, session=session)
+        self.update_metrics(session=session)
+
+    def update_metrics(self, session: Optional[MyTransactionType] = None):
+        """
+        Set the number of staged changes, whenever changes are added or removed.
+
+        :param session: The database session of the change, so its result is counted before it is committed
+        """
+        STAGED_CHANGES.set(self._db.staging.count_staged_changes(session=session))
 
     def simplify_stack(self):
         """Simplify the stack of staged changes."""
@@ -4,22 +4,27 @@ from typing import Optional, List
 from auth.auth_user import AuthUser
 from db.backend.abc.db import DBInterface
 from db.backend.abc.util.types import MyTransactionType
-from db.dbmodel.category import MutableCategory, Category
+from db.dbmodel.category import MutableCategory, Category, CompactCategory
 from db.dbmodel.history import Atomic
 from db.dbmodel.staging import ActionType, ActionTable, StagedChange
 from db.middleware.abc.category_db import MiddlewareDBCategory
 from db.middleware.stagingdb.cache import StagedCollection
 from db.middleware.stagingdb.utils.add_uid import add_uid_to_object, add_uid_to_objects
 from db.middleware.stagingdb.utils.cache import SessionCache
+from db.middleware.stagingdb.utils.committed_cache import CommittedObjectCache
 from db.middleware.stagingdb.utils.overloading import add_staged_change, add_staged_changes, get_and_overload_object, \
     get_and_overload_all_objects, update_dataclass
 from db.middleware.stagingdb.utils.update_cats import set_categories
 
 
 class StagingDBCategory(MiddlewareDBCategory):
-    def __init__(self, db: DBInterface, staged: StagedCollection):
+    def __init__(self, db: DBInterface, staged: StagedCollection, committed: CommittedObjectCache):
         self._db = db
         self._staged = staged
+        self._committed = committed
+
+    def _get_all_committed(self) -> List[CompactCategory]:
+        return self._committed.get_all(ActionTable.CATEGORY, self._db.categories.get_all_categories, CompactCategory)
 
     def add_category(self, auth: AuthUser, category: MutableCategory) -> Category:
         # Generate a UUID and add it to the category data
@@ -92,12 +97,26 @@ class StagingDBCategory(MiddlewareDBCategory):
             staged=self._staged,
         )
 
+    def delete_categories(self, auth: AuthUser, cat_ids: List[str]):
+        if not cat_ids:
+            return
+
+        deleted_at = int(time.time())
+        add_staged_changes(
+            action_type=ActionType.DELETE,
+            action_table=ActionTable.CATEGORY,
+            auth=auth,
+            obj_ids=cat_ids,
+            update_data=[{'is_deleted': deleted_at} for _ in cat_ids],
+            staged=self._staged,
+        )
+
     def get_all_categories(self, bypass_cache: bool = False) -> List[Category]:
         if bypass_cache:
-            return self._db.categories.get_all_categories()
+            return [x.to_rest() for x in self._get_all_committed()]
 
         return get_and_overload_all_objects(
-            db_getter=self._db.categories.get_all_categories,
+            db_getter=self._get_all_committed,
             staged=self._staged,
             action_table=ActionTable.CATEGORY,
             obj_class=Category
@@ -17,6 +17,8 @@ from db.middleware.stagingdb.token_db import StagingDBToken
 from db.middleware.stagingdb.url_category_db import StagingDBURLCategory
 from db.middleware.stagingdb.url_db import StagingDBURL
 from db.middleware.stagingdb.utils.cache import SessionCache
+from db.middleware.stagingdb.utils.committed_cache import CommittedObjectCache, CONFIG_VAR_HISTORY_REVISION, \
+    CONFIG_VAR_BC_REVISION
 
 
 class StagingDB(MiddlewareDB):
@@ -37,22 +39,30 @@ class StagingDB(MiddlewareDB):
         super().__init__()
         self._main_db = main_db
         self._staged = StagedCollection(self._main_db)
+        self._committed = CommittedObjectCache(self._main_db)
 
-        self.categories = StagingDBCategory(self._main_db, self._staged)
+        self.categories = StagingDBCategory(self._main_db, self._staged, self._committed)
         self.sub_categories = StagingDBSubCategory(self._main_db, self._staged, self.categories)
         self.history = StagingDBHistory(
             self._main_db,
             lambda: self._commit_modules(True, int(time.time()))
         )
-        self.tokens = StagingDBToken(self._main_db, self._staged)
+        self.tokens = StagingDBToken(self._main_db, self._staged, self._committed)
         self.token_categories = StagingDBTokenCategory(self._main_db, self._staged, self.tokens)
-        self.urls = StagingDBURL(self._main_db, self._staged)
+        self.urls = StagingDBURL(self._main_db, self._staged, self._committed)
         self.url_categories = StagingDBURLCategory(self._main_db, self._staged, self.urls)
         self.tasks = StagingDBTask(self._main_db, self._staged)
 
     def close(self):
         self._main_db.close()
 
+    def take_over_caches(self, other: 'StagingDB'):
+        """
+        Take over the committed objects cached by another instance, whose connection might already be closed.
+        Used by the workers to reuse the objects the gunicorn master loaded before the fork.
+        """
+        self._committed.take_over(other._committed)
+
     def _commit_modules(self, dry_run: bool, not_before: int, session: Optional[MyTransactionType] = None) -> Tuple[
         List[Atomic],
         List[str],
@@ -101,6 +111,14 @@ class StagingDB(MiddlewareDB):
         # remove all staged events
         self._staged.clear()
 
+    def count_staged(self, not_before: int) -> int:
+        """
+        Count the staged changes a commit would apply.
+
+        :param not_before: timestamp in UTC as a cutoff for pending changes to be committed
+        """
+        return sum(1 for change in self._staged.get_all() if change.timestamp <= not_before)
+
     def commit(self, user: AuthUser, commit_message: str, not_before: int):
         """
         Push all staged changes to the main database.
@@ -123,9 +141,32 @@ class StagingDB(MiddlewareDB):
                     atomics=atomics,
                     session=session,
                 )
+                # the committed objects changed, drop them from the caches of all workers
+                self._committed.invalidate([ActionTable.CATEGORY, ActionTable.TOKEN, ActionTable.URL], session=session)
+                self._main_db.config.increment_int(CONFIG_VAR_HISTORY_REVISION, session=session)
 
             # remove all staged events, now that they are committed
             self._staged.clear(before=not_before, session=session)
 
     def migrate(self):
         self._main_db.migrate()
+        # migrations add history events
+        self._main_db.config.increment_int(CONFIG_VAR_HISTORY_REVISION)
+
+    def update_metrics(self):
+        self.tasks.update_metrics()
+        self._staged.update_metrics()
+
+    def get_revision(self, scope: str, committed: bool = False) -> str:
+        # every scope depends on the staged changes, except the tasks & the BlueCoat categories
+        if scope == 'task':
+            return f'task-{self.tasks.revision()}'
+        if scope == 'bc':
+            return f'bc-{self._main_db.config.read_int(CONFIG_VAR_BC_REVISION)}'
+        staged = 'committed' if committed else self._staged.revision()
+
+        if scope == 'history':
+            revision = self._main_db.config.read_int(CONFIG_VAR_HISTORY_REVISION)
+        else:
+            revision = self._committed.revision(ActionTable(scope))
+        return f'{scope}-{staged}-{revision}'
@@ -1,10 +1,12 @@
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 
 from auth.auth_user import AuthUser
 from db.backend.abc.db import DBInterface
 from db.dbmodel.task import MutableTask, Task
 from db.middleware.abc.task_db import MiddlewareDBTask
 from db.middleware.stagingdb.cache import StagedCollection
+from db.middleware.stagingdb.utils.committed_cache import CONFIG_VAR_TASK_REVISION
+from metrics import TASK_QUEUE_DEPTH
 
 
 class StagingDBTask(MiddlewareDBTask):
@@ -13,7 +15,10 @@ class StagingDBTask(MiddlewareDBTask):
         self._staged = staged
 
     def add_task(self, user: AuthUser, task: MutableTask) -> Task:
-        return self._db.tasks.add_task(user, task)
+        new_task = self._db.tasks.add_task(user, task)
+        self._db.config.increment_int(CONFIG_VAR_TASK_REVISION)
+        self.update_metrics()
+        return new_task
 
     def get_task(self, task_id: str) -> Optional[Task]:
         return self._db.tasks.get_task(task_id)
@@ -22,11 +27,62 @@ class StagingDBTask(MiddlewareDBTask):
             self,
             task_id: str,
             status: str,
-    ) -> Task:
-        return self._db.tasks.update_task_status(task_id, status)
+            owner: Optional[str] = None,
+    ) -> Optional[Task]:
+        updated_task = self._db.tasks.update_task_status(task_id, status, owner)
+        if updated_task is not None:
+            self._db.config.increment_int(CONFIG_VAR_TASK_REVISION)
+            self.update_metrics()
+        return updated_task
+
+    def update_task_stats(self, task_id: str, stats: Dict[str, Any], owner: Optional[str] = None) -> bool:
+        written = self._db.tasks.update_task_stats(task_id, stats, owner)
+        if written:
+            self._db.config.increment_int(CONFIG_VAR_TASK_REVISION)
+        return written
+
+    def update_task_progress(
+        self,
+        task_id: str,
+        progress: int,
+        progress_total: int,
+        checkpoint: Dict[str, Any],
+        owner: Optional[str] = None,
+    ) -> bool:
+        written = self._db.tasks.update_task_progress(task_id, progress, progress_total, checkpoint, owner)
+        if written:
+            self._db.config.increment_int(CONFIG_VAR_TASK_REVISION)
+        return written
 
     def get_all_tasks(self) -> List[Task]:
         return self._db.tasks.get_all_tasks()
 
+    def revision(self) -> int:
+        """Get a counter, that changes whenever a task is added or updated."""
+        return self._db.config.read_int(CONFIG_VAR_TASK_REVISION)
+
+    def update_metrics(self):
+        """Set the task queue depth, whenever the status of a task changed"""
+        TASK_QUEUE_DEPTH.set(self._db.tasks.count_pending_tasks())
+
     def get_next_pending_task(self) -> Optional[Task]:
         return self._db.tasks.get_next_pending_task()
+
+    def claim_task(
+        self,
+        owner: str,
+        lease_seconds: int,
+        names: List[str],
+        other_names: bool = False,
+    ) -> Optional[Task]:
+        claimed = self._db.tasks.claim_task(owner, lease_seconds, names, other_names)
+        if claimed is not None:
+            self._db.config.increment_int(CONFIG_VAR_TASK_REVISION)
+            self.update_metrics()
+        return claimed
+
+    def renew_task_lease(self, task_id: str, owner: str, lease_seconds: int) -> bool:
+        return self._db.tasks.renew_task_lease(task_id, owner, lease_seconds)
+
+    def wait_for_new_task(self, timeout: float) -> bool:
+        return self._db.tasks.wait_for_new_task(timeout)
@@ -7,20 +7,25 @@ from db.backend.abc.db import DBInterface
 from db.backend.abc.util.types import MyTransactionType
 from db.dbmodel.history import Atomic
 from db.dbmodel.staging import ActionType, ActionTable
-from db.dbmodel.token import MutableToken, Token
+from db.dbmodel.token import MutableToken, Token, CompactToken
 from db.middleware.abc.token_db import MiddlewareDBToken
 from db.middleware.stagingdb.cache import StagedChange, StagedCollection
 from db.middleware.stagingdb.utils.add_uid import add_uid_to_object
 from db.middleware.stagingdb.utils.cache import SessionCache
+from db.middleware.stagingdb.utils.committed_cache import CommittedObjectCache
 from db.middleware.stagingdb.utils.overloading import add_staged_change, get_and_overload_object, \
     get_and_overload_all_objects, update_dataclass
 from db.middleware.stagingdb.utils.update_cats import set_categories
 
 
 class StagingDBToken(MiddlewareDBToken):
-    def __init__(self, db: DBInterface, staged: StagedCollection):
+    def __init__(self, db: DBInterface, staged: StagedCollection, committed: CommittedObjectCache):
         self._db = db
         self._staged = staged
+        self._committed = committed
+
+    def _get_all_committed(self) -> List[CompactToken]:
+        return self._committed.get_all(ActionTable.TOKEN, self._db.tokens.get_all_tokens, CompactToken)
 
     def add_token(self, auth: AuthUser, mut_tok: MutableToken) -> Token:
         # Generate a UUID for the token ID and get the data
@@ -71,6 +76,7 @@ class StagingDBToken(MiddlewareDBToken):
     def update_usage(self, token_id: str):
         # Usage updates _ALWAYS_ go straight to DB
         self._db.tokens.update_usage(token_id)
+        self._committed.invalidate([ActionTable.TOKEN])
 
     def roll_token(self, auth: AuthUser, token_id: str) -> Token:
         add_staged_change(
@@ -95,7 +101,7 @@ class StagingDBToken(MiddlewareDBToken):
 
     def get_all_tokens(self) -> List[Token]:
         return get_and_overload_all_objects(
-            db_getter=self._db.tokens.get_all_tokens,
+            db_getter=self._get_all_committed,
             staged=self._staged,
             action_table=ActionTable.TOKEN,
             obj_class=Token
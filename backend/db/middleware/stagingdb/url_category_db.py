@@ -1,8 +1,9 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from auth.auth_user import AuthUser
 from db.backend.abc.db import DBInterface
 from db.dbmodel.staging import ActionType, ActionTable
+from db.dbmodel.url import URL
 from db.middleware.abc.url_category_db import MiddlewareDBURLCategory
 from db.middleware.stagingdb.cache import StagedCollection
 from db.middleware.stagingdb.url_db import StagingDBURL
@@ -38,12 +39,18 @@ class StagingDBURLCategory(MiddlewareDBURLCategory):
                 staged=self._staged,
             )
 
-    def add_url_categories(self, auth: AuthUser, mappings: Dict[str, List[str]]):
+    def add_url_categories(
+        self,
+        auth: AuthUser,
+        mappings: Dict[str, List[str]],
+        known_urls: Optional[List[URL]] = None,
+    ):
         if not mappings:
             return
 
         # get a list of all URL (convert urls to dicts for a faster lookup)
-        known_urls = self._url_db.get_all_urls()
+        if known_urls is None:
+            known_urls = self._url_db.get_all_urls()
         known_urls_by_id = {x.id: x for x in known_urls}
 
         url_ids = []
@@ -1,25 +1,34 @@
 import time
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from auth.auth_user import AuthUser
 from db.backend.abc.db import DBInterface
 from db.backend.abc.util.types import MyTransactionType
 from db.dbmodel.history import Atomic
 from db.dbmodel.staging import ActionType, ActionTable, StagedChange
-from db.dbmodel.url import MutableURL, URL
+from db.dbmodel.url import MutableURL, URL, CompactURL
 from db.middleware.abc.url_db import MiddlewareDBURL
 from db.middleware.stagingdb.cache import StagedCollection
 from db.middleware.stagingdb.utils.add_uid import add_uid_to_object, add_uid_to_objects
 from db.middleware.stagingdb.utils.cache import SessionCache
+from db.middleware.stagingdb.utils.committed_cache import CommittedObjectCache, CONFIG_VAR_BC_REVISION
 from db.middleware.stagingdb.utils.overloading import add_staged_change, get_and_overload_object, \
     get_and_overload_all_objects, add_staged_changes, update_dataclass
 from db.middleware.stagingdb.utils.update_cats import set_categories
 
 
 class StagingDBURL(MiddlewareDBURL):
-    def __init__(self, db: DBInterface, staged: StagedCollection):
+    def __init__(self, db: DBInterface, staged: StagedCollection, committed: CommittedObjectCache):
         self._db = db
         self._staged = staged
+        self._committed = committed
+
+    def _get_all_committed(self) -> List[CompactURL]:
+        urls = self._committed.get_all(ActionTable.URL, self._db.urls.get_all_urls, CompactURL, (CONFIG_VAR_BC_REVISION,))
+        # the BlueCoat categories are not part of the revision of the URLs (e.g. the compiled categories don't use them),
+        # so the cached URLs are kept, and only their BlueCoat categories are refreshed
+        self._committed.refresh_fields(ActionTable.URL, CONFIG_VAR_BC_REVISION, self._db.urls.get_all_bc_cats, CompactURL.set_bc_cats)
+        return urls
 
     def add_url(self, auth: AuthUser, mut_url: MutableURL) -> URL:
         # Generate a UUID and add it to the URL data
@@ -82,9 +91,21 @@ class StagingDBURL(MiddlewareDBURL):
 
         return self.get_url(url_id)
 
-    def set_bc_cats(self, url_id: str, bc_cats: List[str]):
-        # BC cats updates go straight to DB
-        return self._db.urls.set_bc_cats(url_id, bc_cats)
+    def set_bc_cats_many(self, updates: List[Tuple[str, List[str], int]]):
+        if not updates:
+            return
+
+        # BC cats updates go straight to DB, and only change the revision of the BC cats (once per batch)
+        self._db.urls.set_bc_cats_many(updates)
+        self._db.config.increment_int(CONFIG_VAR_BC_REVISION)
+
+    def set_bc_next_due(self, url_id: str, next_due: int):
+        # the schedule is not part of the URL objects, so the caches stay valid
+        self._db.urls.set_bc_next_due(url_id, next_due)
+
+    def get_bc_due_urls(self, now: int, limit: int) -> List[URL]:
+        # the schedule _ALWAYS_ goes straight to DB
+        return self._db.urls.get_bc_due_urls(now, limit)
 
     def delete_url(self, auth: AuthUser, url_id: str):
         add_staged_change(
@@ -96,12 +117,26 @@ class StagingDBURL(MiddlewareDBURL):
             staged=self._staged,
         )
 
+    def delete_urls(self, auth: AuthUser, url_ids: List[str]):
+        if not url_ids:
+            return
+
+        deleted_at = int(time.time())
+        add_staged_changes(
+            action_type=ActionType.DELETE,
+            action_table=ActionTable.URL,
+            auth=auth,
+            obj_ids=url_ids,
+            update_data=[{'is_deleted': deleted_at} for _ in url_ids],
+            staged=self._staged,
+        )
+
     def get_all_urls(self, bypass_cache: bool = False) -> List[URL]:
         if bypass_cache:
-            return self._db.urls.get_all_urls()
+            return [x.to_rest() for x in self._get_all_committed()]
 
         return get_and_overload_all_objects(
-            db_getter=self._db.urls.get_all_urls,
+            db_getter=self._get_all_committed,
             staged=self._staged,
             action_table=ActionTable.URL,
             obj_class=URL
@@ -0,0 +1,161 @@
+import threading
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from db.backend.abc.db import DBInterface
+from db.backend.abc.util.types import MyTransactionType
+from db.dbmodel.staging import ActionTable
+from log import log_debug
+
+# prefix for the config variables holding the revision of each table
+CONFIG_VAR_REVISION_PREFIX = 'revision-'
+# revision of data that is not cached, but used to build ETags
+CONFIG_VAR_STAGED_REVISION = CONFIG_VAR_REVISION_PREFIX + 'staged'
+CONFIG_VAR_HISTORY_REVISION = CONFIG_VAR_REVISION_PREFIX + 'history'
+CONFIG_VAR_TASK_REVISION = CONFIG_VAR_REVISION_PREFIX + 'task'
+# revision of the BlueCoat categories of the URLs, they change without changing the revision of the URLs
+CONFIG_VAR_BC_REVISION = CONFIG_VAR_REVISION_PREFIX + 'bc'
+
+
+def _revision_key(table: ActionTable) -> str:
+    return CONFIG_VAR_REVISION_PREFIX + table.value
+
+
+class CommittedObjectCache:
+    """
+    Process-wide read-through cache of the committed objects of each table.
+
+    Every table has a revision counter stored in the config of the database.
+    Writers bump the counter (see invalidate), readers compare it with the revision
+    the cached objects were loaded with and only re-query the table if it changed.
+    Since the counter lives in the database, this also invalidates the caches of all other workers.
+
+    The objects are kept in their compact representation (e.g. CompactURL), since they stay in memory
+    for the lifetime of the worker.
+
+    Fields that change often but are not part of the revision of their table (e.g. the BlueCoat categories of the URLs)
+    have a revision of their own, and are refreshed on the cached objects in place (see refresh_fields).
+    """
+
+    def __init__(self, main_db: DBInterface):
+        self._main_db = main_db
+        self._lock = threading.Lock()
+        # revision & objects (by ID) for each table
+        self._entries: Dict[ActionTable, Tuple[int, Dict[str, Any]]] = {}
+        # revision of the fields refreshed in place, by table & config variable of the revision
+        self._field_revisions: Dict[Tuple[ActionTable, str], int] = {}
+
+    def revision(self, table: ActionTable) -> int:
+        """
+        Get the committed revision of a table.
+
+        :param table: The table to check
+        :return: The current revision, -1 if the table was never written to
+        """
+        return self._main_db.config.read_int(_revision_key(table))
+
+    def get_all(
+        self,
+        table: ActionTable,
+        db_getter: Callable[[], List[Any]],
+        compact: Callable[[Any], Any],
+        field_revisions: Tuple[str, ...] = (),
+    ) -> List[Any]:
+        """
+        Get all committed objects of a table.
+
+        The returned objects are shared between callers, and must not be modified (besides by refresh_fields).
+
+        :param table: The table to read
+        :param db_getter: A function that retrieves all objects from the database,
+            it must read from the primary (like the revision), else stale objects are cached under the new revision
+        :param compact: A function converting an object from the database into its compact representation
+        :param field_revisions: Config variables of the revisions of the fields refreshed in place,
+            a reload includes the current fields, so they are only refreshed after their next change
+        :return: A list of all committed objects, in their compact representation
+        """
+        # read the revisions before loading, so a concurrent write is at worst loaded twice
+        revision = self.revision(table)
+
+        with self._lock:
+            entry = self._entries.get(table)
+        if entry is not None and entry[0] == revision:
+            return list(entry[1].values())
+
+        loaded_fields = {key: self._main_db.config.read_int(key) for key in field_revisions}
+        objects = [compact(x) for x in db_getter()]
+        log_debug('CACHE', 'reloaded committed objects', {
+            'table': table.value,
+            'revision': revision,
+            'objects': len(objects),
+        })
+        with self._lock:
+            self._entries[table] = (revision, {x.id: x for x in objects})
+            for key, field_revision in loaded_fields.items():
+                self._field_revisions[(table, key)] = field_revision
+        return objects
+
+    def refresh_fields(
+        self,
+        table: ActionTable,
+        revision_key: str,
+        db_getter: Callable[[], Dict[str, Any]],
+        apply: Callable[[Any, Any], None],
+    ):
+        """
+        Refresh fields of the cached objects of a table in place, if their revision changed.
+
+        :param table: The cached table
+        :param revision_key: The config variable holding the revision of the fields
+        :param db_getter: A function that retrieves the fields of all objects from the database (from the primary), by ID
+        :param apply: A function setting the fields on a cached object
+        """
+        revision = self._main_db.config.read_int(revision_key)
+        with self._lock:
+            entry = self._entries.get(table)
+            if entry is None or self._field_revisions.get((table, revision_key)) == revision:
+                return
+
+        fields = db_getter()
+        with self._lock:
+            # only patch the objects the fields were loaded for, a reloaded entry already has them
+            if self._entries.get(table) is not entry:
+                return
+            for obj_id, obj in entry[1].items():
+                values = fields.get(obj_id)
+                if values is not None:
+                    apply(obj, values)
+            self._field_revisions[(table, revision_key)] = revision
+        log_debug('CACHE', 'refreshed fields of committed objects', {
+            'table': table.value,
+            'fields': revision_key,
+            'revision': revision,
+        })
+
+    def take_over(self, other: 'CommittedObjectCache'):
+        """
+        Take over the objects cached by another instance, e.g. loaded by the gunicorn master before the fork.
+        They are still checked against the current revision on every access.
+
+        :param other: The cache to take the objects from
+        """
+        with other._lock:
+            entries = dict(other._entries)
+            field_revisions = dict(other._field_revisions)
+        with self._lock:
+            self._entries.update(entries)
+            self._field_revisions.update(field_revisions)
+
+    def invalidate(self, tables: List[ActionTable], session: Optional[MyTransactionType] = None):
+        """
+        Mark the committed objects of the tables as changed, in this and all other workers.
+
+        :param tables: The tables that were written to
+        :param session: Optional database session, the new revision is only visible once it is committed
+        """
+        for table in tables:
+            self._main_db.config.increment_int(_revision_key(table), session=session)
+        with self._lock:
+            for table in tables:
+                self._entries.pop(table, None)
+            for key in [key for key in self._field_revisions if key[0] in tables]:
+                del self._field_revisions[key]
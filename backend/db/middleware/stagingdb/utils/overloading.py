@@ -67,7 +67,7 @@ def get_and_overload_object(
 
 
 def get_and_overload_all_objects(
-        db_getter: Callable[[], List[T]],
+        db_getter: Callable[[], List[Any]],
         staged: StagedCollection,
         action_table: ActionTable,
         obj_class: Type[T]
@@ -76,7 +76,7 @@ def get_and_overload_all_objects(
     Get all objects of a specific type from the database and staging collection.
 
     Args:
-        db_getter: A function that retrieves all objects from the database
+        db_getter: A function that retrieves all objects from the database, in their compact representation
         staged: The staged collection
         action_table: The table the objects belong to
         obj_class: The class to instantiate with the object data
@@ -85,9 +85,10 @@ def get_and_overload_all_objects(
         A list including all objects of the specified type
     """
     # Get all objects from the database
-    db_objects: List[T] = db_getter()
+    db_objects = db_getter()
     # Convert to dict
-    objects: List[Dict[str, Any]] = [obj.__dict__ for obj in db_objects]
+    # to_dict always returns new dicts, since the db objects are shared with the committed object cache
+    objects: List[Dict[str, Any]] = [obj.to_dict() for obj in db_objects]
 
     # load all (relevant) Staged Events from DB
     relevant_staged_events = staged.get_by_table(action_table)
@@ -0,0 +1,154 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, Set, Iterable, Iterator, Union, List, Any, Callable, Optional
+
+from auth.auth_user import AuthUser
+from db.dbmodel.category import MutableCategory
+from db.dbmodel.url import MutableURL, URL
+from db.middleware.abc.db import MiddlewareDB
+from db.util.parse_existing_db import ExistingCat, iter_db
+from log import log_debug
+
+# number of phases of BulkImporter.apply, e.g. to calculate the total progress of an import
+APPLY_PHASES = 3
+
+
+@dataclass
+class ImportStats:
+    """Counters and timings of a single import"""
+    lines: int = 0
+    categories: int = 0
+    urls: int = 0
+    new_categories: int = 0
+    new_urls: int = 0
+    new_mappings: int = 0
+    parse_seconds: float = 0.0
+    write_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the stats including the throughput, e.g. to report them on a task"""
+        staged = self.new_categories + self.new_urls + self.new_mappings
+        return {
+            **self.__dict__,
+            'parse_seconds': round(self.parse_seconds, 3),
+            'write_seconds': round(self.write_seconds, 3),
+            'lines_per_sec': round(self.lines / self.parse_seconds) if self.parse_seconds else 0,
+            'objects_per_sec': round(staged / self.write_seconds) if self.write_seconds else 0,
+        }
+
+
+# TODO: input validation for both Categories and URLs
+
+
+class BulkImporter:
+    """
+    Set-based import of existing DBs.
+
+    All parsed categories & URLs are collected in sets first, the current state of the DB is then loaded
+    once into hash indexes, and the new categories, URLs and mappings are calculated as set differences.
+    Every table is written with a single batched write, independent of the size of the import.
+    """
+
+    def __init__(self, db: MiddlewareDB, auth: AuthUser, category_prefix: str = ''):
+        """
+        :param db: The DBInterface to use for the DB operations
+        :param auth: The AuthUser to use for the DB operations
+        :param category_prefix: The prefix to use for the new categories
+        """
+        self._db = db
+        self._auth = auth
+        self._category_prefix = category_prefix
+        # (prefixed) category name -> hostnames of the category
+        self._categories: Dict[str, Set[str]] = {}
+        # all hostnames to import, with or without a category
+        self._hostnames: Set[str] = set()
+        self.stats = ImportStats()
+
+    def add_category(self, cat: ExistingCat):
+        urls = self._categories.setdefault(self._category_prefix + cat.name, set())
+        urls.update(cat.urls)
+        self._hostnames.update(cat.urls)
+
+    def add_urls(self, hostnames: Iterable[str]):
+        self._hostnames.update(hostnames)
+
+    def feed(self, lines: Iterable[str], allow_uncategorized: bool = False):
+        """
+        Parse an existing DB line by line, and collect its categories & URLs.
+
+        :param lines: The lines of the DB, e.g. an open file handle
+        :param allow_uncategorized: If True, uncategorized URLs will be imported as well
+        """
+        start = time.perf_counter()
+        for item in iter_db(self._count_lines(lines), allow_uncategorized):
+            if isinstance(item, ExistingCat):
+                self.add_category(item)
+            else:
+                self._hostnames.add(item)
+        self.stats.parse_seconds += time.perf_counter() - start
+
+    def _count_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        for line in lines:
+            self.stats.lines += 1
+            yield line
+
+    def apply(self, on_phase: Optional[Callable[[str], None]] = None) -> ImportStats:
+        """
+        Push everything collected so far to the DB.
+        Existing categories, URLs and mappings are only reused, never modified.
+        Since only the missing objects are written, applying an interrupted import again
+        continues after the last completed phase.
+
+        :param on_phase: Optional callback, called with the name of each completed phase ('categories', 'urls', 'mappings')
+        :return: The stats of the import
+        """
+        start = time.perf_counter()
+        self.stats.categories = len(self._categories)
+        self.stats.urls = len(self._hostnames)
+        description = f'Imported on {time.strftime("%Y-%m-%d %H:%M:%S")}'
+
+        # load the current state once, and index it by the keys used in the import
+        cat_ids_by_name: Dict[str, str] = {c.name: c.id for c in self._db.categories.get_all_categories()}
+        urls_by_hostname: Dict[str, URL] = {u.hostname: u for u in self._db.urls.get_all_urls()}
+
+        ## create all missing categories
+        # sort, so the staged changes are in a predictable order
+        missing_cats = sorted(self._categories.keys() - cat_ids_by_name.keys())
+        new_cats = self._db.categories.add_categories(self._auth, [
+            MutableCategory(name=name, color=1, description=description) for name in missing_cats
+        ])
+        cat_ids_by_name.update({c.name: c.id for c in new_cats})
+        if on_phase is not None:
+            on_phase('categories')
+
+        ## create all missing urls
+        missing_urls = sorted(self._hostnames - urls_by_hostname.keys())
+        new_urls = self._db.urls.add_urls(self._auth, [
+            MutableURL(hostname=hostname, description=description) for hostname in missing_urls
+        ])
+        urls_by_hostname.update({u.hostname: u for u in new_urls})
+        if on_phase is not None:
+            on_phase('urls')
+
+        ## create all missing cat -> url mappings
+        missing_mappings: Dict[str, List[str]] = {}
+        for cat_name, hostnames in self._categories.items():
+            cat_id = cat_ids_by_name[cat_name]
+            for hostname in hostnames:
+                url = urls_by_hostname[hostname]
+                if cat_id not in url.categories:
+                    missing_mappings.setdefault(url.id, []).append(cat_id)
+        self._db.url_categories.add_url_categories(
+            self._auth,
+            missing_mappings,
+            known_urls=list(urls_by_hostname.values()),
+        )
+        if on_phase is not None:
+            on_phase('mappings')
+
+        self.stats.new_categories = len(new_cats)
+        self.stats.new_urls = len(new_urls)
+        self.stats.new_mappings = sum(len(x) for x in missing_mappings.values())
+        self.stats.write_seconds += time.perf_counter() - start
+        log_debug('existing_db', 'imported existing db', self.stats.to_dict())
+        return self.stats
@@ -0,0 +1,74 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Dict, Any
+
+from db.dbmodel.category import Category
+from db.dbmodel.task import CleanupFlags
+from db.dbmodel.token import Token
+from db.dbmodel.url import URL
+
+
+@dataclass
+class CleanupPlan:
+    """IDs of the unused URLs & categories, which a cleanup deletes"""
+    url_ids: List[str] = field(default_factory=list)
+    category_ids: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the counts of the plan, e.g. to report them on a task or as a preview"""
+        return {
+            'urls': len(self.url_ids),
+            'categories': len(self.category_ids),
+        }
+
+
+def plan_cleanup(urls: List[URL], categories: List[Category], tokens: List[Token], flags: CleanupFlags) -> CleanupPlan:
+    """
+    Calculate which URLs & categories are unused, in a single pass over the lists.
+
+    A URL is unused, if it has no categories.
+    A category is unused, if no URL or token uses it and all of its nested categories are unused as well,
+    so removing a nested category can make its parent unused (transitively, up to the root).
+
+    :param urls: All URLs
+    :param categories: All categories
+    :param tokens: All tokens, the categories they use are never removed
+    :param flags: Which objects to clean up
+    :return: The IDs to delete, sorted so the staged changes are in a predictable order
+    """
+    plan = CleanupPlan()
+
+    if flags & CleanupFlags.URLs:
+        plan.url_ids = sorted(url.id for url in urls if len(url.categories) == 0)
+
+    if flags & CleanupFlags.Categories:
+        used_cat_ids = {cid for url in urls for cid in (url.categories or [])}
+        used_cat_ids.update(cid for token in tokens for cid in (token.categories or []))
+        known_cat_ids = {cat.id for cat in categories}
+
+        # number of remaining nested categories of each category, and the reverse mapping
+        remaining: Dict[str, int] = {}
+        parents: Dict[str, List[str]] = {}
+        for cat in categories:
+            # ignore references to categories that no longer exist
+            nested = [cid for cid in (cat.nested_categories or []) if cid in known_cat_ids]
+            remaining[cat.id] = len(nested)
+            for cid in nested:
+                parents.setdefault(cid, []).append(cat.id)
+
+        # start with the unused leafs, and walk up to the parents whose last nested category was removed
+        # categories within a cycle never reach zero, so they are always kept
+        queue = deque(cat.id for cat in categories if remaining[cat.id] == 0 and cat.id not in used_cat_ids)
+        unused = set()
+        while queue:
+            cat_id = queue.popleft()
+            if cat_id in unused:
+                continue
+            unused.add(cat_id)
+            for parent_id in parents.get(cat_id, []):
+                remaining[parent_id] -= 1
+                if remaining[parent_id] == 0 and parent_id not in used_cat_ids:
+                    queue.append(parent_id)
+        plan.category_ids = sorted(unused)
+
+    return plan
@@ -0,0 +1,25 @@
+import sys
+from typing import Iterable, Tuple, Optional
+
+
+def intern_str(value: Optional[str]) -> Optional[str]:
+    """
+    Intern a string that is repeated across many objects (e.g. a category ID),
+    so all objects share a single copy of it.
+
+    :param value: The string to intern, None is passed through
+    :return: The interned string
+    """
+    return sys.intern(value) if value is not None else None
+
+
+def intern_ids(ids: Iterable[str]) -> Tuple[str, ...]:
+    """
+    Convert a list of IDs into an immutable tuple of interned strings.
+
+    A tuple needs less memory than a list, and can be shared safely between objects and threads.
+
+    :param ids: The IDs to convert
+    :return: The interned IDs
+    """
+    return tuple(sys.intern(x) for x in ids)
@@ -6,14 +6,37 @@ Gunicorn deployment. It ensures that background tasks (such as scheduled categor
 are started only once across all worker processes, preventing duplicate task execution.
 """
 
+import glob
 import os
 from typing import Any
 
-from app import app, init_background, migrate_db
-from log import log_debug
+# the metrics of all workers are aggregated through files in this directory
+# it has to exist (and be cleared of a previous run) before the app imports prometheus_client
+METRICS_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/proxysg_metrics")
+os.makedirs(METRICS_DIR, exist_ok=True)
+for stale_file in glob.glob(os.path.join(METRICS_DIR, "*.db")):
+    os.remove(stale_file)
+
+from app import app, init_background, migrate_db, init_task_queue, preload_enabled, warm_caches, init_worker_db, \
+    server_options
+from log import log_debug, log_info
+from metrics import mark_process_dead
+from startup import StartupTimer
 
 LOCK_FILE = "/tmp/proxysg_background_initialized"
 
+# the app is always imported by the master (see above), with preload_app the master also builds the caches
+# which the workers then share copy-on-write, instead of every worker building them on its first requests
+preload_app = preload_enabled(app)
+
+# sync workers serve one request at a time, gthread workers one per thread (see APP_SERVER in the README)
+# a sync worker busy sending a response to a slow client misses its heartbeat, and is killed after the timeout
+_server_options = server_options(app)
+worker_class = _server_options['worker_class']
+workers = _server_options['workers']
+threads = _server_options['threads']
+timeout = _server_options['timeout']
+
 
 def on_starting(_server: Any):
     """
@@ -32,22 +55,34 @@ def on_starting(_server: Any):
         pass  # Lock file doesn't exist, that's fine
     log_debug("APP", "App on_starting passed first stage")
 
+    timer = StartupTimer()
     migrate_db(app)
+    timer.phase('migrate_db')
     log_debug("APP", "App on_starting passed second stage")
 
+    if preload_app:
+        warm_caches(app)
+        timer.phase('warm_caches')
+    log_info("APP", "Master startup finished", {**_server_options, **timer.summary()})
+
 
 def post_fork(_server: Any, _worker: Any):
     """
     Called after each worker process is forked from the master.
 
     Uses atomic file creation to ensure only one worker initializes
-    the application and starts background tasks. Other workers skip
-    initialization to avoid duplicate task scheduling.
+    the application and starts the scheduled background jobs. Other workers skip
+    initialization to avoid duplicate scheduling.
+    The task queue is started in every worker, since tasks are claimed atomically.
 
     @param _server: Gunicorn server instance (unused)
     @param _worker: Gunicorn worker instance (unused)
     """
     log_debug("APP", "App post_fork called")
+    timer = StartupTimer()
+    # every worker needs its own DB connection, the one of the master is never shared
+    init_worker_db(app)
+    timer.phase('db')
     try:
         # Attempt to create the lock atomically
         # if it exists, another worker already initialized
@@ -56,9 +91,26 @@ def post_fork(_server: Any, _worker: Any):
 
         # the first worker to acquire the lock starts the background scheduler
         init_background(app)
+        timer.phase('background')
     except FileExistsError:
         # Another worker has already initialized background tasks
         pass
 
+    init_task_queue(app)
+    timer.phase('task_queue')
+    log_info("APP", "Worker startup finished", {'pid': os.getpid(), **timer.summary()})
+
     # no further task needed - worker starts automatically after this
     pass
+
+
+def child_exit(_server: Any, worker: Any):
+    """
+    Called in the master process after a worker exited.
+
+    Removes the live gauges of the worker from the aggregated metrics.
+
+    @param _server: Gunicorn server instance (unused)
+    @param worker: Gunicorn worker instance that exited
+    """
+    mark_process_dead(worker.pid)
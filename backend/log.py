@@ -1,13 +1,20 @@
+import atexit
 import dataclasses
-import json
 import orjson
+import os
+import queue
 import sys
 from apiflask import APIFlask
 import logging
-from logging.handlers import SysLogHandler
+from logging import DEBUG, INFO, ERROR
+from logging.handlers import SysLogHandler, QueueHandler, QueueListener
 from loguru import logger
 from typing import Any
 
+# level of the most verbose sink, DEBUG until the logging is set up
+# messages below this level are dropped before their attachments are serialized
+_min_level = DEBUG
+
 
 # Intercept handler to redirect logs to syslog
 class InterceptHandler(logging.Handler):
@@ -20,11 +27,14 @@ class InterceptHandler(logging.Handler):
 
 
 def setup_logging(app: APIFlask):
+    global _min_level
+
     # remove all loggers
     logger.remove()
 
     # determine desired log level
     loglevel = str(app.config.get('LOGLEVEL', 'INFO')).upper()
+    _min_level = logger.level(loglevel).no
 
     # use stdout as a default sink
     # - enqueue=True writes via a background thread (non-blocking)
@@ -38,68 +48,106 @@ def setup_logging(app: APIFlask):
     logging.getLogger('pymongo').setLevel(logging.INFO)
 
     # if a syslog server is defined, also send it there
-    syslog_server = app.config.get('SYSLOG', {}).get('SYSLOG_SERVER', None)
+    syslog_cfg = app.config.get('SYSLOG', {})
+    syslog_server = syslog_cfg.get('SERVER', syslog_cfg.get('SYSLOG_SERVER', None))
     if syslog_server is not None:
-        syslog_port = int(app.config.get('SYSLOG', {}).get('SYSLOG_PORT', 514))
-        handler = SysLogHandler(address=(syslog_server, syslog_port))
-        logger.add(handler)
+        syslog_port = int(syslog_cfg.get('PORT', syslog_cfg.get('SYSLOG_PORT', 514)))
+        queue_size = int(syslog_cfg.get('QUEUE_SIZE', 10000))
+        logger.add(_start_syslog_queue(SysLogHandler(address=(syslog_server, syslog_port)), queue_size), level=loglevel)
 
 
-# custom JSON encoder to handle dataclasses and other objects that can't be serialized by default
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if dataclasses.is_dataclass(o):
-            return dataclasses.asdict(o)
-        return super().default(o)
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler with a bounded queue, that drops messages while the queue is full,
+    so the logging thread never blocks on the I/O of a slow sink.
+    """
 
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
 
-def _to_json(attachment: Any) -> str:
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _start_syslog_queue(handler: logging.Handler, queue_size: int) -> DroppingQueueHandler:
+    """
+    Move the writes of a handler to a background thread, fed by a bounded queue
+
+    :param handler: The handler doing the I/O
+    :param queue_size: Max number of queued messages, further messages are dropped
+    :return: The handler to add as sink
+    """
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    listener = QueueListener(queue_handler.queue, handler)
+    listener.start()
+
+    def restart_listener():
+        # the thread of the listener does not survive a fork, and the queue still holds its waiter,
+        # so the child starts a listener of its own, on a new queue
+        nonlocal listener
+        queue_handler.queue = queue.Queue(maxsize=queue_size)
+        listener = QueueListener(queue_handler.queue, handler)
+        listener.start()
+
+    def stop_listener():
+        listener.stop()
+
+    os.register_at_fork(after_in_child=restart_listener)
+    atexit.register(stop_listener)
+    return queue_handler
+
+
+def _json_default(o: Any) -> Any:
+    """Serialize the types orjson does not support natively (dataclasses, enums, ... are supported)"""
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if isinstance(o, BaseException):
+        return repr(o)
+    if isinstance(o, bytes):
+        return o.decode('utf-8', errors='replace')
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def _without_keys(attachment: Any, keys: tuple[str, ...]) -> Any:
+    """Get a shallow copy of an attachment without the keys, the attachment itself is not modified"""
+    if isinstance(attachment, dict):
+        return {k: v for k, v in attachment.items() if k not in keys}
+    if dataclasses.is_dataclass(attachment) and not isinstance(attachment, type):
+        return {f.name: getattr(attachment, f.name) for f in dataclasses.fields(attachment) if f.name not in keys}
+    return attachment
+
+
+def _to_json(attachment: tuple, exclude_keys: tuple[str, ...] = ()) -> str:
+    if exclude_keys:
+        attachment = tuple(_without_keys(a, exclude_keys) for a in attachment)
     # noinspection PyBroadException
     try:
-        return json.dumps(attachment, cls=EnhancedJSONEncoder)
+        return orjson.dumps(attachment, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
     except:
         return str(attachment)
 
 
-def _remove_keys_from_json(json_str: str, *keys_to_remove: str) -> str:
-    """Remove specified keys from a JSON string after serialization."""
-    if not keys_to_remove:
-        return json_str
-    try:
-        # Parse the JSON string
-        data = json.loads(json_str)
-        # Handle both single objects and lists/tuples
-        if isinstance(data, (list, tuple)):
-            for item in data:
-                if isinstance(item, dict):
-                    for key in keys_to_remove:
-                        item.pop(key, None)
-        elif isinstance(data, dict):
-            for key in keys_to_remove:
-                data.pop(key, None)
-        # Convert back to JSON string
-        return orjson.dumps(data).decode("utf-8")
-    except:
-        return json_str
-
-
 def log_debug(module: str, message: str, *attachment: Any, exclude_keys: tuple[str, ...] = ()):
-    serialized = _to_json(attachment)
-    if exclude_keys:
-        serialized = _remove_keys_from_json(serialized, *exclude_keys)
+    if _min_level > DEBUG:
+        return
+    serialized = _to_json(attachment, exclude_keys)
     # depth=1 is set so that we log the position log_debug was called and not logger.debug
     logger.opt(depth=1).debug(f'{module} | {message} | {serialized}')
 
 def log_error(module: str, message: str, *attachment: Any, exclude_keys: tuple[str, ...] = ()):
-    serialized = _to_json(attachment)
-    if exclude_keys:
-        serialized = _remove_keys_from_json(serialized, *exclude_keys)
+    if _min_level > ERROR:
+        return
+    serialized = _to_json(attachment, exclude_keys)
     # depth=1 is set so that we log the position log_debug was called and not logger.debug
     logger.opt(depth=1).error(f'{module} | {message} | {serialized}')
 
 def log_info(module: str, message: str, *attachment: Any, exclude_keys: tuple[str, ...] = ()):
-    serialized = _to_json(attachment)
-    if exclude_keys:
-        serialized = _remove_keys_from_json(serialized, *exclude_keys)
+    if _min_level > INFO:
+        return
+    serialized = _to_json(attachment, exclude_keys)
     # depth=1 is set so that we log the position log_debug was called and not logger.debug
     logger.opt(depth=1).info(f'{module} | {message} | {serialized}')
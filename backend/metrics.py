@@ -0,0 +1,141 @@
+import os
+import time
+from functools import wraps
+from typing import Callable, Any
+
+from apiflask import APIFlask
+from flask import request, g
+from prometheus_client import Histogram, Counter, Gauge, CollectorRegistry, REGISTRY, generate_latest, multiprocess
+
+# set by gunicorn_config.py, the metrics of all workers are then aggregated through files in this directory
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'proxysg_http_request_duration_seconds',
+    'Latency of the HTTP requests, by route',
+    ['method', 'route', 'status'],
+)
+DB_CALL_SECONDS = Histogram(
+    'proxysg_db_call_duration_seconds',
+    'Latency of the calls to the DB backend, by table and method',
+    ['backend', 'table', 'method'],
+)
+COMPILE_SECONDS = Histogram(
+    'proxysg_compile_duration_seconds',
+    'Duration of compiling the categories of a token',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+COMPILE_BYTES = Histogram(
+    'proxysg_compile_size_bytes',
+    'Size of the compiled categories of a token',
+    buckets=(1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8),
+)
+BC_QUERY_SECONDS = Histogram(
+    'proxysg_bc_query_duration_seconds',
+    'Latency of the requests to the BlueCoat appliance',
+)
+BC_QUERIES = Counter(
+    'proxysg_bc_queries',
+    'Queries of BlueCoat categories, by result (success, error, rejected by the circuit breaker)',
+    ['result'],
+)
+# gauges are set by the worker that changed the value, so the most recent value of any worker is the current one
+TASK_QUEUE_DEPTH = Gauge(
+    'proxysg_task_queue_depth',
+    'Number of pending tasks',
+    multiprocess_mode='mostrecent',
+)
+STAGED_CHANGES = Gauge(
+    'proxysg_staged_changes',
+    'Number of staged changes, that are not yet committed',
+    multiprocess_mode='mostrecent',
+)
+
+
+# the DB methods whose latency is recorded, by table
+# (e.g. the blocking wait for new tasks would only distort the histograms)
+INSTRUMENTED_DB_METHODS = {
+    'categories': ('add_category', 'get_category', 'update_category', 'delete_category', 'get_all_categories'),
+    'sub_categories': ('get_sub_categories_by_id', 'add_sub_category', 'delete_sub_category'),
+    'history': ('add_history_event', 'get_history_events'),
+    'tokens': (
+        'add_token', 'get_token', 'get_token_by_uuid', 'update_token', 'update_usage', 'roll_token', 'delete_token',
+        'get_all_tokens',
+    ),
+    'token_categories': ('get_token_categories_by_token', 'add_token_category', 'delete_token_category'),
+    'urls': (
+        'add_url', 'get_url', 'update_url', 'delete_url', 'get_all_urls', 'get_all_bc_cats', 'set_bc_cats_many',
+        'set_bc_next_due', 'get_bc_due_urls',
+    ),
+    'url_categories': ('get_url_categories_by_url', 'add_url_category', 'delete_url_category'),
+    'tasks': (
+        'add_task', 'get_task', 'update_task_status', 'update_task_stats', 'update_task_progress', 'get_all_tasks',
+        'count_pending_tasks', 'claim_task', 'renew_task_lease',
+    ),
+    'staging': (
+        'store_staged_change', 'store_staged_changes', 'get_staged_changes', 'get_staged_changes_by_table',
+        'get_staged_changes_by_table_and_id', 'count_staged_changes', 'clear_staged_changes',
+    ),
+}
+
+
+def metrics_enabled(app: APIFlask) -> bool:
+    return str(app.config.get('METRICS', {}).get('ENABLED', 'true')).lower() != 'false'
+
+
+def _timed(histogram: Histogram, fn: Callable) -> Callable:
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def instrument_db(db: Any, backend: str):
+    """
+    Time the methods of the tables of a DB backend, listed in INSTRUMENTED_DB_METHODS.
+
+    The methods are wrapped on the instances, the classes are not modified.
+
+    :param db: The DBInterface of the backend
+    :param backend: Name of the backend, used as label
+    """
+    for table, methods in INSTRUMENTED_DB_METHODS.items():
+        table_if = getattr(db, table)
+        for name in methods:
+            method = getattr(table_if, name)
+            setattr(table_if, name, _timed(DB_CALL_SECONDS.labels(backend, table, name), method))
+
+
+def init_request_metrics(app: APIFlask):
+    """Record the latency of every request, by the route rule (not the path, to keep the number of labels bounded)"""
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(time.perf_counter() - start)
+        return response
+
+
+def render_metrics() -> bytes:
+    """Render the metrics in the Prometheus text format, aggregated over all workers if running in gunicorn"""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead(pid: int):
+    """Remove the live gauges of a stopped worker"""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        multiprocess.mark_process_dead(pid)
@@ -5,6 +5,8 @@ from db.db_singleton import get_db
 from auth.auth_singleton import get_auth_if
 from db.dbmodel.category import MutableCategory
 from log import log_debug
+from routes.util.etag import conditional_get
+from routes.util.fast_json import fast_json
 from routes.schemas.generic_output import GenericOutput
 from routes.schemas.category import ListCategoriesResponseOutput, CreateOrUpdateCategoryOutput, ListSubCategoriesOutput, SetSubCategoriesInput
 
@@ -20,14 +22,15 @@ def add_category_bp(app: APIFlask):
     @category_bp.doc(summary='List all Categories', description='List all Categories in the database')
     @category_bp.output(ListCategoriesResponseOutput)
     @category_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RO])
+    @conditional_get(lambda: get_db().get_revision('category'))
     def get_categories():
         db_if = get_db()
         categories = db_if.categories.get_all_categories()
-        return {
+        return fast_json({
             'status': 'success',
             'message': 'Categories fetched successfully',
             'data': categories,
-        }
+        })
 
     # Route to update Category name
     @category_bp.put('/api/category/<string:cat_id>')
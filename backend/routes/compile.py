@@ -1,68 +1,11 @@
+import time
 from datetime import datetime
 from apiflask import APIBlueprint
 
 from db.db_singleton import get_db
-from db.dbmodel.category import Category
 from log import log_debug
-
-
-def find_subcategories(
-    current_cat: Category,
-    categories_dict: dict[str, Category],
-    visited: set[str],
-    result: list[Category]
-):
-    """
-    This method is used to recursively traverse the nested categories.
-    All categories that are in some form a subcategory of the provided current_cat will be added to the result list.
-
-    :param current_cat: The current category to start the traversal from
-    :param categories_dict: A mapping of category IDs to category objects
-    :param visited: A set to track already visited categories
-    :param result: A list to store all subcategories found so far
-    """
-    for nested_id in current_cat.nested_categories:
-        # resolve category id to category in the lookup table
-        nested_cat = categories_dict.get(nested_id)
-
-        # make sure we could look up the nested category
-        if not nested_cat:
-            continue
-
-        # make sure we did not yet visit the nested category,
-        # this should prevent infinite loops with circular nested categories
-        if nested_cat.id in visited:
-            continue
-
-        # store cat in the visited and the result list
-        visited.add(nested_cat.id)
-        result.append(nested_cat)
-
-        # call recursively for the nested cat
-        find_subcategories(nested_cat, categories_dict, visited, result)
-
-def calc_sub_cats(cat: Category, categories: list[Category]) -> list[Category]:
-    """
-    This method calculates all subcategories for the provided category.
-    It's a wrapper around the find_subcategories method,
-    which provides all variables for the initial call of the recursive func.
-
-    :param cat: The category to calculate subcategories for
-    :param categories: A list of all categories in the database
-    :return: A list of all subcategories for the provided category
-    """
-    # Create a mapping of category IDs to category objects for a quick lookup
-    categories_dict = {category.id: category for category in categories}
-
-    # List to store the subcategories
-    result = []
-    # Set to track already visited categories
-    visited = set()
-
-    # Start recursive traversal
-    find_subcategories(cat, categories_dict, visited, result)
-
-    return result
+from metrics import COMPILE_SECONDS, COMPILE_BYTES
+from routes.util.category_index import get_category_index
 
 
 def add_compile_bp(app):
@@ -72,6 +15,7 @@ def add_compile_bp(app):
     @compile_bp.get('/api/compile/<string:token_uuid>')
     @compile_bp.doc(summary='Compile Categories', description='Compile Categories for the provided Token')
     def handle_compile(token_uuid: str):
+        start = time.perf_counter()
         db_if = get_db()
         token = db_if.tokens.get_token_by_uuid(token_uuid)
         if not token:
@@ -83,44 +27,20 @@ def add_compile_bp(app):
 
         db_if.tokens.update_usage(token.id)
 
-        # load all categories that are part of the token
-        categories = db_if.categories.get_all_categories(bypass_cache=True)
-        token_cats = [cat for cat in categories if cat.id in token.categories]
-
-        # fetch all URLs
-        urls = db_if.urls.get_all_urls(bypass_cache=True)
+        # the committed URLs & categories, with the blocks of all categories compiled before
+        index = get_category_index(db_if, committed=True)
+        token_cat_ids = set(token.categories)
+        token_cats = [cat for cat in index.categories if cat.id in token_cat_ids]
 
         # use response var to track the returned database string
         response = ''
         # write a header with some generic info
         response += '; Generated Categorisation File\n'
         response += f'; Generated on {datetime.now()}\n\n'
+        response += ''.join(index.compile_category(cat) for cat in token_cats)
 
-        for cat in token_cats:
-            # calculate subcategories (excluding the 'root' cat itself)
-            sub_cats = calc_sub_cats(cat, categories)
-
-            # header for the category
-            response += f'; Category: {cat.name}\n'
-            response += f'; Description: {cat.description}\n'
-            response += f'; Sub-Categories: {", ".join([c.name for c in sub_cats])}\n'
-            response += f'define category "{cat.name}"\n'
-
-            # fill in URLs that are part of the category
-            for url in urls:
-                if cat.id in url.categories:
-                    response += f'  {url.hostname}\n'
-                else:
-                    # check if any of the sub-cats includes the url
-                    for sub_cat in sub_cats:
-                        if sub_cat.id in url.categories:
-                            response += f'  {url.hostname} ; from sub-cat {sub_cat.name}\n'
-                            break
-
-            # end of category
-            response += f'  ; end of {cat.name}\n'
-            response += 'end category\n\n'
-
+        COMPILE_SECONDS.observe(time.perf_counter() - start)
+        COMPILE_BYTES.observe(len(response))
         return (
             response,
             200,
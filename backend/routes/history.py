@@ -3,6 +3,8 @@ from apiflask import APIBlueprint, APIFlask
 from auth.auth_singleton import get_auth_if
 from db.db_singleton import get_db
 from log import log_debug
+from routes.util.etag import conditional_get
+from routes.util.fast_json import fast_json
 from routes.schemas.history import ListHistoryOutput
 
 
@@ -16,13 +18,14 @@ def add_history_bp(app: APIFlask):
     @history_bp.doc(summary='List Change History', description='List all Changes done to the Database')
     @history_bp.output(ListHistoryOutput)
     @history_bp.auth_required(auth_if.get_auth(), roles=[auth_if.AUTH_ROLES_RO])
+    @conditional_get(lambda: get_db().get_revision('history'))
     def get_categories():
         db_if = get_db()
         histories = db_if.history.get_history_events()
-        return {
+        return fast_json({
             'status': 'success',
             'message': 'History fetched successfully',
             'data': [x.to_rest() for x in histories],
-        }
+        })
 
     app.register_blueprint(history_bp)
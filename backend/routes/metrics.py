@@ -0,0 +1,67 @@
+import hmac
+import threading
+
+from apiflask import APIBlueprint, abort
+from flask import request
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from auth.auth import AUTH_TOKEN_KEY
+from auth.auth_singleton import get_auth_if
+from db.db_singleton import get_db
+from log import log_debug, log_error
+from metrics import render_metrics, init_request_metrics, metrics_enabled
+
+# the gauges of the DB are set by every write, each worker only reads them once
+_db_gauges_lock = threading.Lock()
+_db_gauges_set = False
+
+
+def _set_db_gauges():
+    global _db_gauges_set
+    with _db_gauges_lock:
+        if _db_gauges_set:
+            return
+        try:
+            get_db().update_metrics()
+            _db_gauges_set = True
+        except Exception as e:
+            # still deliver the other metrics, and try again on the next scrape
+            log_error('ROUTES', 'Failed to read the metrics of the DB', {'error': str(e)})
+
+
+def add_metrics_bp(app):
+    if not metrics_enabled(app):
+        log_debug('ROUTES', 'Metrics are disabled')
+        return
+    log_debug('ROUTES', 'Adding Metrics Blueprint')
+    init_request_metrics(app)
+    auth_if = get_auth_if(app)
+    scrape_token = app.config.get('METRICS', {}).get('TOKEN', '')
+    metrics_bp = APIBlueprint('metrics', __name__)
+
+    def is_authorized() -> bool:
+        """Check for the token of the scraper, or the token of a user with (at least) the ro role"""
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scrape_token and scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), scrape_token.encode()):
+            return True
+        user_token = request.headers.get(AUTH_TOKEN_KEY)
+        if not user_token:
+            return False
+        user = auth_if.verify_token(user_token)
+        return user is not None and auth_if.AUTH_ROLES_RO in user.roles
+
+    # Route for the Prometheus scraper
+    @metrics_bp.get('/metrics')
+    @metrics_bp.doc(summary='Metrics', description='Metrics of all workers in the Prometheus text format')
+    def handle_metrics():
+        if not is_authorized():
+            abort(401, 'Metrics require the APP_METRICS__TOKEN as bearer token, or a user token')
+
+        _set_db_gauges()
+        return (
+            render_metrics(),
+            200,
+            {'Content-Type': CONTENT_TYPE_LATEST},
+        )
+
+    app.register_blueprint(metrics_bp)
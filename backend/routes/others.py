@@ -4,9 +4,9 @@ from auth.auth_singleton import get_auth_if
 from db.db_singleton import get_db
 from db.dbmodel.url import FAILED_LOOKUP
 from log import log_debug
-from background.query_bc import do_query
-from background.background_tasks import get_bc_credentials
+from background.background_tasks import get_bc_client
 from routes.schemas.other import TestURIOutput
+from routes.util.category_index import get_category_index
 
 
 def add_others_bp(app):
@@ -25,28 +25,14 @@ def add_others_bp(app):
         # 1) Normalize input to a hostname
         hostname = value.strip().lower()
 
-        # 2) Fetch all URLs and select the best match by comparing the longest suffix that matched
-        urls = db_if.urls.get_all_urls()
-        best_url = None
-        best_len = -1
-        for u in urls:
-            if hostname == u.hostname:
-                # perfect match, so stop the search
-                best_url = u
-                break
-            if hostname.endswith('.' + u.hostname):
-                # we've found part of the hostname
-                score = len(u.hostname)
-                # only save if this is the best we've found
-                if score > best_len:
-                    best_len = score
-                    best_url = u
-
-        # 3) Fetch all categories and map matched URL categories
+        # 2) Select the best match, by the longest suffix of the hostname that matches a URL
+        index = get_category_index(db_if)
+        best_url = index.match_hostname(hostname)
+
+        # 3) Map matched URL categories, including the nested ones
         matching_categories = []
         if best_url is not None:
-            all_categories = db_if.categories.get_all_categories()
-            categories_by_id = {c.id: c for c in all_categories}
+            categories_by_id = index.categories_by_id
 
             # initial list of IDs
             seed_ids = list(best_url.categories or [])
@@ -75,10 +61,9 @@ def add_others_bp(app):
                         stack.append(nested_id)
 
         # 4) Query BlueCoat category for the provided hostname
-        credentials = get_bc_credentials(app)
         bc_categories = [FAILED_LOOKUP]
         try:
-            bc_categories = do_query(credentials, hostname)
+            bc_categories = get_bc_client(app).query(hostname)
         except Exception:
             # keep FAILED_LOOKUP on any unexpected error
             pass
@@ -0,0 +1,119 @@
+import os
+
+from apiflask import APIBlueprint, APIFlask, abort
+from flask import send_file
+from marshmallow_dataclass import class_schema
+
+from auth.auth_singleton import get_auth_if
+from log import log_debug, log_info
+from routes.schemas.generic_output import GenericOutput
+from routes.schemas.profiling import ProfilingInput, ProfilingStatusOutput, ProfileQuery
+from routes.util.profiler import RequestProfiler
+
+
+def get_profiler(app: APIFlask) -> RequestProfiler:
+    """
+    Get the Request Profiler as a singleton
+    """
+    with app.app_context():
+        profiler = app.config.get('SINGLETONS', {}).get('PROFILER', None)
+
+        if profiler is None:
+            profiling_cfg = app.config.get('PROFILING', {})
+            profiler = RequestProfiler(
+                profiling_cfg.get('PATH', './data/profiles'),
+                max_profiles=int(profiling_cfg.get('MAX', 200)),
+            )
+            app.config.setdefault('SINGLETONS', {})
+            app.config['SINGLETONS']['PROFILER'] = profiler
+
+        return profiler
+
+
+def add_profiling_bp(app: APIFlask):
+    log_debug('ROUTES', 'Adding Profiling Blueprint')
+    auth_if = get_auth_if(app)
+    auth = auth_if.get_auth()
+    profiler = get_profiler(app)
+    profiling_bp = APIBlueprint('profiling', __name__)
+
+    def _status(session):
+        return {
+            'status': 'success',
+            'message': 'Profiling is active' if session else 'Profiling is inactive',
+            'data': {
+                'active': session is not None,
+                'session': session,
+                'profiles': profiler.list_profiles(),
+            },
+        }
+
+    # Route to get the state of the profiler & the stored profiles
+    @profiling_bp.get('/api/profiling')
+    @profiling_bp.doc(summary='Profiling Status', description='Get the active profiling session and the stored profiles')
+    @profiling_bp.output(ProfilingStatusOutput)
+    @profiling_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RW])
+    def get_profiling():
+        return _status(profiler.current_session())
+
+    # Route to start profiling requests
+    @profiling_bp.post('/api/profiling')
+    @profiling_bp.doc(
+        summary='Start Profiling',
+        description='Profile the next requests of all workers with cProfile, optionally only those matching a route pattern',
+    )
+    @profiling_bp.input(class_schema(ProfilingInput)(), location='json', arg_name='settings')
+    @profiling_bp.output(ProfilingStatusOutput)
+    @profiling_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RW])
+    def start_profiling(settings: ProfilingInput):
+        try:
+            session = profiler.start(settings.requests, settings.route, settings.duration)
+        except ValueError as e:
+            abort(400, str(e))
+        log_info('API', 'Started profiling', {'user': auth.current_user.username, 'session': session})
+        # the written session, other workers pick it up within their check interval
+        return _status(session)
+
+    # Route to stop profiling requests
+    @profiling_bp.delete('/api/profiling')
+    @profiling_bp.doc(summary='Stop Profiling', description='Stop the active profiling session, the stored profiles are kept')
+    @profiling_bp.output(ProfilingStatusOutput)
+    @profiling_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RW])
+    def stop_profiling():
+        profiler.stop()
+        log_info('API', 'Stopped profiling', {'user': auth.current_user.username})
+        return _status(None)
+
+    # Route to download a profile
+    @profiling_bp.get('/api/profiling/profiles/<string:session_id>/<string:name>')
+    @profiling_bp.doc(
+        summary='Download Profile',
+        description='Download a profile as .prof file (e.g. for snakeviz), or as text summary with ?format=text',
+    )
+    @profiling_bp.input(ProfileQuery, location='query', arg_name='query')
+    @profiling_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RW])
+    def get_profile(session_id: str, name: str, query: dict):
+        path = profiler.profile_path(session_id, name)
+        if path is None:
+            abort(404, 'Profile not found')
+        if query['format'] == 'text':
+            return (
+                profiler.summarize(path),
+                200,
+                {'Content-Type': 'text/plain'},
+            )
+        return send_file(os.path.abspath(path), mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
+    # Route to delete all profiles
+    @profiling_bp.delete('/api/profiling/profiles')
+    @profiling_bp.doc(summary='Delete Profiles', description='Delete all stored profiles')
+    @profiling_bp.output(GenericOutput)
+    @profiling_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RW])
+    def delete_profiles():
+        profiler.clear()
+        return {
+            'status': 'success',
+            'message': 'Profiles deleted successfully',
+        }
+
+    app.register_blueprint(profiling_bp)
@@ -1,4 +1,5 @@
 from dataclasses import field, dataclass
+from typing import Dict, Any
 from marshmallow.validate import Length
 
 from db.util.validators import simpleNameValidator
@@ -43,3 +44,27 @@ class RESTTask:
             'description': 'Timestamp when the task was last updated',
         }
     )
+    stats: Dict[str, Any] = field(
+        default_factory=dict,
+        metadata={
+            'description': 'Statistics reported by the task, e.g. the throughput of an import',
+        }
+    )
+    progress: int = field(
+        default=0,
+        metadata={
+            'description': 'Units of work the task has done so far',
+        }
+    )
+    progress_total: int = field(
+        default=0,
+        metadata={
+            'description': 'Units of work the task has planned, 0 if not known (yet)',
+        }
+    )
+    checkpoint: Dict[str, Any] = field(
+        default_factory=dict,
+        metadata={
+            'description': 'State the task resumes from, if it was interrupted',
+        }
+    )
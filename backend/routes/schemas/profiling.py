@@ -0,0 +1,72 @@
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+from apiflask import Schema
+from apiflask.fields import Nested, List, String, Integer, Boolean
+from marshmallow import ValidationError
+from marshmallow.validate import Range, OneOf
+
+from routes.schemas.generic_output import GenericOutput
+
+
+def validate_route_pattern(route: str):
+    """Reject route patterns that are no valid regex"""
+    try:
+        re.compile(route)
+    except re.error as e:
+        raise ValidationError(f'Invalid route pattern: {e}')
+
+
+@dataclass(kw_only=True)
+class ProfilingInput:
+    """Class representing the settings of a new profiling session"""
+    requests: int = field(default=10, metadata={
+        'validate': Range(min=0),
+        'description': 'Number of requests to profile (in all workers), 0 for all requests until the session expires',
+    })
+    route: Optional[str] = field(default=None, metadata={
+        'validate': validate_route_pattern,
+        'description': 'Only profile requests whose path matches this regex, e.g. \'^/api/url\'',
+    })
+    duration: int = field(default=600, metadata={
+        'validate': Range(min=1, max=24 * 60 * 60),
+        'description': 'Seconds until the session expires',
+    })
+
+
+class ProfileQuery(Schema):
+    """Query parameters to download a profile"""
+    format = String(
+        load_default='prof',
+        validate=OneOf(['prof', 'text']),
+        metadata={'description': '\'prof\' for the cProfile file, \'text\' for a summary of the slowest functions'},
+    )
+
+
+class ProfilingSession(Schema):
+    """Class representing the active profiling session"""
+    id = String(required=True, metadata={'description': 'ID of the session, the profiles are grouped by it'})
+    remaining = Integer(allow_none=True, metadata={'description': 'Number of requests left to profile, empty if unlimited'})
+    route = String(allow_none=True, metadata={'description': 'Regex of the profiled paths, empty for all paths'})
+    until = Integer(required=True, metadata={'description': 'Timestamp the session expires at'})
+
+
+class ProfileFile(Schema):
+    """Class representing a stored profile of a single request"""
+    session = String(required=True, metadata={'description': 'ID of the session'})
+    name = String(required=True, metadata={'description': 'File name, includes the time, method, path & duration of the request'})
+    size = Integer(required=True, metadata={'description': 'Size in bytes'})
+    created = Integer(required=True, metadata={'description': 'Timestamp the profile was stored'})
+
+
+class ProfilingStatus(Schema):
+    """Class representing the state of the profiler"""
+    active = Boolean(required=True, metadata={'description': 'True if requests are being profiled'})
+    session = Nested(ProfilingSession, allow_none=True, metadata={'description': 'The active session'})
+    profiles = List(Nested(ProfileFile), required=True, metadata={'description': 'The stored profiles, oldest first'})
+
+
+class ProfilingStatusOutput(GenericOutput):
+    """Class representing the state of the profiler"""
+    data = Nested(ProfilingStatus, required=True, description='State of the profiler')
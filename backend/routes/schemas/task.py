@@ -1,4 +1,5 @@
-from apiflask.fields import Nested, List, String, Integer
+from apiflask import Schema
+from apiflask.fields import Nested, List, String, Integer, File
 from marshmallow.validate import Length
 from marshmallow_dataclass import class_schema
 from dataclasses import dataclass
@@ -49,10 +50,59 @@ class ExistingDBInput:
     )
 
 
+class ExistingDBFileInput(Schema):
+    """Class representing an existing DB File, uploaded as multipart/form-data"""
+    categoryDB = File(
+        required=True,
+        metadata={'description': 'The existing category DB file'},
+    )
+    prefix = String(
+        required=True,
+        validate=Length(min=1),
+        metadata={'description': 'Prefix of the existing category DB'},
+    )
+
+
+class ExistingDBFilesInput(Schema):
+    """Class representing multiple existing DB Files (or zip archives of them), uploaded as multipart/form-data"""
+    categoryDBs = List(
+        File(),
+        required=True,
+        validate=Length(min=1),
+        metadata={'description': 'The existing category DB files, or zip archives containing them'},
+    )
+    prefix = String(
+        required=True,
+        validate=Length(min=1),
+        metadata={'description': 'Prefix for the categories of all imported DBs'},
+    )
+
+
 @dataclass
 class CleanupInput:
     """Class representing the input for the cleanup endpoint"""
     flags: int = Integer(
         required=True,
         metadata={'description': 'Flags choosing which cleanup tasks to run'},
-    )
\ No newline at end of file
+    )
+
+
+class CleanupPreview(Schema):
+    """Class representing the number of objects a cleanup would delete"""
+    urls = Integer(
+        required=True,
+        metadata={'description': 'Number of unused URLs'},
+    )
+    categories = Integer(
+        required=True,
+        metadata={'description': 'Number of unused categories, including the transitively unused nested ones'},
+    )
+
+
+class CleanupPreviewOutput(GenericOutput):
+    """Class representing the dry-run of a cleanup"""
+    data = Nested(
+        CleanupPreview,
+        required=True,
+        description='Number of objects the cleanup would delete',
+    )
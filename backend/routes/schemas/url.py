@@ -1,11 +1,16 @@
-from apiflask.fields import List, Nested
+from apiflask.fields import List, Nested, Integer
 from marshmallow.fields import String
+from marshmallow.validate import Range, OneOf
 from marshmallow_dataclass import class_schema
-from typing import List as tList
+from typing import List as tList, Optional
 from dataclasses import field, dataclass
 
 from db.dbmodel.url import URL
 from routes.schemas.generic_output import GenericOutput
+from routes.util.url_view import URL_SORT_FIELDS
+
+# max number of URLs returned in a single page
+MAX_PAGE_SIZE = 1000
 
 
 @dataclass
@@ -19,9 +24,34 @@ class CreateOrUpdateURLOutput(GenericOutput):
     data: URL = Nested(class_schema(URL)(), required=True, description='URL')
 
 
+@dataclass
+class ListURLQuery:
+    """Query parameters to paginate, sort and search the list of URLs"""
+    limit: Optional[int] = field(default=None, metadata={
+        'validate': Range(min=1, max=MAX_PAGE_SIZE),
+        'description': 'Max number of URLs to return, enables pagination. Without limit, cursor, sort and search all URLs are returned',
+    })
+    cursor: Optional[str] = field(default=None, metadata={
+        'description': 'Cursor of the next page, as returned by the previous page',
+    })
+    sort: Optional[str] = field(default=None, metadata={
+        'validate': OneOf([x for f in URL_SORT_FIELDS.keys() for x in (f, '-' + f)]),
+        'description': 'Field to sort by, prefix with "-" to sort descending (default: hostname)',
+    })
+    search: Optional[str] = field(default=None, metadata={
+        'description': 'Search query, using the same syntax as the search in the UI',
+    })
+
+
 class ListURLOutput(GenericOutput):
     """Output schema for a list of URL"""
     data: tList[URL] = List(Nested(class_schema(URL)()), required=True, description='List of URLs')
+    next_cursor: Optional[str] = String(required=False, allow_none=True, metadata={
+        'description': 'Cursor of the next page, empty on the last page (only for paginated requests)',
+    })
+    total: Optional[int] = Integer(required=False, metadata={
+        'description': 'Number of URLs matching the search (only for paginated requests)',
+    })
 
 
 class ListURLCategoriesOutput(GenericOutput):
@@ -1,14 +1,21 @@
+import io
 import time
 
 from apiflask import APIBlueprint
+from flask import current_app
 from marshmallow_dataclass import class_schema
 
 from auth.auth_singleton import get_auth_if
+from background.background_tasks import get_upload_dir
+from background.uploads import save_upload
 from db.db_singleton import get_db
-from db.dbmodel.task import MutableTask
+from db.dbmodel.task import MutableTask, CleanupFlags
+from db.util.cleanup import plan_cleanup
 from log import log_debug
+from routes.util.etag import conditional_get
 from routes.schemas.commit import CommitInput
-from routes.schemas.task import ExistingDBInput, ListTaskOutput, CreatedTaskOutput, SingleTaskOutput, CleanupInput
+from routes.schemas.task import ExistingDBInput, ExistingDBFileInput, ExistingDBFilesInput, ListTaskOutput, CreatedTaskOutput, SingleTaskOutput, CleanupInput, \
+    CleanupPreviewOutput
 
 
 def add_task_bp(app):
@@ -24,12 +31,58 @@ def add_task_bp(app):
     @task_bp.output(CreatedTaskOutput)
     @task_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RW])
     def load_existing(existing_db: ExistingDBInput):
+        # store the database as an upload, so the task only has to reference it
+        upload_id = save_upload(get_upload_dir(current_app), io.BytesIO(existing_db.categoryDB.encode('utf-8')))
+        return _create_load_existing_task(upload_id, existing_db.prefix)
+
+    # Route to upload an existing category db as a file
+    @task_bp.post('/api/task/new/upload_existing_db_file')
+    @task_bp.doc(
+        summary='Upload existing DB File',
+        description='Upload an existing database to the server as multipart/form-data, preferred for large databases',
+    )
+    @task_bp.input(ExistingDBFileInput, location='form_and_files', arg_name='existing_db')
+    @task_bp.output(CreatedTaskOutput)
+    @task_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RW])
+    def load_existing_file(existing_db: dict):
+        # the uploaded file is spooled to disk by werkzeug, copy it over to the upload directory in chunks
+        upload_id = save_upload(get_upload_dir(current_app), existing_db['categoryDB'].stream)
+        return _create_load_existing_task(upload_id, existing_db['prefix'])
+
+    # Route to upload multiple existing category dbs, and merge them in a single import
+    @task_bp.post('/api/task/new/upload_existing_dbs')
+    @task_bp.doc(
+        summary='Upload multiple existing DBs',
+        description='Upload multiple existing databases (or zip archives of them) as multipart/form-data, '
+                    'they are parsed in parallel and merged into a single import',
+    )
+    @task_bp.input(ExistingDBFilesInput, location='form_and_files', arg_name='existing_dbs')
+    @task_bp.output(CreatedTaskOutput)
+    @task_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RW])
+    def load_existing_files(existing_dbs: dict):
+        upload_dir = get_upload_dir(current_app)
+        upload_ids = [save_upload(upload_dir, f.stream) for f in existing_dbs['categoryDBs']]
+
+        # Create a background task to process the databases
+        task = get_db().tasks.add_task(auth.current_user, MutableTask(
+            name='load_existing_files',
+            parameters=['load_existing_files', existing_dbs['prefix'], *upload_ids]
+        ))
+        log_debug('API', f'Created load_existing_files task {task.id}')
+
+        return {
+            'status': 'success',
+            'message': 'Database import task created successfully',
+            'data': task.id,
+        }
+
+    def _create_load_existing_task(upload_id: str, prefix: str):
         # Create a background task to process the database
         task = get_db().tasks.add_task(auth.current_user, MutableTask(
-            name='load_existing',
-            parameters=['load_existing', existing_db.categoryDB, existing_db.prefix]
+            name='load_existing_file',
+            parameters=['load_existing_file', upload_id, prefix]
         ))
-        log_debug('API', f'Created load_existing task {task.id}')
+        log_debug('API', f'Created load_existing_file task {task.id}')
 
         return {
             'status': 'success',
@@ -57,6 +110,27 @@ def add_task_bp(app):
             'data': task.id,
         }
 
+    # Route to preview a cleanup of unused URLs / Categories
+    @task_bp.post('/api/task/preview/cleanup_unused')
+    @task_bp.doc(summary='Preview Cleanup Unused', description='Count the objects a cleanup would delete, without deleting them')
+    @task_bp.input(class_schema(CleanupInput)(), location='json', arg_name='cleanup_settings')
+    @task_bp.output(CleanupPreviewOutput)
+    @task_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RO])
+    def preview_cleanup_unused(cleanup_settings: CleanupInput):
+        db_if = get_db()
+        plan = plan_cleanup(
+            db_if.urls.get_all_urls(),
+            db_if.categories.get_all_categories(),
+            db_if.tokens.get_all_tokens(),
+            CleanupFlags(cleanup_settings.flags),
+        )
+
+        return {
+            'status': 'success',
+            'message': 'Cleanup-Unused preview created successfully',
+            'data': plan.to_dict(),
+        }
+
     # Route to revert any not-commited changes
     @task_bp.post('/api/task/new/revert')
     @task_bp.doc(summary='Revert Changes', description='Revert any not-commited changes')
@@ -81,6 +155,7 @@ def add_task_bp(app):
     @task_bp.doc(summary='Get all tasks', description='Get a list of all tasks and their status')
     @task_bp.output(ListTaskOutput)
     @task_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RO])
+    @conditional_get(lambda: get_db().get_revision('task'))
     def get_tasks():
         tasks = get_db().tasks.get_all_tasks()
         return {
@@ -5,6 +5,8 @@ from auth.auth_singleton import get_auth_if
 from db.db_singleton import get_db
 from db.dbmodel.token import MutableToken
 from log import log_debug
+from routes.util.etag import conditional_get
+from routes.util.fast_json import fast_json
 from routes.schemas.generic_output import GenericOutput
 from routes.schemas.token import ListTokenOutput, CreateOrUpdateTokenOutput, ListTokenCategoriesOutput, SetTokenCategoriesInput
 
@@ -20,13 +22,14 @@ def add_token_bp(app: APIFlask):
     @token_bp.doc(summary='List all Tokens', description='List all Tokens in the database')
     @token_bp.output(ListTokenOutput)
     @token_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RO])
+    @conditional_get(lambda: get_db().get_revision('token'))
     def get_tokens():
         tokens = get_db().tokens.get_all_tokens()
-        return {
+        return fast_json({
             'status': 'success',
             'message': 'Tokens fetched successfully',
             'data': tokens,
-        }
+        })
 
     # Route to update Token name
     @token_bp.put('/api/token/<string:token_id>')
@@ -1,12 +1,16 @@
-from apiflask import APIBlueprint, APIFlask
+from apiflask import APIBlueprint, APIFlask, abort
 from marshmallow_dataclass import class_schema
 
 from auth.auth_singleton import get_auth_if
 from db.dbmodel.url import MutableURL
 from db.db_singleton import get_db
 from log import log_debug
+from routes.util.etag import conditional_get
+from routes.util.fast_json import fast_json
+from routes.util.url_view import get_url_view
 from routes.schemas.generic_output import GenericOutput
-from routes.schemas.url import ListURLOutput, CreateOrUpdateURLOutput, ListURLCategoriesOutput, SetURLCategoriesInput
+from routes.schemas.url import ListURLOutput, CreateOrUpdateURLOutput, ListURLCategoriesOutput, SetURLCategoriesInput, \
+    ListURLQuery, MAX_PAGE_SIZE
 
 
 def add_url_bp(app: APIFlask):
@@ -17,16 +21,43 @@ def add_url_bp(app: APIFlask):
 
     # Route to fetch all URLs
     @url_bp.get('/api/url')
-    @url_bp.doc(summary='List all URLs', description='List all URLs in the database')
+    @url_bp.doc(summary='List all URLs', description='List all URLs in the database, optionally searched, sorted and paginated')
+    @url_bp.input(class_schema(ListURLQuery)(), location='query', arg_name='query')
     @url_bp.output(ListURLOutput)
     @url_bp.auth_required(auth, roles=[auth_if.AUTH_ROLES_RO])
-    def get_urls():
-        urls = get_db().urls.get_all_urls()
-        return {
+    @conditional_get(lambda: f"{get_db().get_revision('url')}/{get_db().get_revision('bc')}")
+    def get_urls(query: ListURLQuery):
+        db_if = get_db()
+
+        if query.limit is None and query.cursor is None and query.sort is None and query.search is None:
+            # no pagination requested, keep returning the full list
+            urls = db_if.urls.get_all_urls()
+            return fast_json({
+                'status': 'success',
+                'message': 'URLs fetched successfully',
+                'data': urls,
+            })
+
+        sort = query.sort or 'hostname'
+        try:
+            urls, next_cursor, total = get_url_view(db_if).query(
+                search=(query.search or '').strip(),
+                sort_field=sort.lstrip('-'),
+                descending=sort.startswith('-'),
+                cursor=query.cursor,
+                limit=query.limit or MAX_PAGE_SIZE,
+            )
+        except ValueError as e:
+            # invalid search syntax or cursor
+            abort(400, str(e))
+
+        return fast_json({
             'status': 'success',
             'message': 'URLs fetched successfully',
             'data': urls,
-        }
+            'next_cursor': next_cursor,
+            'total': total,
+        })
 
     # Route to update URL name
     @url_bp.put('/api/url/<string:url_id>')
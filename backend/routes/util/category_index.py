@@ -0,0 +1,199 @@
+import threading
+from typing import List, Dict, Tuple, Optional, Iterable
+
+from flask import current_app
+
+from db.dbmodel.category import Category
+from db.dbmodel.url import URL
+from db.middleware.abc.db import MiddlewareDB
+
+
+def find_subcategories(
+    current_cat: Category,
+    categories_dict: dict[str, Category],
+    visited: set[str],
+    result: list[Category]
+):
+    """
+    This method is used to recursively traverse the nested categories.
+    All categories that are in some form a subcategory of the provided current_cat will be added to the result list.
+
+    :param current_cat: The current category to start the traversal from
+    :param categories_dict: A mapping of category IDs to category objects
+    :param visited: A set to track already visited categories
+    :param result: A list to store all subcategories found so far
+    """
+    for nested_id in current_cat.nested_categories:
+        # resolve category id to category in the lookup table
+        nested_cat = categories_dict.get(nested_id)
+
+        # make sure we could look up the nested category
+        if not nested_cat:
+            continue
+
+        # make sure we did not yet visit the nested category,
+        # this should prevent infinite loops with circular nested categories
+        if nested_cat.id in visited:
+            continue
+
+        # store cat in the visited and the result list
+        visited.add(nested_cat.id)
+        result.append(nested_cat)
+
+        # call recursively for the nested cat
+        find_subcategories(nested_cat, categories_dict, visited, result)
+
+
+class CategoryIndex:
+    """
+    Immutable index of all URLs & categories, used to match hostnames (test-uri) and to compile tokens.
+
+    - the URLs by hostname, so the URL matching the longest suffix of a hostname is found without a scan
+    - the closure of every category, i.e. all its (transitively) nested categories
+    - the compiled 'define category' block of every category, shared by all tokens containing the category
+
+    The closures and blocks are built on first use, or ahead of time with warm (e.g. by the gunicorn master in preload mode).
+    The index is rebuilt whenever the URLs or categories change, so it is never modified once built (besides adding closures & blocks).
+    """
+
+    def __init__(self, revision: str, urls: List[URL], categories: List[Category]):
+        """
+        :param revision: The revision of the URLs & categories
+        :param urls: All URLs, in the order they are compiled in
+        :param categories: All categories
+        """
+        self.revision = revision
+        self.urls = urls
+        self.categories = categories
+        self.categories_by_id: Dict[str, Category] = {c.id: c for c in categories}
+
+        self.urls_by_hostname: Dict[str, URL] = {}
+        for url in urls:
+            # the first URL wins, like the scan it replaces
+            self.urls_by_hostname.setdefault(url.hostname, url)
+
+        self._lock = threading.Lock()
+        self._closures: Dict[str, Tuple[Category, ...]] = {}
+        self._blocks: Dict[str, str] = {}
+
+    def match_hostname(self, hostname: str) -> Optional[URL]:
+        """
+        Find the URL matching a hostname, either exactly or the longest matching parent domain.
+
+        :param hostname: The normalized (lowercase) hostname
+        :return: The best matching URL, None if no URL matches
+        """
+        candidate = hostname
+        while candidate:
+            url = self.urls_by_hostname.get(candidate)
+            if url is not None:
+                return url
+            candidate = candidate.partition('.')[2]
+        return None
+
+    def sub_categories(self, cat_id: str) -> Tuple[Category, ...]:
+        """
+        Get all (transitively) nested categories of a category, excluding itself.
+
+        :param cat_id: ID of the category
+        :return: The nested categories, in the order find_subcategories visits them
+        """
+        closure = self._closures.get(cat_id)
+        if closure is None:
+            cat = self.categories_by_id.get(cat_id)
+            result: List[Category] = []
+            if cat is not None:
+                find_subcategories(cat, self.categories_by_id, set(), result)
+            closure = tuple(result)
+            with self._lock:
+                self._closures[cat_id] = closure
+        return closure
+
+    def compile_category(self, cat: Category) -> str:
+        """
+        Compile the 'define category' block of a category, with all URLs of the category and its nested categories.
+
+        :param cat: The category to compile
+        :return: The block, as part of the compiled file of a token
+        """
+        block = self._blocks.get(cat.id)
+        if block is not None:
+            return block
+
+        sub_cats = self.sub_categories(cat.id)
+        # a URL in multiple nested categories is attributed to the first of them
+        sub_cat_order = {c.id: i for i, c in enumerate(sub_cats)}
+
+        # header for the category
+        lines = [
+            f'; Category: {cat.name}\n',
+            f'; Description: {cat.description}\n',
+            f'; Sub-Categories: {", ".join([c.name for c in sub_cats])}\n',
+            f'define category "{cat.name}"\n',
+        ]
+
+        # fill in URLs that are part of the category
+        for url in self.urls:
+            if cat.id in url.categories:
+                lines.append(f'  {url.hostname}\n')
+            elif sub_cat_order:
+                # check if any of the sub-cats includes the url
+                matches = [sub_cat_order[c] for c in url.categories if c in sub_cat_order]
+                if matches:
+                    lines.append(f'  {url.hostname} ; from sub-cat {sub_cats[min(matches)].name}\n')
+
+        # end of category
+        lines.append(f'  ; end of {cat.name}\n')
+        lines.append('end category\n\n')
+
+        block = ''.join(lines)
+        with self._lock:
+            self._blocks[cat.id] = block
+        return block
+
+    def warm(self, cat_ids: Iterable[str]):
+        """
+        Build the closures & blocks of categories ahead of time.
+
+        :param cat_ids: IDs of the categories to compile, e.g. all categories used by tokens
+        """
+        for cat_id in set(cat_ids):
+            cat = self.categories_by_id.get(cat_id)
+            if cat is not None:
+                self.compile_category(cat)
+
+
+_build_locks = {
+    'CATEGORY_INDEX': threading.Lock(),
+    'COMMITTED_CATEGORY_INDEX': threading.Lock(),
+}
+
+
+def get_category_index(db_if: MiddlewareDB, committed: bool = False) -> CategoryIndex:
+    """
+    Get the index of all URLs & categories as a singleton, rebuilt whenever the URLs or categories change.
+
+    :param db_if: The database interface to use
+    :param committed: True to only index the committed objects (used by compile), False to include the staged changes
+    """
+    key = 'COMMITTED_CATEGORY_INDEX' if committed else 'CATEGORY_INDEX'
+    revision = f"{db_if.get_revision('url', committed)}/{db_if.get_revision('category', committed)}"
+    if not committed:
+        # test-uri returns the BlueCoat categories of the matched URL, compile does not use them
+        revision += f"/{db_if.get_revision('bc')}"
+    index: Optional[CategoryIndex] = current_app.config.get('SINGLETONS', {}).get(key, None)
+
+    if index is None or index.revision != revision:
+        # with threaded workers only one thread rebuilds the index, the others wait for and reuse it
+        with _build_locks[key]:
+            index = current_app.config.get('SINGLETONS', {}).get(key, None)
+            if index is None or index.revision != revision:
+                index = CategoryIndex(
+                    revision,
+                    db_if.urls.get_all_urls(bypass_cache=committed),
+                    db_if.categories.get_all_categories(bypass_cache=committed),
+                )
+                current_app.config.setdefault('SINGLETONS', {})
+                current_app.config['SINGLETONS'][key] = index
+
+    return index
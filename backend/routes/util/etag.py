@@ -0,0 +1,41 @@
+from functools import wraps
+from typing import Callable, Any
+from flask import request, Response
+from werkzeug.http import quote_etag
+
+
+def conditional_get(get_revision: Callable[[], str]):
+    """
+    Decorator to add a (weak) ETag to a list endpoint, and answer conditional requests.
+
+    The ETag is based on the revision of the data, so a request with a matching If-None-Match header
+    is answered with a 304 before the data is loaded from the DB or serialized.
+    Place it below the auth_required decorator, so unauthenticated requests never see the ETag.
+
+    :param get_revision: A function returning the current revision of the data returned by the endpoint
+    """
+    def decorator(f: Callable[..., Any]):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            revision = get_revision()
+            headers = {
+                'ETag': quote_etag(revision, weak=True),
+                # always revalidate, since the data might change at any time
+                'Cache-Control': 'no-cache',
+            }
+
+            if request.if_none_match.contains_weak(revision):
+                # the client already has the current data
+                return Response(status=304, headers=headers)
+
+            rv = f(*args, **kwargs)
+            if isinstance(rv, Response):
+                # already serialized (e.g. by fast_json)
+                rv.headers.update(headers)
+                return rv
+            if isinstance(rv, tuple):
+                # views with a custom status / headers are passed through unchanged
+                return rv
+            return rv, 200, headers
+        return wrapper
+    return decorator
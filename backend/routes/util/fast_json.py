@@ -0,0 +1,20 @@
+from typing import Any, Dict
+
+import orjson
+from flask import current_app, Response
+
+
+def fast_json(payload: Dict[str, Any], status: int = 200) -> Response:
+    """
+    Serialize a response directly with orjson, bypassing the marshmallow output schema.
+
+    orjson natively serializes the (nested) dataclasses of the models, which produces the same JSON
+    as dumping them with their class_schema, but is orders of magnitude faster for large lists.
+    APIFlask passes Response objects through unchanged, so the route keeps its output decorator,
+    and with it the OpenAPI docs. Only use this for data that is trusted to match the output schema.
+
+    :param payload: The response body, e.g. a dict with status, message & data
+    :param status: The HTTP status code
+    :return: The JSON response
+    """
+    return current_app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
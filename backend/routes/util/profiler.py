@@ -0,0 +1,261 @@
+import cProfile
+import fcntl
+import io
+import itertools
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any, List, Callable, Iterable
+
+import orjson
+
+CONTROL_FILE = 'control.json'
+PROFILE_SUFFIX = '.prof'
+# requests to the profiling API itself are never profiled
+PROFILING_API_PREFIX = '/api/profiling'
+
+
+class RequestProfiler:
+    """
+    Profiles requests with cProfile, while a profiling session is active.
+
+    A session profiles the next N requests (optionally only those matching a route pattern), until it expires.
+    The session is stored in a control file, so it is shared by all gunicorn workers:
+    every worker checks the file at most once per check interval,
+    and the remaining number of requests is decremented under a file lock.
+    Every profiled request is stored as .prof file, which can be viewed with e.g. snakeviz.
+    """
+
+    def __init__(self, profile_dir: str, max_profiles: int = 200, check_interval: float = 1.0):
+        """
+        :param profile_dir: Directory to store the control file & the profiles in
+        :param max_profiles: Max number of stored profiles, the oldest are deleted
+        :param check_interval: Seconds between two checks of the control file
+        """
+        self.profile_dir = profile_dir
+        self.max_profiles = max_profiles
+        self.check_interval = check_interval
+        self._control_path = os.path.join(profile_dir, CONTROL_FILE)
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._mtime: Optional[float] = None
+        self._session: Optional[Dict[str, Any]] = None
+        self._pattern: Optional[re.Pattern] = None
+        # keeps the names of profiles stored within the same millisecond unique
+        self._sequence = itertools.count()
+
+    ## session handling
+
+    def _set_session(self, session: Optional[Dict[str, Any]], mtime: Optional[float]):
+        """Cache the session of the control file, must be called with the lock held"""
+        self._checked_at = time.monotonic()
+        self._mtime = mtime
+        self._session = session
+        route = session.get('route') if session else None
+        self._pattern = re.compile(route) if route else None
+
+    def _write_session(self, session: Optional[Dict[str, Any]]):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with open(self._control_path, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            f.truncate()
+            f.write(orjson.dumps(session))
+            f.flush()
+            mtime = os.fstat(f.fileno()).st_mtime
+        # this worker uses the written session right away, instead of after its next check of the control file
+        # (which would also miss the change, if the mtime did not change within the resolution of the file system)
+        with self._lock:
+            self._set_session(session, mtime)
+
+    def _read_session(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._control_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        session = orjson.loads(data) if data else None
+        return session if isinstance(session, dict) else None
+
+    def start(self, requests: int, route: Optional[str], duration: int) -> Dict[str, Any]:
+        """
+        Start a new profiling session, replacing the current one.
+
+        :param requests: Number of requests to profile, 0 to profile all (matching) requests until the session expires
+        :param route: Optional regex, only requests whose path matches it are profiled
+        :param duration: Seconds until the session expires
+        :return: The new session
+        :raises ValueError: If the route pattern is invalid
+        """
+        if route:
+            try:
+                re.compile(route)
+            except re.error as e:
+                raise ValueError(f'Invalid route pattern: {e}')
+        session = {
+            'id': str(uuid.uuid4()),
+            'remaining': requests if requests > 0 else None,
+            'route': route or None,
+            'until': int(time.time()) + duration,
+        }
+        self._write_session(session)
+        return session
+
+    def stop(self):
+        """Stop the current profiling session"""
+        self._write_session(None)
+
+    def current_session(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the active session, the control file is only checked once per check interval
+
+        :return: The session, None if profiling is inactive
+        """
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                self._checked_at = now
+                try:
+                    mtime = os.stat(self._control_path).st_mtime
+                except FileNotFoundError:
+                    mtime = None
+                if mtime != self._mtime:
+                    self._set_session(self._read_session(), mtime)
+
+        session = self._session
+        if session is None or session['until'] < time.time() or session['remaining'] == 0:
+            return None
+        return session
+
+    def claim(self, path: str) -> Optional[str]:
+        """
+        Check if a request is profiled, and count it against the session.
+
+        :param path: The path of the request
+        :return: The ID of the session, None if the request is not profiled
+        """
+        session = self.current_session()
+        if session is None or path.startswith(PROFILING_API_PREFIX):
+            return None
+        pattern = self._pattern
+        if pattern is not None and not pattern.search(path):
+            return None
+        if session['remaining'] is None:
+            return session['id']
+
+        # decrement the shared counter, other workers might have used up the session in the meantime
+        with open(self._control_path, 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            data = f.read()
+            current = orjson.loads(data) if data else None
+            if not isinstance(current, dict) or current['id'] != session['id'] or not current['remaining']:
+                return None
+            current['remaining'] -= 1
+            f.seek(0)
+            f.truncate()
+            f.write(orjson.dumps(current))
+        return session['id']
+
+    ## profiles
+
+    def save(self, profile: cProfile.Profile, session_id: str, method: str, path: str, seconds: float):
+        """Store the profile of a request, and delete the oldest profiles above the limit"""
+        safe_path = re.sub(r'[^A-Za-z0-9]+', '_', path).strip('_')[:80] or 'root'
+        name = f'{int(time.time() * 1000)}.{method}.{safe_path}.{int(seconds * 1000)}ms.{os.getpid()}-{next(self._sequence)}{PROFILE_SUFFIX}'
+        session_dir = os.path.join(self.profile_dir, session_id)
+        os.makedirs(session_dir, exist_ok=True)
+        profile.dump_stats(os.path.join(session_dir, name))
+
+        profiles = self.list_profiles()
+        for old in profiles[:max(0, len(profiles) - self.max_profiles)]:
+            try:
+                os.remove(self.profile_path(old['session'], old['name']))
+            except (FileNotFoundError, TypeError):
+                pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """
+        List all stored profiles.
+
+        :return: Session, name, size & creation time of each profile, oldest first
+        """
+        profiles = []
+        if not os.path.isdir(self.profile_dir):
+            return profiles
+        for session_id in os.listdir(self.profile_dir):
+            session_dir = os.path.join(self.profile_dir, session_id)
+            if not os.path.isdir(session_dir):
+                continue
+            for name in os.listdir(session_dir):
+                if not name.endswith(PROFILE_SUFFIX):
+                    continue
+                stat = os.stat(os.path.join(session_dir, name))
+                profiles.append({
+                    'session': session_id,
+                    'name': name,
+                    'size': stat.st_size,
+                    'created': int(stat.st_mtime),
+                })
+        profiles.sort(key=lambda p: (p['created'], p['name']))
+        return profiles
+
+    def profile_path(self, session_id: str, name: str) -> Optional[str]:
+        """
+        Resolve a profile to its file, without allowing to escape the profile directory
+
+        :return: The path, None if there is no such profile
+        """
+        if os.path.basename(session_id) != session_id or os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+            return None
+        path = os.path.join(self.profile_dir, session_id, name)
+        return path if os.path.isfile(path) else None
+
+    @staticmethod
+    def summarize(path: str, limit: int = 50) -> str:
+        """Render a profile as text, the functions with the highest cumulative time first"""
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return out.getvalue()
+
+    def clear(self):
+        """Delete all stored profiles"""
+        for profile in self.list_profiles():
+            try:
+                os.remove(self.profile_path(profile['session'], profile['name']))
+            except (FileNotFoundError, TypeError):
+                pass
+
+
+class ProfilerMiddleware:
+    """WSGI middleware that profiles the requests claimed by a RequestProfiler"""
+
+    def __init__(self, wsgi_app: Callable, profiler: RequestProfiler):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        path = environ.get('PATH_INFO', '')
+        session_id = self.profiler.claim(path)
+        if session_id is None:
+            return self.wsgi_app(environ, start_response)
+
+        body: List[bytes] = []
+
+        def run():
+            # consume the whole response, so streamed responses are profiled as well
+            app_iter = self.wsgi_app(environ, start_response)
+            try:
+                body.extend(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.runcall(run)
+        self.profiler.save(profile, session_id, environ.get('REQUEST_METHOD', 'GET'), path, time.perf_counter() - start)
+        return body
@@ -0,0 +1,533 @@
+"""
+Python port of the search parser used by the frontend (frontend/src/searchParser).
+
+The grammar is identical, so a query typed into the quick search of the UI can be evaluated server-side:
+* plain or quoted text, matched (with * and _ wildcards) against the _raw field of a row
+* field filters: key=val, key!=val, key>=val, key<=val, key<val, key>val
+* boolean operators: NOT, AND, OR (NOT binds strongest, AND / OR are evaluated left to right)
+* brace functions: (...), abs(...), num(...)
+"""
+import math
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List, Dict, Union, Callable, Optional
+
+# The result of a calculation can be a string, boolean, or number.
+CalcResult = Union[str, bool, float]
+# A row of data, all values are strings, the _raw field is the concatenation of all values
+DataRow = Dict[str, str]
+
+# The Character-splitting Function Parameters
+FUNC_ARG_SEPARATOR = ','
+
+
+class SearchSyntaxError(ValueError):
+    """Raised if a search query can not be parsed."""
+    pass
+
+
+def _to_num(value: CalcResult) -> float:
+    """typecast a calculation result to a number, like JavaScripts Number()"""
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, float):
+        return value
+    value = value.strip()
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return math.nan
+
+
+def _to_str(value: CalcResult) -> str:
+    """typecast a calculation result to a string, like JavaScripts toString()"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return str(value)
+    return value
+
+
+class BracesFunc:
+    """A function used with braces, e.g. "abs(-2)". Generic braces () use the function name ""."""
+    def __init__(
+        self,
+        key: str,
+        description: str,
+        validate: Callable[[int], bool],
+        calc: Callable[..., CalcResult],
+    ):
+        self.key = key
+        self.description = description
+        self.validate = validate
+        self.calc = calc
+
+
+BRACES_FUNCTIONS: List[BracesFunc] = [
+    BracesFunc('abs', 'calc the absolute value of the argument', lambda c: c == 1, lambda *a: abs(_to_num(a[0]))),
+    BracesFunc('num', 'typecast string to a number', lambda c: c == 1, lambda *a: _to_num(a[0])),
+    BracesFunc('', 'simple braces to prioritise segments', lambda c: c == 1, lambda *a: a[0]),
+]
+
+
+def get_quote_end(base_str: str, start_idx: int) -> int:
+    """
+    Get the closing position of a quoted string, respecting escaped characters (e.g. \\").
+
+    :param base_str: The input string
+    :param start_idx: The index of the opening quote
+    :return: The index of the closing quote, or -1 if not found
+    """
+    end = start_idx + 1
+    while end < len(base_str):
+        if base_str[end] == '\\':
+            # skip the next character
+            end += 2
+            continue
+        if base_str[end] == '"':
+            return end
+        end += 1
+    return -1
+
+
+def get_parenthesis_end(base_str: str, start_idx: int) -> int:
+    """
+    Get the closing position of a brace, allowing for nested braces and quotes.
+
+    :param base_str: The input string
+    :param start_idx: The index of the opening brace
+    :return: The index of the closing brace, or -1 if not found
+    """
+    stack = 1
+    end = start_idx + 1
+    while end < len(base_str):
+        char = base_str[end]
+        if char == '\\':
+            # skip the next character
+            end += 2
+            continue
+        if char == '"':
+            # skip to the end of string
+            end = get_quote_end(base_str, end)
+            if end == -1:
+                raise SearchSyntaxError('Mismatched quotes')
+            end += 1
+            continue
+
+        if char == '(':
+            stack += 1
+        elif char == ')':
+            stack -= 1
+            if stack == 0:
+                return end
+        end += 1
+    return -1
+
+
+def _quote_blocks(base_str: str) -> List[List[int]]:
+    """Build an index of all parts that are in quotes and should therefore not be altered"""
+    blocks = []
+    i = 0
+    while i < len(base_str):
+        if base_str[i] == '"':
+            end = get_quote_end(base_str, i)
+            if end == -1:
+                raise SearchSyntaxError('Mismatched quotes')
+            blocks.append([i, end])
+            i = end
+        i += 1
+    return blocks
+
+
+def normalize(base_str: str) -> str:
+    """
+    Normalize a query by trimming whitespace, removing extra spaces and removing spaces
+    around comparators (<=, !=, >=, =, <, >), except inside quoted sections.
+
+    :param base_str: The input string to normalize
+    :return: The normalized string
+    """
+    escaped = base_str.strip()
+    quote_blocks = _quote_blocks(escaped)
+
+    def replace_unquoted(pattern: re.Pattern, replacement: Callable[[re.Match], str]):
+        nonlocal escaped
+        for match in reversed(list(pattern.finditer(escaped))):
+            start, end = match.start(), match.end()
+            if any(q[0] <= start and q[1] >= end for q in quote_blocks):
+                continue
+            new = replacement(match)
+            escaped = escaped[:start] + new + escaped[end:]
+            # offset quoted blocks after the edit to account for the removed characters
+            for q in quote_blocks:
+                if q[0] > start:
+                    q[0] -= (end - start) - len(new)
+                    q[1] -= (end - start) - len(new)
+
+    replace_unquoted(re.compile(r'\s+'), lambda _m: ' ')
+    replace_unquoted(re.compile(r'\s+([<>]|[<>!]?=)\s+'), lambda m: m.group(1))
+    return escaped
+
+
+def split_args(base_str: str, separator: str) -> List[str]:
+    """
+    Cut into arguments based on the provided separator,
+    while respecting (nested) braces and quoted strings.
+
+    :param base_str: The string to split
+    :param separator: The string used to split the base_str
+    :return: A list of arguments
+    """
+    if not separator:
+        raise ValueError('separator cannot be empty')
+
+    # remove leading and trailing spaces and separators
+    sep = re.escape(separator)
+    trimmed = re.sub(rf'^(\s|{sep})*(.*?)(\s|{sep})*$', r'\2', base_str)
+
+    splits = []
+    start_idx = 0
+    current = 0
+    while current < len(trimmed):
+        if trimmed[current] == '(':
+            current = get_parenthesis_end(trimmed, current)
+            if current == -1:
+                raise SearchSyntaxError('Mismatched parenthesis')
+        elif trimmed[current] == '"':
+            current = get_quote_end(trimmed, current)
+            if current == -1:
+                raise SearchSyntaxError('Mismatched quotes')
+
+        if trimmed.startswith(separator, current):
+            splits.append(trimmed[start_idx:current])
+            start_idx = current + len(separator)
+            current += len(separator) - 1
+        current += 1
+
+    if start_idx < len(trimmed):
+        splits.append(trimmed[start_idx:])
+
+    return [x.strip() for x in splits]
+
+
+def can_split_args(base_str: str, separator: str, validate_arg_count: Callable[[int], bool]) -> bool:
+    """Check if a string can be split into a valid number of arguments."""
+    try:
+        return validate_arg_count(len(split_args(base_str, separator)))
+    except ValueError:
+        return False
+
+
+@lru_cache(maxsize=256)
+def _wildcard_regex(pattern: str, floating: bool) -> re.Pattern:
+    # escape everything, then re-enable `*` (any characters) and `_` (single character)
+    escaped = re.escape(pattern).replace(r'\*', '.*').replace('_', '.')
+    return re.compile(escaped if floating else f'^{escaped}$')
+
+
+def wildcard_match_str(pattern: str, value: str, floating: bool = True) -> bool:
+    """
+    Match a string against a pattern with wildcard support.
+
+    :param pattern: The pattern, can contain * (any characters) and _ (single character)
+    :param value: The string to match
+    :param floating: Allow the pattern to match anywhere in the string (True) or only the entire string (False)
+    """
+    return _wildcard_regex(pattern, floating).search(value) is not None
+
+
+def calc_to_bool(row: DataRow, calc: Callable[[DataRow], CalcResult]) -> bool:
+    """Convert a calculation result to a boolean, strings are matched against the _raw field."""
+    res = calc(row)
+    if isinstance(res, str):
+        return wildcard_match_str(res.lower(), row['_raw'].lower())
+    if isinstance(res, bool):
+        return res
+    return not math.isnan(res) and res != 0
+
+
+class ArgType(ABC):
+    """A recognized syntax expression of a search query"""
+    name: str = ''
+
+    def matches(self, base_str: str) -> bool:
+        return False
+
+    def init(self, node: 'TreeNode'):
+        pass
+
+    def nest(self, node: 'TreeNode', all_nodes: List['TreeNode']) -> List['TreeNode']:
+        return all_nodes
+
+    @abstractmethod
+    def print(self, node: 'TreeNode') -> str:
+        """Render the expression, used to debug the syntax tree"""
+        pass
+
+    @abstractmethod
+    def calc(self, node: 'TreeNode', row: DataRow) -> CalcResult:
+        """Evaluate the expression for a row"""
+        pass
+
+
+def _print_children(node: 'TreeNode') -> str:
+    return ', '.join(c.print() for c in node.children)
+
+
+class RootType(ArgType):
+    name = 'root'
+
+    def init(self, node):
+        node.base_str = normalize(node.base_str)
+        for arg in split_args(node.base_str, ' '):
+            arg_type = next((at for at in ARG_TYPES if at.matches(arg)), None)
+            if arg_type is None:
+                raise SearchSyntaxError(f'Unable to find a Type for "{arg}"')
+            node.children.append(TreeNode(arg, arg_type, node.fields))
+
+    def print(self, node):
+        return f'root([{_print_children(node)}])'
+
+    def calc(self, node, row):
+        if len(node.children) == 1:
+            return node.children[0].calc(row)
+        return all(calc_to_bool(row, c.calc) for c in node.children)
+
+
+class EmptyType(ArgType):
+    name = 'empty'
+
+    def matches(self, base_str):
+        return len(base_str) == 0
+
+    def print(self, node):
+        return 'null()'
+
+    def calc(self, node, row):
+        return ''
+
+
+class NotType(ArgType):
+    name = 'not'
+
+    def matches(self, base_str):
+        return base_str == 'NOT'
+
+    def nest(self, node, all_nodes):
+        idx = all_nodes.index(node)
+        if idx + 1 >= len(all_nodes):
+            raise SearchSyntaxError('NOT at the end is not allowed')
+        node.children = [all_nodes.pop(idx + 1)]
+        return all_nodes
+
+    def print(self, node):
+        return f'not([{_print_children(node)}])'
+
+    def calc(self, node, row):
+        return not calc_to_bool(row, node.children[0].calc)
+
+
+class LogicType(ArgType):
+    name = 'logic'
+
+    def matches(self, base_str):
+        return base_str in ('OR', 'AND')
+
+    def nest(self, node, all_nodes):
+        idx = all_nodes.index(node)
+        if idx == 0 or idx + 1 >= len(all_nodes):
+            raise SearchSyntaxError(f'{node.base_str} requires an argument on both sides')
+        nxt = all_nodes.pop(idx + 1)
+        prev = all_nodes.pop(idx - 1)
+        node.children = [prev, nxt]
+        return all_nodes
+
+    def print(self, node):
+        return f'logic({node.base_str}, [{_print_children(node)}])'
+
+    def calc(self, node, row):
+        if node.base_str == 'OR':
+            return any(calc_to_bool(row, c.calc) for c in node.children)
+        return all(calc_to_bool(row, c.calc) for c in node.children)
+
+
+# comparators of the key-val-pair, "=" has to be last since it is part of the others
+_COMPARATORS = ['!=', '>=', '<=', '<', '>', '=']
+
+
+def _compare(left: CalcResult, right: CalcResult, operator: str) -> bool:
+    """Compare two values like JavaScript: strings lexicographically, everything else as numbers"""
+    if isinstance(left, str) and isinstance(right, str):
+        lhs, rhs = left, right
+    else:
+        lhs, rhs = _to_num(left), _to_num(right)
+    if operator == '>=':
+        return lhs >= rhs
+    if operator == '<=':
+        return lhs <= rhs
+    if operator == '<':
+        return lhs < rhs
+    if operator == '>':
+        return lhs > rhs
+    return False
+
+
+class KeyValPairType(ArgType):
+    name = 'key-val-pair'
+
+    def matches(self, base_str):
+        return any(can_split_args(base_str, op, lambda c: c == 2) for op in _COMPARATORS)
+
+    def init(self, node):
+        operator = next(op for op in _COMPARATORS if can_split_args(node.base_str, op, lambda c: c == 2))
+        args = split_args(node.base_str, operator)
+        node.parts = [args[0], operator, args[1]]
+        node.children = [
+            TreeNode(node.parts[0], ROOT_TYPE, node.fields),
+            TreeNode(node.parts[2], ROOT_TYPE, node.fields),
+        ]
+
+    def print(self, node):
+        return f'key-val({node.children[0].print()}, {node.parts[1]}, {node.children[1].print()})'
+
+    def calc(self, node, row):
+        left = node.children[0].calc(row)
+        right = node.children[1].calc(row)
+        operator = node.parts[1]
+        if operator == '=':
+            return wildcard_match_str(_to_str(right).lower(), _to_str(left).lower(), False)
+        if operator == '!=':
+            return not wildcard_match_str(_to_str(right).lower(), _to_str(left).lower(), False)
+        return _compare(left, right, operator)
+
+
+def _find_braces_func(base_str: str) -> Optional[BracesFunc]:
+    return next((bf for bf in BRACES_FUNCTIONS if base_str.startswith(bf.key + '(')), None)
+
+
+class BracesFuncType(ArgType):
+    name = 'bracesFunc'
+
+    def matches(self, base_str):
+        return base_str.endswith(')') and _find_braces_func(base_str) is not None
+
+    def init(self, node):
+        func = _find_braces_func(node.base_str)
+        node.parts = [func.key]
+        raw_inner = node.base_str[len(func.key) + 1:-1]
+        inner = split_args(raw_inner, FUNC_ARG_SEPARATOR)
+        if not func.validate(len(inner)):
+            raise SearchSyntaxError(f'Invalid arguments for function "{func.key}"')
+        node.children = [TreeNode(i, ROOT_TYPE, node.fields) for i in inner]
+
+    def print(self, node):
+        return f'func({node.parts[0]}, [{_print_children(node)}])'
+
+    def calc(self, node, row):
+        func = next(bf for bf in BRACES_FUNCTIONS if bf.key == node.parts[0])
+        return func.calc(*[c.calc(row) for c in node.children])
+
+
+class QuotedTextType(ArgType):
+    name = 'quoted-text'
+
+    def matches(self, base_str):
+        return base_str.startswith('"') and base_str.endswith('"')
+
+    def init(self, node):
+        node.parts = [node.base_str[1:-1]]
+
+    def print(self, node):
+        return f'text("{node.parts[0]}")'
+
+    def calc(self, node, row):
+        return node.parts[0]
+
+
+class RawTextType(ArgType):
+    name = 'raw-text'
+
+    def matches(self, base_str):
+        return re.fullmatch(r'\S+', base_str) is not None
+
+    def init(self, node):
+        node.parts = ['column' if node.base_str in node.fields else 'text']
+
+    def print(self, node):
+        return f'{node.parts[0]}("{node.base_str}")'
+
+    def calc(self, node, row):
+        if node.parts[0] == 'column':
+            return row[node.base_str]
+        return node.base_str
+
+
+ROOT_TYPE = RootType()
+# All supported argument types, the earlier in the list the higher the priority
+ARG_TYPES: List[ArgType] = [
+    ROOT_TYPE,
+    EmptyType(),
+    NotType(),
+    LogicType(),
+    KeyValPairType(),
+    BracesFuncType(),
+    QuotedTextType(),
+    RawTextType(),
+]
+
+
+class TreeNode:
+    """A Node in the syntax tree of a search query"""
+
+    def __init__(self, base_str: str, arg_type: ArgType, fields: List[str]):
+        self.base_str = base_str
+        self.type = arg_type
+        self.fields = fields
+        self.children: List[TreeNode] = []
+        self.parts: List[str] = []
+        self.has_nested = False
+        self.type.init(self)
+
+    def nest(self, all_nodes: List['TreeNode']) -> List['TreeNode']:
+        self.has_nested = True
+        return self.type.nest(self, all_nodes)
+
+    def build_hierarchy(self):
+        """Nest the children by priority (e.g. changing [A, OR, B] to [OR(A, B)])"""
+        while True:
+            todo = [x for x in self.children if not x.has_nested]
+            if not todo:
+                break
+            child = min(todo, key=lambda x: ARG_TYPES.index(x.type))
+            self.children = child.nest(self.children)
+
+        for child in self.children:
+            child.build_hierarchy()
+
+    def print(self) -> str:
+        return self.type.print(self)
+
+    def calc(self, row: DataRow) -> CalcResult:
+        return self.type.calc(self, row)
+
+    def test(self, row: DataRow) -> bool:
+        """Check if the row matches the query"""
+        return calc_to_bool(row, self.calc)
+
+
+def build_syntax_tree(base_str: str, fields: List[str]) -> TreeNode:
+    """
+    Build a new Tree, ready to be used for calculations
+
+    :param base_str: The search query
+    :param fields: The fields available in the rows
+    :return: The root TreeNode
+    """
+    tree = TreeNode(base_str, ROOT_TYPE, fields)
+    tree.build_hierarchy()
+    return tree
@@ -0,0 +1,217 @@
+import base64
+import threading
+import time
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Tuple, Optional, Callable, Any
+
+import orjson
+from flask import current_app
+
+from db.dbmodel.category import Category
+from db.dbmodel.url import URL, CompactURL
+from db.middleware.abc.db import MiddlewareDB
+from routes.util.search_parser import build_syntax_tree
+
+# fields available to the search, identical to the UrlFields of the frontend
+URL_SEARCH_FIELDS = ['id', 'host', 'description', 'cats', 'categories', 'cat_ids', 'bc_cats', 'bc_last_set', 'changed']
+
+# fields the URLs can be sorted by, and how to build the sort key
+URL_SORT_FIELDS: Dict[str, Callable[[CompactURL], Any]] = {
+    'hostname': lambda u: u.hostname.lower(),
+    'description': lambda u: (u.description or '').lower(),
+    'bc_last_set': lambda u: u.bc_last_set,
+    'id': lambda u: u.id,
+}
+
+# number of (search, sort) results kept per view
+MAX_CACHED_QUERIES = 16
+
+
+def _format_time(timestamp: int) -> str:
+    if timestamp == 0:
+        return 'never'
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def _url_field(url: CompactURL, field: str, cat_names: Dict[str, str]) -> str:
+    """Get a single search field of a URL, the same way the frontend builds it with UrlToKV"""
+    if field == 'id':
+        return url.id
+    if field == 'host':
+        return url.hostname
+    if field == 'description':
+        return url.description or ''
+    if field in ('cats', 'categories'):
+        return ','.join(cat_names.get(c, '') for c in url.categories)
+    if field == 'cat_ids':
+        return ','.join(url.categories)
+    if field == 'bc_cats':
+        return ','.join(url.bc_cats)
+    if field == 'bc_last_set':
+        return _format_time(url.bc_last_set)
+    if field == 'changed':
+        return 'true' if url.pending_changes else 'false'
+    raise KeyError(field)
+
+
+def _search_key(url: CompactURL, cat_names: Dict[str, str]) -> str:
+    """The _raw field of a URL (all search fields joined), lowercase like the search compares it"""
+    return ' '.join(_url_field(url, f, cat_names) for f in URL_SEARCH_FIELDS).lower()
+
+
+class _SearchRow:
+    """
+    The search row of a single URL, its fields are only built when a query uses them.
+    One instance is reused for all URLs of a search, so the view does not hold a row per URL.
+    """
+    __slots__ = ('url', 'raw', 'cat_names')
+
+    def __init__(self, cat_names: Dict[str, str]):
+        self.cat_names = cat_names
+        self.url: Optional[CompactURL] = None
+        self.raw = ''
+
+    def __getitem__(self, field: str) -> str:
+        if field == '_raw':
+            return self.raw
+        return _url_field(self.url, field, self.cat_names)
+
+
+def encode_cursor(key: Tuple[Any, str]) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(list(key))).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        value, url_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(url_id, str) or not isinstance(value, (str, int)):
+        raise ValueError('Invalid cursor')
+    return value, url_id
+
+
+class URLView:
+    """
+    Immutable in-memory view of all URLs, used to search, sort and paginate them.
+
+    Only the search key (the _raw field) of every URL is built once per view, the other fields are built
+    when a query uses them. Sort orders and search results are built on demand and cached,
+    so paging through the results of a query only evaluates the query once.
+    The URLs are kept in their compact representation, and only the returned page is converted back.
+    """
+
+    def __init__(self, revision: str, urls: List[URL], categories: List[Category]):
+        self.revision = revision
+        self.urls = [CompactURL(u) for u in urls]
+        self.cat_names = {c.id: c.name for c in categories}
+        self.search_keys = [_search_key(u, self.cat_names) for u in self.urls]
+
+        self._lock = threading.Lock()
+        # sort field -> positions of the URLs sorted ascending
+        self._orders: Dict[str, List[int]] = {}
+        # (search, sort field) -> sorted positions & their sort keys
+        self._results: OrderedDict[Tuple[str, str], Tuple[List[int], List[Tuple[Any, str]]]] = OrderedDict()
+
+    def _order(self, sort_field: str) -> List[int]:
+        order = self._orders.get(sort_field)
+        if order is None:
+            key = URL_SORT_FIELDS[sort_field]
+            order = sorted(range(len(self.urls)), key=lambda i: (key(self.urls[i]), self.urls[i].id))
+            self._orders[sort_field] = order
+        return order
+
+    def _result(self, search: str, sort_field: str) -> Tuple[List[int], List[Tuple[Any, str]]]:
+        cache_key = (search, sort_field)
+        with self._lock:
+            result = self._results.get(cache_key)
+            if result is not None:
+                self._results.move_to_end(cache_key)
+                return result
+
+        order = self._order(sort_field)
+        if search:
+            tree = build_syntax_tree(search, URL_SEARCH_FIELDS)
+            row = _SearchRow(self.cat_names)
+            matches = []
+            for i in order:
+                row.url = self.urls[i]
+                row.raw = self.search_keys[i]
+                if tree.test(row):
+                    matches.append(i)
+            order = matches
+        key = URL_SORT_FIELDS[sort_field]
+        keys = [(key(self.urls[i]), self.urls[i].id) for i in order]
+
+        with self._lock:
+            self._results[cache_key] = (order, keys)
+            if len(self._results) > MAX_CACHED_QUERIES:
+                self._results.popitem(last=False)
+        return order, keys
+
+    def query(
+        self,
+        search: str,
+        sort_field: str,
+        descending: bool,
+        cursor: Optional[str],
+        limit: int,
+    ) -> Tuple[List[URL], Optional[str], int]:
+        """
+        Get a single page of URLs matching a search.
+
+        :param search: The search query (frontend syntax), empty for all URLs
+        :param sort_field: The field to sort by, one of URL_SORT_FIELDS
+        :param descending: True to sort descending
+        :param cursor: The cursor returned with the previous page, None for the first page
+        :param limit: The max number of URLs to return
+        :return: The URLs of the page, the cursor of the next page (None if this is the last page), the total number of matches
+        """
+        order, keys = self._result(search, sort_field)
+        cursor_key = decode_cursor(cursor) if cursor else None
+        if cursor_key is not None and keys and type(cursor_key[0]) is not type(keys[0][0]):
+            # cursor of a different sort field
+            raise ValueError('Invalid cursor')
+
+        if not descending:
+            start = bisect_right(keys, cursor_key) if cursor_key else 0
+            end = min(start + limit, len(order))
+            page = order[start:end]
+            has_more = end < len(order)
+        else:
+            end = bisect_left(keys, cursor_key) if cursor_key else len(order)
+            start = max(end - limit, 0)
+            page = order[start:end][::-1]
+            has_more = start > 0
+
+        next_cursor = None
+        if page and has_more:
+            next_cursor = encode_cursor((URL_SORT_FIELDS[sort_field](self.urls[page[-1]]), self.urls[page[-1]].id))
+        return [self.urls[i].to_rest() for i in page], next_cursor, len(order)
+
+
+_build_lock = threading.Lock()
+
+
+def get_url_view(db_if: MiddlewareDB) -> URLView:
+    """
+    Get the view of all URLs (including staged changes) as a singleton, rebuilt whenever the URLs or categories change.
+
+    :param db_if: The database interface to use
+    """
+    # the rows include the category names & the BlueCoat categories, so the view depends on all of them
+    revision = f"{db_if.get_revision('url')}/{db_if.get_revision('bc')}/{db_if.get_revision('category')}"
+    view: Optional[URLView] = current_app.config.get('SINGLETONS', {}).get('URL_VIEW', None)
+
+    if view is None or view.revision != revision:
+        # with threaded workers only one thread rebuilds the view, the others wait for and reuse it
+        with _build_lock:
+            view = current_app.config.get('SINGLETONS', {}).get('URL_VIEW', None)
+            if view is None or view.revision != revision:
+                view = URLView(revision, db_if.urls.get_all_urls(), db_if.categories.get_all_categories())
+                current_app.config.setdefault('SINGLETONS', {})
+                current_app.config['SINGLETONS']['URL_VIEW'] = view
+
+    return view
+
@@ -0,0 +1,29 @@
+import time
+from typing import Dict, Any
+
+
+class StartupTimer:
+    """
+    Measures the phases of a startup, e.g. the imports, the config and the blueprints of the app.
+    The summary shows what slows down a (rolling) restart of the workers.
+
+    This module must not import anything expensive, since it is imported before everything else to time the imports.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._last = self._start
+        self.phases: Dict[str, float] = {}
+
+    def phase(self, name: str):
+        """End the current phase, it is reported with the given name"""
+        now = time.perf_counter()
+        self.phases[name] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    def summary(self) -> Dict[str, Any]:
+        """The duration of all phases in ms, and the total since the timer was created"""
+        return {
+            'total_ms': round((time.perf_counter() - self._start) * 1000, 1),
+            'phases_ms': dict(self.phases),
+        }
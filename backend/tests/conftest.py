@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+from apiflask import APIFlask
+
+# the tests import the modules of the backend the same way the app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.backend.sqlite.db import MySQLiteDB
+from db.middleware.stagingdb.db import StagingDB
+
+
+@pytest.fixture
+def db(tmp_path) -> StagingDB:
+    """A fresh, migrated SQLite DB"""
+    staging_db = StagingDB(MySQLiteDB(str(tmp_path / 'test.db')))
+    staging_db.migrate()
+    yield staging_db
+    staging_db.close()
+
+
+@pytest.fixture
+def app(db) -> APIFlask:
+    """An app whose DB singleton is the test DB"""
+    test_app = APIFlask(__name__)
+    test_app.config['SINGLETONS'] = {'DB': db}
+    return test_app
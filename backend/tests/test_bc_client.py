@@ -0,0 +1,168 @@
+import asyncio
+import time
+
+import pytest
+
+import background.bc_client as bc_client
+from background.bc_client import BCClient, CircuitBreaker, ServerCredentials, BREAKER_FAILURES
+from db.dbmodel.url import FAILED_LOOKUP
+from util_stub_bc_server import start_server, stub_categories
+
+HOSTNAMES = ['a.example.com', 'b.example.org', 'c.example.net']
+BODY = b'example.com\nBlue Coat: News; Shopping\nBlue Coat: Group1\n'
+
+
+def _client(port: int = 1, timeout: float = 10.0, breaker: CircuitBreaker = None, max_connections: int = 4) -> BCClient:
+    credentials = ServerCredentials(server='127.0.0.1', user='user', password='pw', verifySSL=False, port=port, use_tls=False)
+    return BCClient(credentials, max_connections=max_connections, timeout=timeout, breaker=breaker)
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(error_rate: float = 0):
+        server = start_server('127.0.0.1', 0, error_rate=error_rate)
+        servers.append(server)
+        return server.server_address[1]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _query_raw(reply: bytes, hostname: str = 'example.com') -> list:
+    """Query an appliance that answers every request with the given raw reply, and closes the connection"""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await reader.readuntil(b'\r\n\r\n')
+        writer.write(reply)
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        client = _client(port=server.sockets[0].getsockname()[1], timeout=2)
+        try:
+            return await client.aquery(hostname)
+        finally:
+            server.close()
+
+    return asyncio.run(run())
+
+
+def test_queries_reuse_the_connection(stub_server):
+    client = _client(port=stub_server(), max_connections=1)
+    try:
+        assert [client.query(h) for h in HOSTNAMES] == [stub_categories(h) for h in HOSTNAMES]
+        assert client.query_many(HOSTNAMES) == [stub_categories(h) for h in HOSTNAMES]
+        stats = client.stats()
+    finally:
+        client.close()
+
+    assert stats['connections_opened'] == 1
+    assert stats['connections_reused'] == 2 * len(HOSTNAMES) - 1
+    assert stats['errors'] == 0
+
+
+@pytest.mark.parametrize('reply', [
+    b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(BODY) + BODY,
+    # chunked, with a chunk extension and a trailer
+    (
+        b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+        b'%x;ext=1\r\n' % 20 + BODY[:20] + b'\r\n'
+        + b'%x\r\n' % (len(BODY) - 20) + BODY[20:] + b'\r\n'
+        b'0\r\nX-Trailer: 1\r\n\r\n'
+    ),
+    # no length, the body ends with the connection
+    b'HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n' + BODY,
+])
+def test_response_bodies_are_parsed(reply):
+    assert _query_raw(reply) == ['News', 'Shopping']
+
+
+@pytest.mark.parametrize('reply', [
+    b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n',
+    b'HTTP/1.1 401 Unauthorized\r\nContent-Length: %d\r\n\r\n' % len(BODY) + BODY,
+    b'garbage\r\n\r\n',
+    b'HTTP/1.1 abc OK\r\nContent-Length: 0\r\n\r\n',
+    # a body without categories
+    b'HTTP/1.1 200 OK\r\nContent-Length: 8\r\n\r\nno cats\n',
+    # the connection closes in the middle of the body
+    b'HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\nBlue Coat: News',
+    b'',
+])
+def test_failed_replies_are_failed_lookups(reply):
+    assert _query_raw(reply) == [FAILED_LOOKUP]
+
+
+def test_breaker_opens_after_failures(stub_server):
+    client = _client(port=stub_server(error_rate=1), breaker=CircuitBreaker(reset_seconds=0.2))
+    try:
+        for _ in range(BREAKER_FAILURES):
+            assert client.query('example.com') == [FAILED_LOOKUP]
+        assert client.breaker.state == 'open'
+
+        # fails fast, without sending a request
+        assert client.query('example.com') == [FAILED_LOOKUP]
+        stats = client.stats()
+        assert stats['requests'] == BREAKER_FAILURES
+        assert stats['rejected'] == 1
+
+        # after the cooldown a single trial is sent, and its failure opens the circuit again
+        time.sleep(0.25)
+        assert client.breaker.state == 'half-open'
+        assert client.query('example.com') == [FAILED_LOOKUP]
+        assert client.stats()['requests'] == BREAKER_FAILURES + 1
+        assert client.breaker.state == 'open'
+    finally:
+        client.close()
+
+
+def test_breaker_closes_after_a_successful_trial(stub_server):
+    breaker = CircuitBreaker(reset_seconds=0.2)
+    for _ in range(BREAKER_FAILURES):
+        breaker.record_failure()
+    client = _client(port=stub_server(), breaker=breaker)
+    try:
+        assert client.query('example.com') == [FAILED_LOOKUP]
+        time.sleep(0.25)
+        assert breaker.state == 'half-open'
+        assert client.query('example.com') == stub_categories('example.com')
+        assert breaker.state == 'closed'
+    finally:
+        client.close()
+
+
+def test_cancelled_trial_releases_the_breaker():
+    breaker = CircuitBreaker(failures=1, reset_seconds=0)
+    breaker.record_failure()
+
+    async def run():
+        # the appliance accepts the connection, but never answers
+        server = await asyncio.start_server(lambda reader, writer: None, '127.0.0.1', 0)
+        client = _client(port=server.sockets[0].getsockname()[1], breaker=breaker)
+        trial = asyncio.ensure_future(client.aquery('example.com'))
+        await asyncio.sleep(0.1)
+        assert breaker.state == 'half-open'
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        server.close()
+
+    asyncio.run(run())
+    assert breaker.allow()
+
+
+def test_blocking_call_does_not_wait_forever(monkeypatch):
+    monkeypatch.setattr(bc_client, 'RUN_TIMEOUT_SLACK', 0)
+    client = _client(timeout=0.05)
+
+    async def stalled(hostnames):
+        await asyncio.sleep(60)
+    monkeypatch.setattr(client, 'aquery_many', stalled)
+
+    try:
+        assert client.query_many(['a.example.com', 'b.example.com']) == [[FAILED_LOOKUP], [FAILED_LOOKUP]]
+    finally:
+        client.close()
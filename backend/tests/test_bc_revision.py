@@ -0,0 +1,63 @@
+from auth.auth import AUTH_TOKEN_KEY
+from auth.auth_singleton import get_auth_if
+from db.dbmodel.url import MutableURL, FAILED_LOOKUP
+from routes.others import add_others_bp
+
+
+def _add_url(db, url_id: str):
+    db._main_db.urls.add_url(MutableURL(hostname=f'{url_id}.example.com', description=''), url_id)
+
+
+def test_bc_updates_keep_the_url_revision(db):
+    _add_url(db, 'url-1')
+    _add_url(db, 'url-2')
+    cached = {url.id: url for url in db.urls._get_all_committed()}
+    url_revision = db.get_revision('url', committed=True)
+    bc_revision = db.get_revision('bc')
+
+    db.urls.set_bc_cats_many([('url-1', ['Technology/Internet'], 0)])
+
+    # the compile index & the cached URLs stay valid, only the BlueCoat categories are refreshed in place
+    assert db.get_revision('url', committed=True) == url_revision
+    assert db.get_revision('bc') != bc_revision
+    refreshed = {url.id: url for url in db.urls._get_all_committed()}
+    assert refreshed['url-1'] is cached['url-1']
+    assert refreshed['url-1'].bc_cats == ('Technology/Internet',)
+    assert refreshed['url-2'].bc_cats == cached['url-2'].bc_cats
+    assert [url.bc_cats for url in db.urls.get_all_urls(bypass_cache=True) if url.id == 'url-1'] == [['Technology/Internet']]
+
+
+def test_reloaded_urls_include_the_bc_cats(db, monkeypatch):
+    _add_url(db, 'url-1')
+    db.urls.set_bc_cats_many([('url-1', ['Technology/Internet'], 0)])
+
+    def fail():
+        raise AssertionError('BlueCoat categories refreshed after a reload')
+    monkeypatch.setattr(db._main_db.urls, 'get_all_bc_cats', fail)
+
+    # the first load after the update already includes the categories
+    urls = db.urls._get_all_committed()
+    assert urls[0].bc_cats == ('Technology/Internet',)
+
+
+class _NoBC:
+    def query(self, hostname: str):
+        return [FAILED_LOOKUP]
+
+
+def test_test_uri_returns_refreshed_bc_cats(app, db):
+    _add_url(db, 'url-1')
+    app.config['JWT'] = {'SECRET': 'test-secret'}
+    app.config['SINGLETONS']['BC_CLIENT'] = _NoBC()
+    add_others_bp(app)
+    with app.test_request_context():
+        token, _ = get_auth_if(app).check_login('admin', 'nw_admin_2025')
+    client = app.test_client()
+
+    def matched_bc_cats():
+        reply = client.get('/api/test-uri/www.url-1.example.com', headers={AUTH_TOKEN_KEY: token})
+        return reply.get_json()['data']['matched_url']['bc_cats']
+
+    assert matched_bc_cats() != ['News']
+    db.urls.set_bc_cats_many([('url-1', ['News'], 0)])
+    assert matched_bc_cats() == ['News']
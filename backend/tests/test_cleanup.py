@@ -0,0 +1,50 @@
+from typing import List
+
+from db.dbmodel.category import Category
+from db.dbmodel.task import CleanupFlags
+from db.dbmodel.token import Token
+from db.dbmodel.url import URL
+from db.util.cleanup import plan_cleanup
+
+ALL = CleanupFlags.URLs | CleanupFlags.Categories
+
+
+def _cat(cat_id: str, nested: List[str] = ()) -> Category:
+    return Category(id=cat_id, name=f'cat_{cat_id}', color=1, nested_categories=list(nested), pending_changes=False)
+
+
+def _url(url_id: str, categories: List[str]) -> URL:
+    return URL(id=url_id, hostname=f'host{url_id}.example.com', categories=categories, bc_cats=[], pending_changes=False)
+
+
+def _token(token_id: str, categories: List[str]) -> Token:
+    return Token(id=token_id, token=f'token-{token_id}', description='', categories=categories, pending_changes=False)
+
+
+def test_unused_urls_and_categories():
+    urls = [_url('1', ['a']), _url('2', [])]
+    categories = [_cat('a'), _cat('b')]
+
+    plan = plan_cleanup(urls, categories, [], ALL)
+
+    assert plan.url_ids == ['2']
+    assert plan.category_ids == ['b']
+
+
+def test_parents_of_unused_categories_are_removed():
+    categories = [_cat('root', ['mid']), _cat('mid', ['leaf']), _cat('leaf')]
+
+    plan = plan_cleanup([], categories, [], CleanupFlags.Categories)
+
+    assert plan.category_ids == ['leaf', 'mid', 'root']
+
+
+def test_categories_used_only_by_tokens_are_kept():
+    # 'token_only' is referenced by a token, but by no URL and no other category
+    categories = [_cat('token_only'), _cat('parent', ['nested']), _cat('nested'), _cat('unused')]
+    tokens = [_token('t1', ['token_only', 'parent'])]
+
+    plan = plan_cleanup([], categories, tokens, CleanupFlags.Categories)
+
+    # the nested category of a token category is unused itself, but its parent stays
+    assert plan.category_ids == ['nested', 'unused']
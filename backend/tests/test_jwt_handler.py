@@ -0,0 +1,29 @@
+import jwt
+
+from auth.util.jwt_data import TokenData
+from auth.util.jwt_handler import JWTHandler
+from auth.util.token_cache import TokenCache
+
+
+def _handler() -> JWTHandler:
+    return JWTHandler(3600, 'secret', TokenCache(60, 0, 100))
+
+
+def test_realm_hint_of_a_cached_token_skips_decoding(monkeypatch):
+    handler = _handler()
+    token = handler.generate_token(TokenData(username='user', roles=[], realm='local', date_of_creation=0))
+    assert handler.verify_token(token) is not None
+
+    def fail(*args, **kwargs):
+        raise AssertionError('token decoded again')
+    monkeypatch.setattr(jwt, 'decode', fail)
+
+    assert handler.realm_hint(token) == 'local'
+
+
+def test_realm_hint_of_an_unknown_token():
+    handler = _handler()
+    token = handler.generate_token(TokenData(username='user', roles=[], realm='radius', date_of_creation=0))
+
+    assert handler.realm_hint(token) == 'radius'
+    assert handler.realm_hint('not-a-jwt') is None
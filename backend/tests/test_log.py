@@ -0,0 +1,50 @@
+import logging
+import os
+import time
+
+import pytest
+
+from log import _json_default, _start_syslog_queue, _to_json
+
+
+class _Collect(logging.Handler):
+    """Writes the messages to a file, so they are visible across processes"""
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def emit(self, record: logging.LogRecord):
+        with open(self.path, 'a') as f:
+            f.write(f'{record.getMessage()}\n')
+
+
+def _record(message: str) -> logging.LogRecord:
+    return logging.LogRecord('test', logging.INFO, __file__, 0, message, None, None)
+
+
+def test_json_default_known_types():
+    assert _to_json(({'ids': {1}, 'error': ValueError('x'), 'raw': b'abc'},)) == '[{"ids":[1],"error":"ValueError(\'x\')","raw":"abc"}]'
+
+
+def test_json_default_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        _json_default(object())
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork')
+def test_queue_listener_runs_in_forked_child(tmp_path):
+    path = str(tmp_path / 'log.txt')
+    queue_handler = _start_syslog_queue(_Collect(path), 10)
+    queue_handler.handle(_record('parent'))
+    # wait until the listener of the parent waits for the next message
+    time.sleep(0.1)
+
+    pid = os.fork()
+    if pid == 0:
+        queue_handler.handle(_record('child'))
+        time.sleep(0.3)
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    with open(path) as f:
+        assert f.read().splitlines() == ['parent', 'child']
@@ -0,0 +1,39 @@
+from auth.auth import AUTH_TOKEN_KEY
+from auth.auth_singleton import get_auth_if
+from auth.auth_user import AuthUser
+from db.dbmodel.task import MutableTask
+from metrics import TASK_QUEUE_DEPTH
+from routes.metrics import add_metrics_bp
+
+SCRAPE_TOKEN = 'scrape-secret'
+
+
+def _client(app):
+    app.config['JWT'] = {'SECRET': 'test-secret'}
+    app.config['METRICS'] = {'TOKEN': SCRAPE_TOKEN}
+    add_metrics_bp(app)
+    return app.test_client()
+
+
+def test_metrics_require_a_token(app):
+    client = _client(app)
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': f'Bearer {SCRAPE_TOKEN}'}).status_code == 200
+
+
+def test_metrics_accept_user_tokens(app):
+    client = _client(app)
+    with app.test_request_context():
+        token, _ = get_auth_if(app).check_login('admin', 'nw_admin_2025')
+
+    assert client.get('/metrics', headers={AUTH_TOKEN_KEY: token}).status_code == 200
+
+
+def test_task_queue_depth_is_set_on_write(db):
+    db.tasks.add_task(AuthUser(username='test', roles=[]), MutableTask(name='cleanup_unused', parameters=[]))
+    assert TASK_QUEUE_DEPTH._value.get() == 1
+
+    db.tasks.add_task(AuthUser(username='test', roles=[]), MutableTask(name='cleanup_unused', parameters=[]))
+    assert TASK_QUEUE_DEPTH._value.get() == 2
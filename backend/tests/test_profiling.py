@@ -0,0 +1,45 @@
+import pytest
+
+from auth.auth import AUTH_TOKEN_KEY
+from auth.auth_singleton import get_auth_if
+from routes.profiling import add_profiling_bp
+
+
+@pytest.fixture
+def client(app, tmp_path):
+    app.config['JWT'] = {'SECRET': 'test-secret'}
+    # a long check interval, so only the written state can make the responses current
+    app.config['PROFILING'] = {'PATH': str(tmp_path / 'profiles')}
+    add_profiling_bp(app)
+    app.config['SINGLETONS']['PROFILER'].check_interval = 3600
+    with app.test_request_context():
+        token, _ = get_auth_if(app).check_login('admin', 'nw_admin_2025')
+    test_client = app.test_client()
+    test_client.environ_base[f'HTTP_{AUTH_TOKEN_KEY.upper().replace("-", "_")}'] = token
+    return test_client
+
+
+@pytest.mark.parametrize('settings', [
+    {'requests': -1},
+    {'duration': 0},
+    {'route': '(unclosed'},
+    {'requests': 'all'},
+])
+def test_invalid_settings_are_rejected(client, settings):
+    # rejected by the schema, with the validation error status of APIFlask
+    assert client.post('/api/profiling', json=settings).status_code == 422
+
+
+def test_responses_return_the_written_state(client):
+    started = client.post('/api/profiling', json={'requests': 5, 'route': '^/api/url'}).get_json()['data']
+    assert started['active']
+    assert started['session']['remaining'] == 5
+    assert started['session']['route'] == '^/api/url'
+
+    stopped = client.delete('/api/profiling').get_json()['data']
+    assert not stopped['active']
+
+    restarted = client.post('/api/profiling', json={}).get_json()['data']
+    assert restarted['active']
+    assert restarted['session']['remaining'] == 10
+    assert client.get('/api/profiling').get_json()['data']['session']['id'] == restarted['session']['id']
@@ -0,0 +1,67 @@
+import time
+from typing import List
+
+from background.query_bc import refresh_due, FAILED_RETRY_DELAY
+from db.dbmodel.url import MutableURL
+
+TTL = 7 * 24 * 60 * 60
+
+
+class FakeClient:
+    """Answers every lookup with the same category"""
+    def __init__(self):
+        self.queried = []
+
+    def query_many(self, hostnames: List[str]) -> List[List[str]]:
+        self.queried.extend(hostnames)
+        return [['Technology/Internet'] for _ in hostnames]
+
+    def stats(self) -> dict:
+        return {}
+
+
+def _add_urls(db, count: int) -> List[str]:
+    ids = [f'url-{i}' for i in range(count)]
+    for url_id in ids:
+        db._main_db.urls.add_url(MutableURL(hostname=f'{url_id}.example.com', description=''), url_id)
+    return ids
+
+
+def test_refresh_due_stores_each_batch_at_once(db):
+    _add_urls(db, 5)
+    writes = []
+    set_bc_cats_many = db.urls.set_bc_cats_many
+
+    def record(updates):
+        writes.append(len(updates))
+        set_bc_cats_many(updates)
+    db.urls.set_bc_cats_many = record
+
+    refresh_due(db, FakeClient(), TTL, batch_size=2)
+
+    assert writes == [2, 2, 1]
+    assert db.urls.get_bc_due_urls(int(time.time()), 10) == []
+    assert all(url.bc_cats == ['Technology/Internet'] for url in db.urls.get_all_urls(bypass_cache=True))
+
+
+def test_failed_store_does_not_starve_later_urls(db):
+    ids = _add_urls(db, 4)
+    calls = []
+    set_bc_cats_many = db.urls.set_bc_cats_many
+
+    def fail_first(updates):
+        calls.append(updates)
+        if len(calls) == 1:
+            raise RuntimeError('database is locked')
+        set_bc_cats_many(updates)
+    db.urls.set_bc_cats_many = fail_first
+
+    client = FakeClient()
+    now = int(time.time())
+    refresh_due(db, client, TTL, batch_size=2)
+
+    # the failed batch is retried later, the URLs due after it are still refreshed
+    assert len(client.queried) == 4
+    assert db.urls.get_bc_due_urls(now + FAILED_RETRY_DELAY - 1, 10) == []
+    refreshed = {url.id for url in db.urls.get_all_urls(bypass_cache=True) if url.bc_cats == ['Technology/Internet']}
+    assert refreshed == set(ids[2:])
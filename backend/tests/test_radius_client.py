@@ -0,0 +1,102 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+from pyrad.packet import AccessAccept, AccessReject, AccessRequest, AuthPacket
+
+import auth.radius.radius_client as radius_client
+from auth.radius.radius_client import RadiusClient, load_dictionary
+
+SECRET = b'test-secret'
+PASSWORD = 'correct'
+DICTIONARY = (
+    'ATTRIBUTE User-Name 1 string\n'
+    'ATTRIBUTE User-Password 2 string encrypt=1\n'
+    'ATTRIBUTE NAS-IP-Address 4 ipaddr\n'
+)
+
+
+@pytest.fixture
+def dictionary(tmp_path):
+    path = tmp_path / 'dictionary'
+    path.write_text(DICTIONARY)
+    return load_dictionary(str(path))
+
+
+@pytest.fixture
+def udp_server():
+    """Start local UDP servers, which answer Access-Requests (accepting PASSWORD) or never reply"""
+    sockets = []
+
+    def start(dictionary, reply: bool = True) -> int:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sockets.append(sock)
+
+        def serve():
+            while True:
+                try:
+                    data, addr = sock.recvfrom(4096)
+                except OSError:
+                    return
+                request = AuthPacket(packet=data, secret=SECRET, dict=dictionary)
+                # the raw attribute, the dictionary decodes the encrypted password as a string
+                password = request.PwDecrypt(request[2][0])
+                response = request.CreateReply()
+                response.code = AccessAccept if password == PASSWORD else AccessReject
+                sock.sendto(response.ReplyPacket(), addr)
+
+        if reply:
+            threading.Thread(target=serve, daemon=True).start()
+        return sock.getsockname()[1]
+
+    yield start
+    for sock in sockets:
+        sock.close()
+
+
+def _login(client: RadiusClient, password: str):
+    request = client.create_auth_packet(code=AccessRequest, User_Name='user', NAS_IP_Address='127.0.0.1')
+    request['User-Password'] = request.PwCrypt(password)
+    return client.send(request)
+
+
+def test_accept_and_reject(dictionary, udp_server):
+    client = RadiusClient([('127.0.0.1', udp_server(dictionary))], SECRET, dictionary, timeout=1, retries=1)
+    try:
+        assert _login(client, PASSWORD).code == AccessAccept
+        assert _login(client, 'wrong').code == AccessReject
+        assert client.stats()['timeouts'] == 0
+    finally:
+        client.close()
+
+
+def test_failover_to_the_second_server(dictionary, udp_server):
+    servers = [('127.0.0.1', udp_server(dictionary, reply=False)), ('127.0.0.1', udp_server(dictionary))]
+    client = RadiusClient(servers, SECRET, dictionary, timeout=0.1, retries=2)
+    try:
+        assert _login(client, PASSWORD).code == AccessAccept
+        stats = client.stats()
+        assert stats['failovers'] == 1
+        assert stats['dead_servers'] == [f'127.0.0.1:{servers[0][1]}']
+
+        # the failed server is skipped for the next requests
+        assert _login(client, PASSWORD).code == AccessAccept
+        assert client.stats()['failovers'] == 1
+    finally:
+        client.close()
+
+
+def test_blocking_call_does_not_wait_forever(dictionary, monkeypatch):
+    monkeypatch.setattr(radius_client, 'RUN_TIMEOUT_SLACK', 0)
+    client = RadiusClient([('127.0.0.1', 1)], SECRET, dictionary, timeout=0.05, retries=1)
+
+    async def stalled(packet):
+        await asyncio.sleep(60)
+    monkeypatch.setattr(client, 'asend', stalled)
+
+    try:
+        assert _login(client, PASSWORD) is None
+    finally:
+        client.close()
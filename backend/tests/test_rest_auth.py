@@ -0,0 +1,78 @@
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import orjson
+import pytest
+from flask import Flask
+
+from auth.rest.rest_auth import RESTAuthRealm
+from auth.util.token_cache import TokenCache
+
+# status of the verify endpoint for each token
+VERIFY_STATUS = {'valid': 200, 'unauthorized': 401, 'forbidden': 403, 'timeout': 408, 'limited': 429, 'broken': 503}
+
+
+@pytest.fixture
+def verify_endpoint():
+    """A local verify endpoint, counting the requests per token"""
+    requests = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # headers & body are written separately, so without this every response waits for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            token = orjson.loads(self.rfile.read(int(self.headers['Content-Length'])))['token']
+            requests[token] += 1
+            status = VERIFY_STATUS[token]
+            body = orjson.dumps({'username': 'user', 'groups': ['admins']} if status == 200 else {'error': status})
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/verify', requests
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def realm(verify_endpoint):
+    url, _ = verify_endpoint
+    paths = {'username': 'username', 'groups': 'groups', 'token': 'token', 'expires': ''}
+    cache = TokenCache(ttl=60, negative_ttl=60, max_size=10)
+    # the realm logs the address of the client on errors
+    with Flask(__name__).test_request_context():
+        yield RESTAuthRealm(url, url, False, paths, 'admins=rw', cache)
+
+
+def _verify_twice(realm: RESTAuthRealm, token: str):
+    return realm.verify_token(token), realm.verify_token(token)
+
+
+def test_valid_tokens_are_cached(realm, verify_endpoint):
+    first, second = _verify_twice(realm, 'valid')
+    assert first.username == 'user'
+    assert second == first
+    assert verify_endpoint[1]['valid'] == 1
+
+
+@pytest.mark.parametrize('token', ['unauthorized', 'forbidden'])
+def test_rejected_tokens_are_cached(realm, verify_endpoint, token):
+    assert _verify_twice(realm, token) == (None, None)
+    assert verify_endpoint[1][token] == 1
+
+
+@pytest.mark.parametrize('token', ['timeout', 'limited', 'broken'])
+def test_temporary_errors_are_not_cached(realm, verify_endpoint, token):
+    assert _verify_twice(realm, token) == (None, None)
+    assert verify_endpoint[1][token] == 2
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from auth.auth_user import AuthUser, AUTH_ROLES_RW
+from background.progress import TaskProgress, TaskLeaseLost
+from background.task_queue import TaskQueue
+from db.dbmodel.task import MutableTask, Task
+
+USER = AuthUser(username='test', roles=[AUTH_ROLES_RW])
+
+
+def _take_over(db, task: Task, owner: str):
+    """Simulate another worker, that reclaimed the task after its lease expired"""
+    with db._main_db.get_cursor() as cursor:
+        cursor.execute('UPDATE tasks SET lease_owner = ?, lease_expires = ? WHERE id = ?', (owner, int(time.time()) + 60, int(task.id)))
+
+
+def test_claim_sets_the_lease_owner(db):
+    db.tasks.add_task(USER, MutableTask(name='commit'))
+
+    task = db.tasks.claim_task('worker-a', 60, ['refresh_bc'], True)
+
+    assert task.lease_owner == 'worker-a'
+    assert db.tasks.get_task(task.id).lease_owner is None
+
+
+def test_writes_are_fenced_after_the_lease_was_lost(db):
+    db.tasks.add_task(USER, MutableTask(name='commit'))
+    task = db.tasks.claim_task('worker-a', 60, ['refresh_bc'], True)
+    progress = TaskProgress(db, task)
+    progress.start(10)
+
+    _take_over(db, task, 'worker-b')
+
+    with pytest.raises(TaskLeaseLost):
+        progress.flush()
+    assert db.tasks.update_task_stats(task.id, {'done': 1}, task.lease_owner) is False
+    assert db.tasks.update_task_status(task.id, 'success', task.lease_owner) is None
+    stored = db.tasks.get_task(task.id)
+    assert stored.status == 'running'
+    assert stored.stats == {}
+
+
+def test_task_aborts_when_the_lease_is_lost_mid_task(app, db):
+    db.tasks.add_task(USER, MutableTask(name='commit'))
+    started = threading.Event()
+    result = {}
+
+    def execute(task: Task):
+        progress = TaskProgress(db, task)
+        progress.start(1000)
+        started.set()
+        try:
+            # a long running task, reporting its progress
+            for _ in range(1000):
+                progress.advance()
+                time.sleep(0.01)
+            db.tasks.update_task_status(task.id, 'success', task.lease_owner)
+            result['finished'] = True
+        except TaskLeaseLost:
+            result['aborted'] = True
+            raise
+
+    queue = TaskQueue(app, execute, workers=1, poll_interval=60, lease_seconds=3)
+    with app.app_context():
+        task = db.tasks.claim_task(queue.owner, 3, ['refresh_bc'], True)
+    runner = threading.Thread(target=queue._run, args=(task, 'staging'))
+    runner.start()
+    assert started.wait(5)
+
+    # the heartbeat renews the lease every second, and finds it taken over
+    _take_over(db, task, 'worker-b')
+    runner.join(5)
+
+    assert not runner.is_alive()
+    assert result == {'aborted': True}
+    stored = db.tasks.get_task(task.id)
+    assert stored.status == 'running'
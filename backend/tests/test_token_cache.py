@@ -0,0 +1,62 @@
+import time
+
+from auth.util.token_cache import TokenCache
+
+
+def test_entries_expire_after_the_ttl():
+    cache = TokenCache(ttl=0.05, negative_ttl=0.05, max_size=10)
+    cache.put('token', 'user')
+    assert cache.get('token') == (True, 'user')
+
+    time.sleep(0.1)
+    assert cache.get('token') == (False, None)
+
+
+def test_entries_expire_with_the_token():
+    cache = TokenCache(ttl=60, negative_ttl=60, max_size=10)
+    cache.put('expiring', 'user', expires_at=time.time() + 0.05)
+    cache.put('expired', 'user', expires_at=time.time() - 1)
+    assert cache.get('expiring') == (True, 'user')
+    assert cache.get('expired') == (False, None)
+
+    time.sleep(0.1)
+    assert cache.get('expiring') == (False, None)
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = TokenCache(ttl=60, negative_ttl=60, max_size=2)
+    cache.put('a', 'user-a')
+    cache.put('b', 'user-b')
+    # a is used, so b is the least recently used entry
+    assert cache.get('a') == (True, 'user-a')
+    cache.put('c', 'user-c')
+
+    assert cache.get('a') == (True, 'user-a')
+    assert cache.get('b') == (False, None)
+    assert cache.get('c') == (True, 'user-c')
+
+
+def test_negative_entries_use_their_own_ttl():
+    cache = TokenCache(ttl=60, negative_ttl=0.05, max_size=10)
+    cache.put('valid', 'user')
+    cache.put('invalid', None)
+    # a hit, unlike a token that was never verified
+    assert cache.get('invalid') == (True, None)
+    assert cache.get('unknown') == (False, None)
+
+    time.sleep(0.1)
+    assert cache.get('invalid') == (False, None)
+    assert cache.get('valid') == (True, 'user')
+
+
+def test_negative_caching_can_be_disabled():
+    cache = TokenCache(ttl=60, negative_ttl=0, max_size=10)
+    cache.put('invalid', None)
+    assert cache.get('invalid') == (False, None)
+
+
+def test_disabled_cache():
+    cache = TokenCache(ttl=0, negative_ttl=0, max_size=10)
+    cache.put('token', 'user')
+    assert not cache.enabled
+    assert cache.get('token') == (False, None)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import random
+import time
+import uuid
+from typing import List, Callable, Any
+
+import orjson
+
+from db.dbmodel.url import URL
+from routes.schemas.url import ListURLOutput
+from util_generate_random_local_db import generate_random_url, generate_random_category_name
+
+
+def generate_urls(num_urls: int, num_categories: int) -> List[URL]:
+    """Generate a list of random URLs, as returned by the DB."""
+    cat_ids = [str(uuid.uuid4()) for _ in range(num_categories)]
+    return [
+        URL(
+            id=str(uuid.uuid4()),
+            hostname=generate_random_url(),
+            description=generate_random_category_name(),
+            categories=random.sample(cat_ids, random.randint(0, min(3, num_categories))),
+            bc_cats=[generate_random_category_name()],
+            bc_last_set=int(time.time()) - random.randint(0, 86400 * 30),
+            pending_changes=random.random() < 0.05,
+        )
+        for _ in range(num_urls)
+    ]
+
+
+def marshmallow_path(payload: dict) -> bytes:
+    """The default path: dump with the output schema, then encode with the stdlib json (like flask)"""
+    return json.dumps(ListURLOutput().dump(payload)).encode('utf-8')
+
+
+def orjson_path(payload: dict) -> bytes:
+    """The fast path used by fast_json"""
+    return orjson.dumps(payload)
+
+
+def bench(name: str, func: Callable[[Any], bytes], payload: dict, rounds: int) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(payload)
+        best = min(best, time.perf_counter() - start)
+    print(f'{name:<12} best of {rounds}: {best * 1000:10.2f} ms')
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the marshmallow and orjson serialization of the URL list.')
+    parser.add_argument('--urls', type=int, default=100_000, help='Number of URLs to generate (default: 100000)')
+    parser.add_argument('--categories', type=int, default=50, help='Number of categories to generate (default: 50)')
+    parser.add_argument('--rounds', type=int, default=5, help='Number of rounds per serializer (default: 5)')
+    args = parser.parse_args()
+
+    payload = {
+        'status': 'success',
+        'message': 'URLs fetched successfully',
+        'data': generate_urls(args.urls, args.categories),
+    }
+
+    # both paths have to produce the same document
+    if json.loads(marshmallow_path(payload)) != orjson.loads(orjson_path(payload)):
+        print('Error: serializers produce different output')
+        return
+
+    print(f'Serializing {args.urls} URLs')
+    slow = bench('marshmallow', marshmallow_path, payload, args.rounds)
+    fast = bench('orjson', orjson_path, payload, args.rounds)
+    print(f'Speedup: {slow / fast:.1f}x')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+import argparse
+import inspect
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+import orjson
+
+from util_generate_random_local_db import generate_local_db, generate_random_url, generate_random_category_name
+from util_stub_bc_server import start_server
+
+BACKENDS = ('sqlite', 'mongomock', 'mongodb')
+AUTH_USER = 'benchmark'
+AUTH_PASSWORD = str(uuid.uuid4())
+
+
+def configure_env(workdir: str):
+    """
+    Configure the app through its env variables.
+    The app reads them on import, so this has to run before app is imported.
+    """
+    os.environ.setdefault('APP_LOGLEVEL', 'WARNING')
+    os.environ.setdefault('APP_JWT__SECRET', str(uuid.uuid4()))
+    os.environ['APP_AUTH__ORDER'] = 'local'
+    os.environ['APP_AUTH__LOCAL__USER'] = AUTH_USER
+    os.environ['APP_AUTH__LOCAL__PASSWORD'] = AUTH_PASSWORD
+    os.environ['APP_UPLOAD__PATH'] = os.path.join(workdir, 'uploads')
+    os.environ['APP_PROFILING__PATH'] = os.path.join(workdir, 'profiles')
+
+
+def patch_mongomock(mongomock: Any):
+    """pymongo >= 4.11 passes a sort to the updates of a bulk_write, which mongomock does not accept yet"""
+    builder = mongomock.collection.BulkOperationBuilder
+    add_update = builder.add_update
+    if 'sort' in inspect.signature(add_update).parameters:
+        return
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        if sort is not None:
+            raise NotImplementedError('mongomock does not support sorted bulk updates')
+        return add_update(self, *args, **kwargs)
+    builder.add_update = add_update_without_sort
+
+
+def build_db(app: Any, backend: str, workdir: str, mongo_uri: Optional[str]) -> Tuple[Any, Callable[[], None]]:
+    """
+    Build a fresh DB for the backend, the same way db_singleton does.
+
+    :return: The staging DB & a function to drop it
+    """
+    from db.backend.sqlite.db import MySQLiteDB
+    from db.backend.mongodb.db import MyMongoDB
+    from db.middleware.stagingdb.db import StagingDB
+    from metrics import instrument_db, metrics_enabled
+
+    if backend == 'sqlite':
+        db = MySQLiteDB(os.path.join(workdir, f'benchmark_{uuid.uuid4().hex}.db'))
+        drop = lambda: None
+    else:
+        if backend == 'mongomock':
+            try:
+                import mongomock
+            except ImportError:
+                raise SystemExit('Error: the mongomock backend requires "pip install mongomock", or use --mongo-uri with the mongodb backend')
+            patch_mongomock(mongomock)
+            client = mongomock.MongoClient()
+        else:
+            if not mongo_uri:
+                raise SystemExit('Error: the mongodb backend requires --mongo-uri')
+            from pymongo import MongoClient
+            client = MongoClient(mongo_uri)
+        database_name = f'proxysg_benchmark_{uuid.uuid4().hex[:8]}'
+        # mongomock and a standalone mongod do not support transactions
+        db = MyMongoDB(client, database_name, disable_transaction=True)
+        drop = lambda: client.drop_database(database_name)
+
+    if metrics_enabled(app):
+        instrument_db(db, 'mongodb' if backend != 'sqlite' else 'sqlite')
+    return StagingDB(db), drop
+
+
+class Runner:
+    """Sends requests through the flask test client, and collects the latencies of every operation"""
+
+    def __init__(self, app: Any):
+        self.app = app
+        self.client = app.test_client()
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.headers: Dict[str, str] = {}
+
+    def request(self, method: str, path: str, **kwargs) -> Any:
+        response = self.client.open(path, method=method, headers=self.headers, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {path} failed with {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        return response
+
+    def data(self, method: str, path: str, **kwargs) -> Any:
+        return self.request(method, path, **kwargs).get_json()['data']
+
+    def login(self):
+        from auth.auth import AUTH_TOKEN_KEY
+        token = self.data('POST', '/api/auth/login', json={'username': AUTH_USER, 'password': AUTH_PASSWORD})['token']
+        self.headers = {AUTH_TOKEN_KEY: token}
+
+    def run_task(self, path: str, payload: Dict[str, Any]):
+        """Create a task and execute it synchronously, instead of waiting for the task queue"""
+        from background.background_tasks import execute_task
+        from db.db_singleton import get_db
+
+        task_id = self.data('POST', path, json=payload)
+        with self.app.app_context():
+            execute_task(self.app, get_db().tasks.get_task(task_id))
+        task = self.data('GET', f'/api/task/{task_id}')
+        if task['status'] != 'success':
+            raise RuntimeError(f'Task {task_id} ended with status {task["status"]}')
+
+    def timed(self, name: str, func: Callable[[int], Any], rounds: int, warmup: int = 0):
+        """
+        Time an operation.
+
+        :param name: Name of the operation in the results
+        :param func: The operation, called with the number of the round
+        :param rounds: Number of measured rounds
+        :param warmup: Number of rounds before, that are not measured (e.g. to fill caches)
+        """
+        for i in range(warmup):
+            func(i)
+        samples = []
+        for i in range(rounds):
+            start = time.perf_counter()
+            func(i)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        self.results[name] = {
+            'rounds': rounds,
+            'min_ms': round(samples[0], 3),
+            'median_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+            'max_ms': round(samples[-1], 3),
+        }
+        print(f'  {name:<20} median {self.results[name]["median_ms"]:10.2f} ms   min {samples[0]:10.2f} ms')
+
+
+def run_backend(app: Any, backend: str, args: argparse.Namespace, workdir: str, local_db: str) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    Run all operations against a fresh DB of the backend
+
+    :return: The results of the operations & the size of the final dataset
+    """
+    from background.bc_client import BCClient, ServerCredentials
+
+    random.seed(args.seed)
+    db, drop = build_db(app, backend, workdir, args.mongo_uri)
+    # every backend starts with empty caches
+    app.config.setdefault('SINGLETONS', {})
+    app.config['SINGLETONS']['DB'] = db
+    app.config['SINGLETONS']['URL_VIEW'] = None
+    with app.app_context():
+        db.migrate()
+
+    # test-uri queries the BlueCoat appliance, which is replaced by the local stub
+    bc_server = start_server('127.0.0.1', 0)
+    host, port = bc_server.server_address[:2]
+    app.config['SINGLETONS']['BC_CLIENT'] = BCClient(
+        ServerCredentials(server=host, user='admin', password='admin', verifySSL=False, port=port, use_tls=False),
+    )
+
+    runner = Runner(app)
+    try:
+        runner.login()
+        print(f'{backend}:')
+
+        # writes, every one of them runs once on the growing dataset
+        runner.timed('import', lambda _: runner.run_task('/api/task/new/upload_existing_db', {
+            'categoryDB': local_db,
+            'prefix': '',
+        }), 1)
+        runner.timed('commit_import', lambda _: runner.run_task('/api/task/new/commit', {'message': 'import'}), 1)
+
+        categories = runner.data('GET', '/api/category')
+        category_ids = [c['id'] for c in categories]
+        # chains of nested categories, each of them args.depth levels deep
+        links = [
+            (category_ids[i], category_ids[i + 1])
+            for start in range(0, len(category_ids), args.depth + 1)
+            for i in range(start, min(start + args.depth, len(category_ids) - 1))
+        ]
+        if links:
+            runner.timed('nest_category', lambda i: runner.request(
+                'POST', f'/api/category/{links[i][0]}/category/{links[i][1]}',
+            ), len(links))
+
+        new_hostnames = [generate_random_url() for _ in range(args.staged)]
+
+        def stage_url(i: int):
+            url = runner.data('POST', '/api/url', json={'hostname': new_hostnames[i], 'description': generate_random_category_name()})
+            runner.request('POST', f'/api/url/{url["id"]}/category/{random.choice(category_ids)}')
+        if args.staged:
+            runner.timed('stage_url', stage_url, args.staged)
+
+        token = runner.data('POST', '/api/token', json={'description': 'benchmark'})
+        runner.request('POST', f'/api/token/{token["id"]}/category', json={
+            # the heads of the chains, so the compile has to resolve the nesting
+            'categories': category_ids[::args.depth + 1],
+        })
+        runner.timed('commit', lambda _: runner.run_task('/api/task/new/commit', {'message': 'benchmark'}), 1)
+
+        # reads, on the final dataset
+        urls = runner.data('GET', '/api/url')
+        # a broken import would otherwise only show up as a suspiciously fast run
+        sizes = {
+            'urls': len(urls),
+            'categories': len(runner.data('GET', '/api/category')),
+            'history': len(runner.data('GET', '/api/history')),
+        }
+        print(f'  dataset: {sizes}')
+        hostnames = [u['hostname'] for u in random.sample(urls, min(len(urls), args.rounds))]
+        searches = [h.split('.')[-2].split('-')[0] for h in hostnames]
+        rounds = args.rounds
+        runner.timed('compile', lambda _: runner.request('GET', f'/api/compile/{token["token"]}'), rounds, warmup=1)
+        runner.timed('test_uri', lambda i: runner.request(
+            'GET', f'/api/test-uri/sub.{hostnames[i % len(hostnames)]}',
+        ), rounds, warmup=1)
+        runner.timed('list_urls', lambda _: runner.request('GET', '/api/url'), rounds, warmup=1)
+        runner.timed('list_urls_page', lambda _: runner.request('GET', '/api/url?limit=100&sort=-hostname'), rounds, warmup=1)
+        runner.timed('list_urls_search', lambda i: runner.request(
+            'GET', f'/api/url?limit=100&search={searches[i % len(searches)]}',
+        ), rounds, warmup=1)
+        runner.timed('list_categories', lambda _: runner.request('GET', '/api/category'), rounds, warmup=1)
+        runner.timed('list_tokens', lambda _: runner.request('GET', '/api/token'), rounds, warmup=1)
+        runner.timed('list_tasks', lambda _: runner.request('GET', '/api/task'), rounds, warmup=1)
+        runner.timed('history', lambda _: runner.request('GET', '/api/history'), rounds, warmup=1)
+    finally:
+        app.config['SINGLETONS']['BC_CLIENT'].close()
+        app.config['SINGLETONS']['BC_CLIENT'] = None
+        bc_server.shutdown()
+        db.close()
+        drop()
+        app.config['SINGLETONS']['DB'] = None
+
+    return runner.results, sizes
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, min_delta_ms: float) -> List[str]:
+    """
+    Compare the medians of two runs.
+
+    :param threshold: Relative slowdown that counts as regression, e.g. 0.2 for 20%
+    :param min_delta_ms: Slowdowns below this are noise, no matter how large relatively
+    :return: Description of every regression
+    """
+    if baseline.get('dataset') != current.get('dataset'):
+        print('Warning: the baseline used a different dataset, the results are not comparable')
+
+    regressions = []
+    for backend, operations in current['results'].items():
+        for name, result in operations.items():
+            old = baseline.get('results', {}).get(backend, {}).get(name)
+            if old is None:
+                continue
+            delta = result['median_ms'] - old['median_ms']
+            ratio = result['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+            marker = ''
+            if delta > min_delta_ms and ratio > 1 + threshold:
+                marker = '  REGRESSION'
+                regressions.append(f'{backend}/{name}: {old["median_ms"]:.2f} ms -> {result["median_ms"]:.2f} ms')
+            print(f'{backend + "/" + name:<30} {old["median_ms"]:10.2f} ms -> {result["median_ms"]:10.2f} ms  {ratio:6.2f}x{marker}')
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the API against the DB backends, and compare the results to a previous run.')
+    parser.add_argument('--urls', type=int, default=2000, help='Number of URLs to import (default: 2000)')
+    parser.add_argument('--categories', type=int, default=50, help='Number of categories to import (default: 50)')
+    parser.add_argument('--depth', type=int, default=3, help='Nesting depth of the categories (default: 3)')
+    parser.add_argument('--staged', type=int, default=200, help='Number of URLs added as staged changes before the commit (default: 200)')
+    parser.add_argument('--rounds', type=int, default=20, help='Number of rounds per read operation (default: 20)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the generated dataset (default: 42)')
+    parser.add_argument('--backends', default='sqlite,mongomock', help=f'Comma separated backends, out of {", ".join(BACKENDS)} (default: sqlite,mongomock)')
+    parser.add_argument('--mongo-uri', help='URI of the MongoDB for the mongodb backend, e.g. mongodb://localhost:27017')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown of the median reported as regression (default: 0.2)')
+    parser.add_argument('--min-delta', type=float, default=1.0, help='Slowdowns below this many ms are ignored (default: 1.0)')
+    args = parser.parse_args()
+
+    backends = [b.strip().lower() for b in args.backends.split(',') if b.strip()]
+    for backend in backends:
+        if backend not in BACKENDS:
+            print(f'Error: unknown backend {backend}')
+            return 2
+    if args.urls < 1 or args.categories < 2 or args.depth < 1 or args.rounds < 1:
+        print('Error: at least 1 URL, 2 categories, a depth of 1 and 1 round are required')
+        return 2
+
+    random.seed(args.seed)
+    local_db = generate_local_db(args.urls, args.categories)
+
+    with tempfile.TemporaryDirectory(prefix='proxysg_benchmark_') as workdir:
+        configure_env(workdir)
+        from app import app
+
+        results = {}
+        sizes = {}
+        for backend in backends:
+            results[backend], sizes[backend] = run_backend(app, backend, args, workdir, local_db)
+
+    report = {
+        'created': int(time.time()),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'dataset': {
+            'urls': args.urls,
+            'categories': args.categories,
+            'depth': args.depth,
+            'staged': args.staged,
+            'seed': args.seed,
+        },
+        'rounds': args.rounds,
+        'sizes': sizes,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+        print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare, 'rb') as f:
+            baseline = orjson.loads(f.read())
+        regressions = compare(baseline, report, args.threshold, args.min_delta)
+        if regressions:
+            print(f'{len(regressions)} regression(s):')
+            for regression in regressions:
+                print(f'  {regression}')
+            return 1
+        print('No regressions')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+import argparse
+import http.client
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+
+import orjson
+
+from util_generate_random_local_db import generate_local_db
+
+WORKER_CLASSES = ('sync', 'gthread')
+AUTH_TOKEN_KEY = 'jwt-token'
+AUTH_USER = 'loadtest'
+AUTH_PASSWORD = str(uuid.uuid4())
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """A gunicorn server of the app, started with the worker settings of a serving mode"""
+
+    def __init__(self, workdir: str, worker_class: str, workers: int, threads: int, timeout: int):
+        self.port = free_port()
+        self.metrics_token = str(uuid.uuid4())
+        env = dict(os.environ)
+        env.update({
+            'APP_LOGLEVEL': env.get('APP_LOGLEVEL', 'WARNING'),
+            'APP_JWT__SECRET': str(uuid.uuid4()),
+            'APP_AUTH__ORDER': 'local',
+            'APP_AUTH__LOCAL__USER': AUTH_USER,
+            'APP_AUTH__LOCAL__PASSWORD': AUTH_PASSWORD,
+            'APP_DB__TYPE': 'sqlite',
+            'APP_DB__SQLITE__APP_DB_SQLITE_FILENAME': os.path.join(workdir, 'loadtest.db'),
+            'APP_UPLOAD__PATH': os.path.join(workdir, 'uploads'),
+            'APP_PROFILING__PATH': os.path.join(workdir, 'profiles'),
+            'APP_LOAD_EXISTING__PATH': os.path.join(workdir, 'local_db.txt'),
+            'APP_SERVER__WORKER_CLASS': worker_class,
+            'APP_SERVER__WORKERS': str(workers),
+            'APP_SERVER__THREADS': str(threads),
+            'APP_SERVER__TIMEOUT': str(timeout),
+            'APP_METRICS__TOKEN': self.metrics_token,
+            'PROMETHEUS_MULTIPROC_DIR': os.path.join(workdir, 'metrics'),
+        })
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', '-b', f'127.0.0.1:{self.port}', 'app:app'],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        self.headers: Dict[str, str] = {}
+
+    def wait_ready(self, timeout: float = 60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with {self.process.returncode}')
+            try:
+                self.request('GET', '/metrics', headers={'Authorization': f'Bearer {self.metrics_token}'})
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError('gunicorn did not start in time')
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        payload: Any = None,
+        timeout: float = 120,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=timeout)
+        try:
+            headers = {**self.headers, **(headers or {})}
+            body = None
+            if payload is not None:
+                body = orjson.dumps(payload)
+                headers['Content-Type'] = 'application/json'
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise RuntimeError(f'{method} {path} failed with {response.status}: {data[:200]!r}')
+        return data
+
+    def data(self, method: str, path: str, payload: Any = None) -> Any:
+        return orjson.loads(self.request(method, path, payload))['data']
+
+    def login(self):
+        token = self.data('POST', '/api/auth/login', {'username': AUTH_USER, 'password': AUTH_PASSWORD})['token']
+        self.headers = {AUTH_TOKEN_KEY: token}
+
+    def run_task(self, path: str, payload: Dict[str, Any], timeout: float = 600):
+        """Create a task, and wait until the task queue of the server finished it"""
+        task_id = self.data('POST', path, payload)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                status = self.data('GET', f'/api/task/{task_id}')['status']
+            except RuntimeError:
+                # SQLite is locked while a big import is written, just ask again
+                status = None
+            if status == 'success':
+                return
+            if status == 'failed':
+                raise RuntimeError(f'Task {task_id} failed')
+            time.sleep(0.5)
+        raise RuntimeError(f'Task {task_id} did not finish in time')
+
+
+def seed(server: Server, local_db: str) -> str:
+    """
+    Import the dataset and create a token of all categories.
+
+    :return: The token, its compile file is downloaded by the slow clients
+    """
+    server.run_task('/api/task/new/upload_existing_db', {'categoryDB': local_db, 'prefix': ''})
+    category_ids = [c['id'] for c in server.data('GET', '/api/category')]
+    token = server.data('POST', '/api/token', {'description': 'loadtest'})
+    server.request('POST', f'/api/token/{token["id"]}/category', {'categories': category_ids})
+    server.run_task('/api/task/new/commit', {'message': 'loadtest'})
+    return token['token']
+
+
+def slow_download(port: int, path: str, send_seconds: float, rate: int, recv_buffer: int, timeout: float) -> Dict[str, Any]:
+    """
+    Download a path like a slow client, the request is sent line by line over send_seconds,
+    and the response is read at most at rate bytes per second.
+    The small receive buffer keeps the kernel from taking the whole response off the server at once.
+    """
+    start = time.perf_counter()
+    received = 0
+    head = b''
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, recv_buffer)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(('127.0.0.1', port))
+        lines = [f'GET {path} HTTP/1.1\r\n', 'Host: 127.0.0.1\r\n', 'User-Agent: loadtest\r\n', 'Connection: close\r\n', '\r\n']
+        for i, line in enumerate(lines):
+            if i:
+                time.sleep(send_seconds / (len(lines) - 1))
+            sock.sendall(line.encode())
+        while True:
+            data = sock.recv(max(1024, rate // 10))
+            if not data:
+                break
+            if len(head) < 64:
+                head += data[:64]
+            received += len(data)
+            delay = start + received / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+    status = head.split(b' ', 2)[1] if head.startswith(b'HTTP/') else b''
+    return {
+        'ok': status == b'200',
+        'bytes': received,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def probe(server: Server, path: str, timeout: float) -> Optional[float]:
+    """Time a (fast) request, None if it failed or timed out"""
+    start = time.perf_counter()
+    try:
+        server.request('GET', path, timeout=timeout)
+    except (OSError, RuntimeError):
+        return None
+    return (time.perf_counter() - start) * 1000
+
+
+def run_level(server: Server, token: str, clients: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Start a number of slow clients downloading the compile file,
+    and time requests of other clients while the slow clients occupy the server.
+    """
+    downloads: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def download():
+        result = slow_download(server.port, f'/api/compile/{token}', args.send_seconds, args.rate, args.recv_buffer, args.client_timeout)
+        with lock:
+            downloads.append(result)
+
+    threads = [threading.Thread(target=download, daemon=True) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    # give the slow clients time to occupy the server
+    if clients:
+        time.sleep(1)
+
+    # probe until all slow clients are done, but at least the given number of times
+    latencies = []
+    failed = 0
+    while failed + len(latencies) < args.probes or any(thread.is_alive() for thread in threads):
+        latency = probe(server, '/api/category', args.client_timeout)
+        if latency is None:
+            failed += 1
+        else:
+            latencies.append(latency)
+        time.sleep(args.probe_interval)
+    seconds = time.perf_counter() - start
+    latencies.sort()
+
+    result = {
+        'slow_clients': clients,
+        'slow_ok': sum(1 for d in downloads if d['ok']),
+        'slow_median_s': round(statistics.median([d['seconds'] for d in downloads]), 2) if downloads else None,
+        'slow_max_s': round(max([d['seconds'] for d in downloads]), 2) if downloads else None,
+        'compile_bytes': max([d['bytes'] for d in downloads]) if downloads else None,
+        'probes_ok': len(latencies),
+        'probes_failed': failed,
+        'probe_median_ms': round(statistics.median(latencies), 1) if latencies else None,
+        'probe_p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1) if latencies else None,
+        'probe_max_ms': round(latencies[-1], 1) if latencies else None,
+        'seconds': round(seconds, 1),
+    }
+    print(
+        f'  {clients:>4} slow clients: {result["slow_ok"]}/{clients} downloads ok (median {result["slow_median_s"]} s), '
+        f'probes {result["probes_ok"]} ok / {failed} failed, median {result["probe_median_ms"]} ms, '
+        f'p95 {result["probe_p95_ms"]} ms, max {result["probe_max_ms"]} ms'
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the serving modes with many slow clients, e.g. ProxySGs downloading big compile files.')
+    parser.add_argument('--modes', default='sync,gthread', help=f'Comma separated worker classes, out of {", ".join(WORKER_CLASSES)} (default: sync,gthread)')
+    parser.add_argument('--workers', type=int, default=2, help='Number of gunicorn workers (default: 2)')
+    parser.add_argument('--threads', type=int, default=16, help='Number of threads per gthread worker (default: 16)')
+    parser.add_argument('--timeout', type=int, default=30, help='gunicorn worker timeout in seconds (default: 30)')
+    parser.add_argument('--clients', default='0,4,16', help='Comma separated numbers of concurrent slow clients (default: 0,4,16)')
+    parser.add_argument('--send-seconds', type=float, default=2, help='Seconds a slow client takes to send its request (default: 2)')
+    parser.add_argument('--rate', type=int, default=256 * 1024, help='Bytes per second read by a slow client (default: 262144)')
+    parser.add_argument('--recv-buffer', type=int, default=16 * 1024, help='Socket receive buffer of a slow client in bytes (default: 16384)')
+    parser.add_argument('--probes', type=int, default=20, help='Min number of timed requests per level, they are sent until all slow clients are done (default: 20)')
+    parser.add_argument('--probe-interval', type=float, default=0.25, help='Seconds between two timed requests (default: 0.25)')
+    parser.add_argument('--client-timeout', type=float, default=60, help='Seconds until a request of a client fails (default: 60)')
+    parser.add_argument('--urls', type=int, default=150000, help='Number of URLs of the dataset, they determine the size of the compile file (default: 150000)')
+    parser.add_argument('--categories', type=int, default=50, help='Number of categories of the dataset (default: 50)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the generated dataset (default: 42)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    modes = [m.strip().lower() for m in args.modes.split(',') if m.strip()]
+    for mode in modes:
+        if mode not in WORKER_CLASSES:
+            print(f'Error: unknown worker class {mode}')
+            return 2
+    levels = [int(c) for c in args.clients.split(',') if c.strip()]
+    if args.urls < 1 or args.categories < 1 or args.probes < 1 or any(c < 0 for c in levels):
+        print('Error: at least 1 URL, 1 category and 1 probe are required')
+        return 2
+
+    random.seed(args.seed)
+    local_db = generate_local_db(args.urls, args.categories)
+
+    results = {}
+    token = None
+    with tempfile.TemporaryDirectory(prefix='proxysg_loadtest_') as workdir:
+        # all modes serve the same DB, which is seeded by the first one
+        for mode in modes:
+            print(f'{mode}:')
+            server = Server(workdir, mode, args.workers, args.threads, args.timeout)
+            try:
+                server.wait_ready()
+                server.login()
+                if token is None:
+                    token = seed(server, local_db)
+                # build the caches of all workers, so the levels only measure serving
+                for _ in range(args.workers * 2):
+                    server.request('GET', f'/api/compile/{token}')
+                results[mode] = [run_level(server, token, clients, args) for clients in levels]
+            finally:
+                server.stop()
+
+    report = {
+        'created': int(time.time()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'workers': args.workers,
+            'threads': args.threads,
+            'timeout': args.timeout,
+            'send_seconds': args.send_seconds,
+            'rate': args.rate,
+            'recv_buffer': args.recv_buffer,
+            'probes': args.probes,
+            'probe_interval': args.probe_interval,
+            'urls': args.urls,
+            'categories': args.categories,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+        print(f'Results written to {args.output}')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import ssl
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Optional
+from urllib.parse import unquote
+
+import orjson
+
+from util_generate_random_local_db import generate_random_url
+
+STUB_CATEGORIES = [
+    'Technology/Internet', 'News', 'Business/Economy', 'Shopping', 'Social Networking', 'Search Engines/Portals',
+    'Entertainment', 'Games', 'Education', 'Health', 'Travel', 'Web Ads/Analytics', 'Content Servers',
+]
+TEST_URL_PATH = '/ContentFilter/TestUrl/'
+
+
+def stub_categories(hostname: str) -> List[str]:
+    """Derive 1-2 stable categories from the hostname, so repeated queries return the same result."""
+    h = zlib.crc32(hostname.encode('utf-8'))
+    cats = [STUB_CATEGORIES[h % len(STUB_CATEGORIES)]]
+    if h % 3 == 0:
+        cats.append(STUB_CATEGORIES[(h // 7) % len(STUB_CATEGORIES)])
+    return cats
+
+
+def build_handler(latency_ms: float, error_rate: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        """Answers the TestUrl API like a ProxySG appliance, with HTTP/1.1 keep-alive."""
+        protocol_version = 'HTTP/1.1'
+        # headers & body are written separately, so without this every response waits for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            if not self.path.startswith(TEST_URL_PATH):
+                return self._reply(404, 'Not Found\n')
+            if error_rate and random.random() < error_rate:
+                return self._reply(503, 'Service Unavailable\n')
+
+            hostname = unquote(self.path[len(TEST_URL_PATH):])
+            # same layout as the appliance: the first 'Blue Coat:' line holds the categories, the second one the groups
+            body = (
+                f'{hostname}\n'
+                f'Blue Coat: {"; ".join(stub_categories(hostname))}\n'
+                f'Blue Coat: Group1\n'
+            )
+            self._reply(200, body)
+
+        def _reply(self, status: int, body: str):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # keep the output of benchmarks readable
+            pass
+
+    return StubHandler
+
+
+def start_server(host: str, port: int, latency_ms: float = 0, error_rate: float = 0,
+                 cert: Optional[str] = None, key: Optional[str] = None) -> ThreadingHTTPServer:
+    """Start the stub appliance in a background thread."""
+    server = ThreadingHTTPServer((host, port), build_handler(latency_ms, error_rate))
+    server.daemon_threads = True
+    if cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, name='stub-bc-server', daemon=True).start()
+    return server
+
+
+def run_benchmark(server: ThreadingHTTPServer, args: argparse.Namespace):
+    """Query random hostnames through the BCClient and print its stats as JSON."""
+    # only needed for the benchmark, so the stub itself has no dependencies on the app
+    from background.bc_client import BCClient, ServerCredentials
+
+    host, port = server.server_address[:2]
+    client = BCClient(
+        ServerCredentials(server=host, user='admin', password='admin', verifySSL=False, port=port, use_tls=bool(args.cert)),
+        max_connections=args.connections,
+        timeout=args.timeout,
+    )
+    hostnames = [generate_random_url() for _ in range(args.bench)]
+
+    start = time.perf_counter()
+    results = client.query_many(hostnames)
+    duration = time.perf_counter() - start
+
+    mismatches = sum(1 for h, r in zip(hostnames, results) if r != stub_categories(h))
+    report = {
+        'queries': len(hostnames),
+        'seconds': round(duration, 3),
+        'queries_per_sec': round(len(hostnames) / duration) if duration else 0,
+        'mismatches': mismatches,
+        'client': client.stats(),
+    }
+    client.close()
+    print(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a stub of the ProxySG TestUrl API, e.g. for tests and benchmarks of the BC client.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8082, help='Port to listen on, 0 for a random one (default: 8082)')
+    parser.add_argument('--latency', type=float, default=0, help='Artificial latency per request in ms (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0, help='Share of requests answered with a 503 (default: 0)')
+    parser.add_argument('--cert', help='Certificate file, serves https if given')
+    parser.add_argument('--key', help='Key file of the certificate')
+    parser.add_argument('--bench', type=int, default=0, help='Instead of serving, query this many random hostnames and print the client stats')
+    parser.add_argument('--connections', type=int, default=4, help='Connections of the client in benchmark mode (default: 4)')
+    parser.add_argument('--timeout', type=float, default=10, help='Timeout of the client in benchmark mode (default: 10)')
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.latency, args.error_rate, args.cert, args.key)
+    if args.bench:
+        run_benchmark(server, args)
+        server.shutdown()
+        return
+
+    print(f'Serving stub BC appliance on {server.server_address[0]}:{server.server_address[1]}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()